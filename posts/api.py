@@ -0,0 +1,274 @@
+"""
+API лент, групп, профилей и комментариев (только чтение) и массовых
+подписок.
+
+Ответ - JSON-страница {"results": [...], "next_cursor": ...} или NDJSON
+(?format=ndjson либо Accept: application/x-ndjson): по объекту в строке,
+последняя строка - {"next_cursor": ...}. Строки читаются через values()
+без создания моделей, NDJSON отдается потоком через iterator().
+
+Страницы листаются курсором по (дата, id). ETag и Last-Modified строятся
+по версиям из posts.caching, поэтому опрос без изменений получает 304
+без запросов к БД.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import path
+from django.utils.cache import patch_vary_headers
+
+from . import follows
+from .caching import (conditional, POSTS, group_version, author_version,
+                      post_version, follow_version)
+from .counters import stats_for
+from .feed import FEED_DATE, follow_feed
+from .models import Post, Group, Comment
+from .pagination import NEXT, after, decode_cursor, encode_position
+
+
+User = get_user_model()
+
+DEFAULTS = {
+    'per_page': 20,
+    # Предел limit для JSON-страницы и для потока NDJSON.
+    'max_per_page': 100,
+    'max_stream': 10000,
+    'chunk_size': 500,
+    # Предел числа авторов в одном запросе follow/bulk/.
+    'max_bulk_follow': 1000,
+}
+
+NDJSON = 'application/x-ndjson'
+
+# Имя в ответе -> поле для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'comments_count': 'comments_count',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'post': 'post_id',
+    'author': 'author__username',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_API', {}))
+    return options
+
+
+def _dumps(obj):
+    return json.dumps(obj, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def _wants_stream(request):
+    return (request.GET.get('format') == 'ndjson'
+            or NDJSON in request.META.get('HTTP_ACCEPT', ''))
+
+
+def _limit(request, stream):
+    options = config()
+    top = options['max_stream'] if stream else options['max_per_page']
+    try:
+        limit = int(request.GET.get('limit') or options['per_page'])
+    except ValueError:
+        limit = options['per_page']
+    return min(max(limit, 1), top)
+
+
+def _rename(row, fields):
+    return {name: row[source] for name, source in fields.items()}
+
+
+def _error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def _json(data, **kwargs):
+    response = JsonResponse(data, encoder=DjangoJSONEncoder,
+                            json_dumps_params={'ensure_ascii': False},
+                            **kwargs)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _stream(rows, fields, limit, date_field):
+    last = None
+    for number, row in enumerate(rows.iterator(config()['chunk_size'])):
+        if number == limit:
+            cursor = encode_position(NEXT, last[date_field], last['id'])
+            yield _dumps({'next_cursor': cursor}) + '\n'
+            return
+        last = row
+        yield _dumps(_rename(row, fields)) + '\n'
+    yield _dumps({'next_cursor': None}) + '\n'
+
+
+def listing(request, queryset, fields, date_field='pub_date'):
+    """Страница queryset после курсора из запроса: JSON или NDJSON."""
+    stream = _wants_stream(request)
+    limit = _limit(request, stream)
+    queryset = after(queryset, decode_cursor(request.GET.get('cursor')),
+                     date_field)
+    # Строка сверх limit показывает, есть ли продолжение.
+    columns = list(fields.values())
+    if date_field not in columns:
+        columns.append(date_field)
+    rows = queryset.values(*columns)[:limit + 1]
+    if stream:
+        response = StreamingHttpResponse(
+            _stream(rows, fields, limit, date_field), content_type=NDJSON)
+        patch_vary_headers(response, ['Accept'])
+        return response
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_position(NEXT, rows[-1][date_field],
+                                      rows[-1]['id'])
+    return _json({'results': [_rename(row, fields) for row in rows],
+                  'next_cursor': next_cursor})
+
+
+@conditional('api_posts', lambda request: [POSTS])
+def posts(request):
+    return listing(request, Post.objects.all(), POST_FIELDS)
+
+
+@conditional('api_post', lambda request, post_id: [post_version(post_id)])
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(
+        *POST_FIELDS.values()).first()
+    if row is None:
+        return _error('Пост не найден.', 404)
+    return _json(_rename(row, POST_FIELDS))
+
+
+@conditional('api_comments',
+             lambda request, post_id: [post_version(post_id)])
+def comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return _error('Пост не найден.', 404)
+    return listing(request, Comment.objects.filter(post_id=post_id),
+                   COMMENT_FIELDS, date_field='created')
+
+
+@conditional('api_groups', lambda request: [POSTS])
+def groups(request):
+    rows = Group.objects.order_by('slug').values(*GROUP_FIELDS.values())
+    return _json({'results': [_rename(row, GROUP_FIELDS) for row in rows],
+                  'next_cursor': None})
+
+
+@conditional('api_group_posts', lambda request, slug: [group_version(slug)])
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return _error('Группа не найдена.', 404)
+    return listing(request, Post.objects.filter(group_id=group_id),
+                   POST_FIELDS)
+
+
+@conditional('api_profile',
+             lambda request, username: [author_version(username)])
+def profile(request, username):
+    row = User.objects.filter(username=username).values(
+        'id', 'username', 'first_name', 'last_name').first()
+    if row is None:
+        return _error('Пользователь не найден.', 404)
+    stats = stats_for(row['id'])
+    row.update(posts_count=stats.posts_count,
+               followers_count=stats.followers_count,
+               following_count=stats.following_count)
+    return _json(row)
+
+
+@conditional('api_profile_posts',
+             lambda request, username: [author_version(username)])
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return _error('Пользователь не найден.', 404)
+    return listing(request, Post.objects.filter(author_id=author_id),
+                   POST_FIELDS)
+
+
+def follow(request):
+    if not request.user.is_authenticated:
+        return _error('Требуется авторизация.', 401)
+    return _follow(request)
+
+
+@conditional('api_follow', lambda request: [
+    POSTS, follow_version(request.user.pk)],
+    variant=lambda request: request.user.pk)
+def _follow(request):
+    return listing(request, follow_feed(request.user), POST_FIELDS,
+                   date_field=FEED_DATE)
+
+
+def follow_bulk(request):
+    """
+    Подписывает текущего пользователя на авторов и отписывает от них:
+    POST {"follow": [username, ...], "unfollow": [username, ...]}.
+    """
+    if not request.user.is_authenticated:
+        return _error('Требуется авторизация.', 401)
+    if request.method != 'POST':
+        return _error('Метод не поддерживается.', 405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return _error('Тело запроса - не JSON.', 400)
+    if not isinstance(data, dict):
+        return _error('Ожидается объект JSON.', 400)
+    lists = {action: data.get(action) or [] for action in ('follow',
+                                                           'unfollow')}
+    if not all(isinstance(names, list)
+               and all(isinstance(name, str) for name in names)
+               for names in lists.values()):
+        return _error('follow и unfollow - списки имен пользователей.', 400)
+    names = set(lists['follow']) | set(lists['unfollow'])
+    if len(names) > config()['max_bulk_follow']:
+        return _error('Слишком много пользователей в запросе.', 400)
+    ids = follows.resolve(names)
+    user_id = request.user.pk
+    followed = follows.follow_many(
+        [(user_id, ids[name]) for name in lists['follow'] if name in ids])
+    unfollowed = follows.unfollow_many(
+        [(user_id, ids[name]) for name in lists['unfollow'] if name in ids])
+    return _json({'followed': followed, 'unfollowed': unfollowed,
+                  'missing': sorted(names - set(ids))})
+
+
+urlpatterns = [
+    path('posts/', posts, name='api_posts'),
+    path('posts/<int:post_id>/', post_detail, name='api_post'),
+    path('posts/<int:post_id>/comments/', comments, name='api_comments'),
+    path('groups/', groups, name='api_groups'),
+    path('groups/<slug:slug>/posts/', group_posts, name='api_group_posts'),
+    path('profiles/<str:username>/', profile, name='api_profile'),
+    path('profiles/<str:username>/posts/', profile_posts,
+         name='api_profile_posts'),
+    path('follow/', follow, name='api_follow'),
+    path('follow/bulk/', follow_bulk, name='api_follow_bulk'),
+]
@@ -0,0 +1,287 @@
+"""
+Кэширование страниц с версионными ключами.
+
+Каждая страница зависит от набора "версий" (вся лента, группа, автор,
+пост, подписки пользователя). Сигналы заменяют нужные версии новыми при
+изменении Post, Comment, Follow и Group, поэтому устаревшие ключи просто
+перестают читаться, а остальные страницы продолжают отдаваться из кэша.
+"""
+import hashlib
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.http import condition
+
+from yatube import replicas
+from yatube.cache import single_flight
+
+from . import objects
+from .models import Post, Group, User
+
+
+DEFAULTS = {
+    'enabled': True,
+    'lock_timeout': 10,
+    'views': {},
+}
+
+# Версия всей ленты: меняется при любом изменении постов и комментариев.
+POSTS = 'posts'
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_CACHE', {}))
+    return options
+
+
+def group_version(slug):
+    return f'group:{slug}'
+
+
+def author_version(username):
+    return f'author:{username}'
+
+
+def post_version(post_id):
+    return f'post:{post_id}'
+
+
+def follow_version(user_id):
+    return f'follow:{user_id}'
+
+
+def _version_key(name):
+    return f'ver:{name}'
+
+
+def _fresh_version():
+    # Время в микросекундах: после вытеснения ключа версии старые
+    # страницы не могут случайно совпасть с новой версией. Случайный
+    # хвост различает версии, выданные в одну микросекунду разными
+    # процессами.
+    return int(time.time() * 1000000) * 1000 + random.randrange(1000)
+
+
+def get_versions(names):
+    """Текущие версии одним get_many; отсутствующие создаются."""
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def _modified_key(name):
+    return f'mod:{name}'
+
+
+def bump(*names):
+    """
+    Заменяет версии новыми; возвращает их {имя: версия}.
+
+    Версия не увеличивается через incr: у файлового кэша это чтение и
+    запись, и два параллельных bump записали бы одно значение. Каждый
+    bump пишет свою уникальную версию, поэтому сброс не теряется.
+    """
+    names = set(names)
+    versions = {name: _fresh_version() for name in names}
+    cache.set_many({_version_key(name): version
+                    for name, version in versions.items()}, None)
+    # Время изменения для Last-Modified.
+    now = time.time()
+    cache.set_many({_modified_key(name): now for name in names}, None)
+    replicas.note_write()
+    return versions
+
+
+def bump_on_commit(*names):
+    """
+    bump() сразу - для чтений внутри той же транзакции - и еще раз после
+    коммита: страница, отрендеренная параллельным запросом по данным до
+    коммита, но уже с новой версией, перестает читаться.
+    """
+    bump(*names)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump(*names))
+
+
+def last_modified(names):
+    """
+    Время последнего изменения любой из версий. Неизвестное время
+    считается текущим: клиент один раз получит страницу заново.
+    """
+    keys = [_modified_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return datetime.fromtimestamp(int(max(found.values())), timezone.utc)
+
+
+def _digest(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def _user_variant(request, per_user):
+    """
+    Часть ключа, зависящая от пользователя, или None, если страницу
+    нельзя кэшировать для этого запроса.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    if not per_user:
+        return None
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not csrf_cookie:
+        return None
+    # Страница содержит CSRF-токен, поэтому вариант привязан к cookie.
+    return f'{request.user.pk}-{_digest(csrf_cookie)}'
+
+
+def cached_page(view_name, versions):
+    """
+    Кэширует GET-ответ представления целиком: тело и заголовки, которые
+    выставило представление (Vary, Cache-Control и т. п.), чтобы ответ
+    из кэша не отличался от отрендеренного. Cookie не кэшируются.
+
+    versions(request, **kwargs) возвращает имена версий, от которых
+    зависит страница. Анонимные пользователи получают общий вариант,
+    авторизованные - свой, если для представления включен per_user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            options = config()
+            view_options = options['views'].get(view_name, {})
+            timeout = view_options.get('timeout', 0)
+            names = versions(request, **kwargs)
+            stamp = '.'.join(map(str, get_versions(names)))
+            variant = _user_variant(request,
+                                    view_options.get('per_user', False))
+            if (not options['enabled'] or not timeout or variant is None
+                    or request.method not in ('GET', 'HEAD')):
+                return view(request, *args, **kwargs)
+            key = (f'response:{view_name}:{variant}:'
+                   f'{_digest(request.get_full_path())}:{stamp}')
+            rendered = []
+
+            def render():
+                # Страница уйдет в общий кэш: объекты и строки берутся
+                # свежими, а не из кэша процесса или отстающей реплики.
+                with replicas.filling(), objects.shared_only():
+                    response = view(request, *args, **kwargs)
+                rendered.append(response)
+                if response.status_code == 200 and not response.streaming:
+                    return ((response.content, tuple(response.items())),
+                            timeout)
+                return None, None
+
+            # Одновременные промахи по одному ключу рендерят страницу один
+            # раз, остальные запросы дожидаются значения в кэше.
+            cached = single_flight(cache, key, render,
+                                   options['lock_timeout'])
+            if rendered:
+                return rendered[0]
+            content, headers = cached
+            response = HttpResponse(content)
+            for name, value in headers:
+                response[name] = value
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional(view_name, versions, variant=None):
+    """
+    ETag и Last-Modified по версиям страницы. Если клиент прислал
+    актуальные значения, отдается 304 без вызова представления.
+
+    variant(request) - часть ETag, зависящая от пользователя; если она
+    None, условные заголовки для запроса не выдаются.
+    """
+    def user_part(request):
+        return variant(request) if variant is not None else ''
+
+    def etag(request, *args, **kwargs):
+        user = user_part(request)
+        if user is None:
+            return None
+        stamp = '.'.join(map(str, get_versions(versions(request, **kwargs))))
+        return _digest(view_name, request.get_full_path(),
+                       request.META.get('HTTP_ACCEPT', ''), stamp, user)
+
+    def modified(request, *args, **kwargs):
+        if user_part(request) is None:
+            return None
+        return last_modified(versions(request, **kwargs))
+
+    return condition(etag_func=etag, last_modified_func=modified)
+
+
+def page_variant(request):
+    """Вариант HTML-страницы: аноним или пользователь с CSRF-cookie."""
+    return _user_variant(request, per_user=True)
+
+
+def invalidate_post(post, old_group_id=None):
+    names = [POSTS, post_version(post.pk)]
+    row = (Post.objects.filter(pk=post.pk)
+           .values_list('author__username', 'group__slug').first())
+    if row is not None:
+        username, slug = row
+    else:
+        # Пост уже удален: данные берем из экземпляра.
+        username = post.author.username
+        slug = post.group.slug if post.group_id else None
+    names.append(author_version(username))
+    if slug:
+        names.append(group_version(slug))
+    if old_group_id and old_group_id != post.group_id:
+        old_slug = (Group.objects.filter(pk=old_group_id)
+                    .values_list('slug', flat=True).first())
+        if old_slug:
+            names.append(group_version(old_slug))
+    bump_on_commit(*names)
+
+
+def invalidate_comment(comment):
+    names = [POSTS, post_version(comment.post_id)]
+    row = (Post.objects.filter(pk=comment.post_id)
+           .values_list('author__username', 'group__slug').first())
+    if row is not None:
+        username, slug = row
+        names.append(author_version(username))
+        if slug:
+            names.append(group_version(slug))
+    bump_on_commit(*names)
+
+
+def invalidate_follow(follow):
+    bump_on_commit(author_version(follow.author.username),
+                   author_version(follow.user.username),
+                   follow_version(follow.user_id))
+
+
+def invalidate_follows(pairs):
+    """Сброс кэша для пачки подписок (user_id, author_id) одним bump."""
+    user_ids = {user_id for user_id, _ in pairs}
+    ids = user_ids | {author_id for _, author_id in pairs}
+    usernames = User.objects.filter(pk__in=ids).values_list(
+        'username', flat=True)
+    bump_on_commit(
+        *[author_version(username) for username in usernames],
+        *[follow_version(user_id) for user_id in user_ids])
+
+
+def invalidate_group(group):
+    bump_on_commit(POSTS, group_version(group.slug))
@@ -0,0 +1,132 @@
+from django.db.models import (Case, Count, F, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment, Follow, UserStats
+
+
+# Поле UserStats -> (модель, поле модели, указывающее на пользователя).
+USER_COUNTERS = {
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'posts_count': (Post, 'author'),
+}
+
+
+def count_subquery(model, field, outer='pk'):
+    """Коррелированный подзапрос COUNT(*) для аннотаций и массовых UPDATE."""
+    counts = (model.objects.filter(**{field: OuterRef(outer)})
+              .order_by().values(field)
+              .annotate(n=Count('pk')).values('n'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def exact_stats(user_id):
+    return {name: model.objects.filter(**{field: user_id}).count()
+            for name, (model, field) in USER_COUNTERS.items()}
+
+
+def stats_for(user_id):
+    """Возвращает UserStats, при первом обращении считая значения честно."""
+    stats = UserStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=exact_stats(user_id))
+    return stats
+
+
+def _bump_user(user_id, name, delta):
+    if delta < 0:
+        # Уменьшение не создает строку: при каскадном удалении
+        # пользователя она вставлялась бы для удаляемой записи.
+        UserStats.objects.filter(
+            user_id=user_id, **{f'{name}__gte': -delta}).update(
+            **{name: F(name) + delta})
+        return
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta})
+    if not updated:
+        # Строки еще нет: она создается с уже учтенным изменением.
+        stats_for(user_id)
+
+
+# Пользователей в одном UPDATE ... CASE: до пяти параметров на каждого.
+BULK_CHUNK = 150
+
+
+def bump_users(changes):
+    """
+    Изменяет счетчики многих пользователей: changes - {счетчик:
+    {user_id: изменение}}. Существующие строки обновляются одним UPDATE
+    с CASE по всем счетчикам на пачку, недостающие создаются с честными
+    значениями, в которых изменение уже учтено. Строки создаются только
+    для пользователей с увеличением счетчика, как и в _bump_user.
+    """
+    user_ids = sorted({user_id for deltas in changes.values()
+                       for user_id, delta in deltas.items() if delta})
+    for start in range(0, len(user_ids), BULK_CHUNK):
+        chunk = user_ids[start:start + BULK_CHUNK]
+        existing = set(UserStats.objects.filter(
+            user_id__in=chunk).values_list('user_id', flat=True))
+        if existing:
+            UserStats.objects.filter(user_id__in=existing).update(**{
+                name: F(name) + Case(
+                    *[When(user_id=user_id, then=Value(deltas[user_id]))
+                      for user_id in existing if deltas.get(user_id)],
+                    default=Value(0), output_field=IntegerField())
+                for name, deltas in changes.items()})
+        for user_id in chunk:
+            if user_id not in existing and any(
+                    deltas.get(user_id, 0) > 0
+                    for deltas in changes.values()):
+                stats_for(user_id)
+
+
+def post_added(post):
+    _bump_user(post.author_id, 'posts_count', 1)
+
+
+def post_removed(post):
+    _bump_user(post.author_id, 'posts_count', -1)
+
+
+def comment_added(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        comments_count=F('comments_count') + 1)
+
+
+def comment_removed(comment):
+    Post.objects.filter(pk=comment.post_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1)
+
+
+def follow_added(follow):
+    _bump_user(follow.author_id, 'followers_count', 1)
+    _bump_user(follow.user_id, 'following_count', 1)
+
+
+def follow_removed(follow):
+    _bump_user(follow.author_id, 'followers_count', -1)
+    _bump_user(follow.user_id, 'following_count', -1)
+
+
+def reconcile_posts():
+    """Исправляет comments_count у постов с расхождением, возвращает число."""
+    return (Post.objects
+            .annotate(actual=count_subquery(Comment, 'post'))
+            .exclude(comments_count=F('actual'))
+            .update(comments_count=count_subquery(Comment, 'post')))
+
+
+def reconcile_users():
+    """Исправляет расхождения в UserStats, возвращает число строк."""
+    actual = {name: count_subquery(model, field, 'user_id')
+              for name, (model, field) in USER_COUNTERS.items()}
+    drift = Q()
+    for name in USER_COUNTERS:
+        drift |= ~Q(**{name: F(f'actual_{name}')})
+    return (UserStats.objects
+            .annotate(**{f'actual_{name}': value
+                         for name, value in actual.items()})
+            .filter(drift)
+            .update(**actual))
@@ -0,0 +1,101 @@
+"""
+Кэшированные и оценочные COUNT для пагинации лент.
+
+Точный счетчик кэшируется по сигнатуре SQL запроса и версиям из
+posts.caching, поэтому сбрасывается теми же сигналами, что и страницы.
+Для глобальной ленты можно использовать оценку по статистике БД, но
+только с курсорной пагинацией (POSTS_PAGINATION = 'keyset'): оценка
+бывает больше настоящего числа постов, и номера страниц Paginator вели
+бы на пустые страницы.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max
+
+from yatube import replicas
+
+from . import caching
+
+
+DEFAULTS = {
+    # Режим счетчика главной ленты: 'exact', 'cached' или 'estimated'
+    # (при пагинации с номерами страниц работает как 'cached').
+    'index': 'cached',
+    'timeout': 600,
+    'estimate_timeout': 60,
+}
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_COUNT', {}))
+    return options
+
+
+def signature(queryset):
+    """Сигнатура запроса: SQL с параметрами без сортировки."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    return hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+
+
+def cached_count(queryset, versions):
+    """COUNT, кэшированный до изменения любой из версий."""
+    stamp = '.'.join(map(str, caching.get_versions(versions)))
+    key = f'count:{signature(queryset)}:{stamp}'
+    count = cache.get(key)
+    if count is None:
+        with replicas.filling():
+            count = queryset.count()
+        cache.set(key, count, config()['timeout'])
+    return count
+
+
+def _table_statistics(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # Первое число stat - количество строк (после ANALYZE).
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+def estimated_count(model):
+    """
+    Оценка числа строк таблицы: статистика БД, а без нее - MAX(pk),
+    который читается из индекса первичного ключа.
+    """
+    key = f'estimate:{model._meta.db_table}'
+    count = cache.get(key)
+    if count is None:
+        count = _table_statistics(model._meta.db_table)
+        if count is None:
+            count = model.objects.aggregate(top=Max('pk'))['top'] or 0
+        cache.set(key, count, config()['estimate_timeout'])
+    return count
+
+
+def index_count(queryset):
+    mode = config()['index']
+    if mode == 'estimated' and getattr(
+            settings, 'POSTS_PAGINATION', 'compat') == 'keyset':
+        return estimated_count(queryset.model)
+    if mode in ('cached', 'estimated'):
+        return cached_count(queryset, [caching.POSTS])
+    return queryset.count()
@@ -0,0 +1,325 @@
+"""
+Уведомления о новых постах: pub/sub-брокер и поток server-sent events.
+
+Сигнал сохранения поста после коммита публикует событие в каналы
+'posts' (главная лента), 'group:<id>' и 'author:<id>'. Страница ленты
+открывает EventSource на /events/stream/ и получает "N новых постов"
+вместо того, чтобы перезагружаться целиком; лента подписок слушает
+каналы авторов, на которых подписан пользователь.
+
+Поток включается настройкой enabled и рассчитан на ASGI (yatube.asgi):
+под WSGI каждая открытая вкладка держала бы поток воркера до
+max_duration, поэтому по умолчанию поток выключен и страницы его не
+открывают.
+
+Бэкенд брокера задается путем к классу. LocalBackend раздает события
+подписчикам своего процесса; CacheBackend передает их через общий кэш
+(CACHE_MODE='shared'), чтобы события видели все воркеры.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.module_loading import import_string
+
+from .models import Post, Follow
+
+
+DEFAULTS = {
+    # Поток /events/stream/ и EventSource на страницах лент.
+    'enabled': False,
+    'backend': 'posts.events.LocalBackend',
+    # Комментарий-пульс, чтобы прокси не закрывали молчащее соединение.
+    'heartbeat': 15,
+    # Через сколько секунд поток закрывается; браузер переподключится
+    # сам с Last-Event-ID.
+    'max_duration': 300,
+    # Пауза перед переподключением, которую сервер советует браузеру, мс.
+    'retry_ms': 3000,
+    # Как часто проверять новые события при опросе (ASGI, CacheBackend).
+    'poll_interval': 0.5,
+    # Сколько секунд CacheBackend хранит событие.
+    'ttl': 60,
+}
+
+GLOBAL = 'posts'
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_EVENTS', {}))
+    return options
+
+
+def group_channel(group_id):
+    return f'group:{group_id}'
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+class LocalBackend:
+    """Брокер в памяти процесса."""
+
+    def __init__(self, options):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.queue.put(message)
+
+    def subscribe(self, channels):
+        subscription = LocalSubscription(self, channels)
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                listeners = self.subscribers.get(channel)
+                if listeners is not None:
+                    listeners.discard(subscription)
+                    if not listeners:
+                        del self.subscribers[channel]
+
+
+class LocalSubscription:
+
+    def __init__(self, backend, channels):
+        self.backend = backend
+        self.channels = list(channels)
+        self.queue = queue.SimpleQueue()
+
+    def get(self, timeout=0):
+        """События, пришедшие за timeout секунд (с первого - без ожидания)."""
+        messages = []
+        try:
+            if timeout:
+                messages.append(self.queue.get(timeout=timeout))
+            while True:
+                messages.append(self.queue.get_nowait())
+        except queue.Empty:
+            return messages
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class CacheBackend:
+    """
+    Брокер через кэш: у канала счетчик событий и события по номерам.
+    Подписчики опрашивают счетчики своих каналов одним get_many.
+    """
+
+    def __init__(self, options):
+        self.ttl = options['ttl']
+        self.poll_interval = options['poll_interval']
+
+    @staticmethod
+    def sequence_key(channel):
+        return f'events:{channel}:seq'
+
+    def publish(self, channel, message):
+        key = self.sequence_key(channel)
+        cache.add(key, 0, None)
+        try:
+            number = cache.incr(key)
+        except ValueError:
+            # Счетчик вытеснили между add и incr.
+            cache.add(key, 1, None)
+            number = 1
+        cache.set(f'events:{channel}:{number}', message, self.ttl)
+
+    def subscribe(self, channels):
+        return CacheSubscription(self, channels)
+
+    def positions(self, channels):
+        keys = {self.sequence_key(channel): channel for channel in channels}
+        found = cache.get_many(list(keys))
+        return {channel: found.get(key, 0) for key, channel in keys.items()}
+
+
+class CacheSubscription:
+
+    def __init__(self, backend, channels):
+        self.backend = backend
+        self.channels = list(channels)
+        self.seen = backend.positions(self.channels)
+
+    def poll(self):
+        current = self.backend.positions(self.channels)
+        keys = []
+        for channel, number in current.items():
+            start = self.seen.get(channel, 0)
+            # Счетчик мог сброситься вместе с кэшем.
+            if number < start:
+                start = 0
+            keys += [f'events:{channel}:{n}'
+                     for n in range(start + 1, number + 1)]
+        self.seen = current
+        if not keys:
+            return []
+        found = cache.get_many(keys)
+        return [found[key] for key in keys if key in found]
+
+    def get(self, timeout=0):
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = self.poll()
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(min(self.backend.poll_interval,
+                           max(0, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+def get_backend():
+    global _backend
+    options = config()
+    with _backend_lock:
+        if _backend is None or type(_backend) is not import_string(
+                options['backend']):
+            _backend = import_string(options['backend'])(options)
+        return _backend
+
+
+def publish_post(post):
+    """Рассылает событие о новом посте во все его каналы."""
+    message = {'post_id': post.pk, 'author_id': post.author_id,
+               'group_id': post.group_id}
+    backend = get_backend()
+    channels = [GLOBAL, author_channel(post.author_id)]
+    if post.group_id is not None:
+        channels.append(group_channel(post.group_id))
+    for channel in channels:
+        backend.publish(channel, message)
+
+
+def post_created(post):
+    transaction.on_commit(lambda: publish_post(post))
+
+
+def feed_channels(feed, user=None, group=None):
+    """Каналы и queryset постов ленты index, group или follow."""
+    if feed == 'group':
+        return [group_channel(group.pk)], Post.objects.filter(group=group)
+    if feed == 'follow':
+        authors = list(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True))
+        return ([author_channel(author_id) for author_id in authors],
+                Post.objects.filter(author_id__in=authors))
+    return [GLOBAL], Post.objects.all()
+
+
+class EventStream:
+    """
+    Поток SSE с числом новых постов ленты после поста since.
+
+    Подписка открывается до подсчета уже опубликованных постов, а события
+    о постах не новее посчитанных пропускаются, поэтому пост не теряется
+    и не считается дважды. Итерируется синхронно (WSGI) и асинхронно
+    (yatube.asgi, без занятого потока).
+    """
+
+    def __init__(self, channels, posts, since):
+        self.options = config()
+        self.subscription = get_backend().subscribe(channels)
+        self.count = 0
+        self.latest = since
+        if since is not None:
+            row = posts.filter(pk__gt=since).order_by().aggregate(
+                count=Count('pk'), latest=Max('pk'))
+            self.count = row['count']
+            self.latest = row['latest'] or since
+
+    def event(self):
+        data = json.dumps({'count': self.count, 'latest': self.latest})
+        return f'id: {self.latest}\nevent: new_posts\ndata: {data}\n\n'
+
+    def accept(self, messages):
+        """Учитывает новые события; возвращает SSE-событие или None."""
+        fresh = {message['post_id'] for message in messages
+                 if self.latest is None or message['post_id'] > self.latest}
+        if not fresh:
+            return None
+        self.count += len(fresh)
+        self.latest = max(fresh)
+        return self.event()
+
+    def opening(self):
+        opening = f'retry: {self.options["retry_ms"]}\n\n'
+        if self.count:
+            opening += self.event()
+        return opening
+
+    def __iter__(self):
+        deadline = time.monotonic() + self.options['max_duration']
+        try:
+            yield self.opening()
+            while time.monotonic() < deadline:
+                chunk = self.accept(self.subscription.get(
+                    min(self.options['heartbeat'],
+                        max(0, deadline - time.monotonic()))))
+                yield chunk or ': keepalive\n\n'
+        finally:
+            self.close()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        heartbeat = start
+        try:
+            yield self.opening()
+            while time.monotonic() - start < self.options['max_duration']:
+                # get() CacheBackend обращается к кэшу: не в цикле событий.
+                chunk = self.accept(await loop.run_in_executor(
+                    None, self.subscription.get))
+                if chunk is None and (time.monotonic() - heartbeat
+                                      >= self.options['heartbeat']):
+                    chunk = ': keepalive\n\n'
+                if chunk is not None:
+                    heartbeat = time.monotonic()
+                    yield chunk
+                    continue
+                await asyncio.sleep(self.options['poll_interval'])
+        finally:
+            self.close()
+
+    def close(self):
+        if self.subscription is not None:
+            self.subscription.close()
+            self.subscription = None
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    Ответ с потоком EventStream. WSGI отдает его как обычный потоковый
+    ответ, а yatube.asgi узнает по классу и читает event_stream
+    асинхронно, не занимая поток.
+    """
+
+    def __init__(self, event_stream):
+        super().__init__(event_stream, content_type='text/event-stream')
+        self.event_stream = event_stream
+        self['Cache-Control'] = 'no-cache'
+        # nginx не должен буферизовать поток.
+        self['X-Accel-Buffering'] = 'no'
@@ -0,0 +1,161 @@
+from django.conf import settings
+from django.db.models import F, Q
+
+from .counters import stats_for
+from .models import Post, Follow, FeedEntry, UserStats
+
+
+BATCH_SIZE = 1000
+# Аннотация follow_feed, по которой лента сортируется и листается.
+FEED_DATE = 'feed_date'
+
+
+def is_materialized():
+    return getattr(settings, 'FOLLOW_FEED_MATERIALIZED', False)
+
+
+def _threshold():
+    return getattr(settings, 'FOLLOW_FEED_CELEBRITY_THRESHOLD', None)
+
+
+# "Знаменитость" - автор, у которого подписчиков больше порога. Его посты
+# не раскладываются по входящим, а дочитываются при чтении. Запись и
+# чтение решают это по одному источнику - текущему UserStats, иначе пост,
+# пропущенный при раскладке, не попал бы и в выборку при чтении.
+
+def followed_celebrities(user):
+    """id знаменитостей, на которых подписан user."""
+    threshold = _threshold()
+    if threshold is None:
+        return []
+    return list(Follow.objects.filter(
+        user=user, author__stats__followers_count__gt=threshold,
+    ).values_list('author_id', flat=True))
+
+
+def is_celebrity(author_id):
+    threshold = _threshold()
+    if threshold is None:
+        return False
+    return stats_for(author_id).followers_count > threshold
+
+
+def _bulk_insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Раскладывает новый пост во входящие всех подписчиков автора."""
+    if not is_materialized() or is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    entries = []
+    for user_id in followers.iterator():
+        entries.append(FeedEntry(user_id=user_id, post_id=post.pk,
+                                 pub_date=post.pub_date))
+        if len(entries) >= BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    if entries:
+        _bulk_insert(entries)
+
+
+def _author_posts(author_id):
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')
+    limit = getattr(settings, 'FOLLOW_FEED_BACKFILL', None)
+    if limit is not None:
+        posts = posts[:limit]
+    return list(posts)
+
+
+def backfill(user_id, author_id):
+    """Добавляет во входящие посты автора, на которого подписались."""
+    if not is_materialized() or is_celebrity(author_id):
+        return
+    _bulk_insert([FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+                  for pk, pub_date in _author_posts(author_id)])
+
+
+def demoted(removed):
+    """
+    id авторов, переставших быть знаменитостями после отписок: removed -
+    {author_id: сколько подписчиков ушло}. Строки UserStats здесь не
+    создаются: отписки приходят и при каскадном удалении пользователя.
+    """
+    threshold = _threshold()
+    if threshold is None or not removed:
+        return []
+    followers = dict(UserStats.objects.filter(
+        user_id__in=list(removed)).values_list('user_id', 'followers_count'))
+    return [author_id for author_id, count in followers.items()
+            if count <= threshold < count + removed[author_id]]
+
+
+def backfill_followers(author_id):
+    """
+    Раскладывает посты автора, переставшего быть знаменитостью, во входящие
+    всех его подписчиков: посты, написанные выше порога, по ним не
+    раскладывались.
+    """
+    if not is_materialized() or is_celebrity(author_id):
+        return
+    posts = _author_posts(author_id)
+    if not posts:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    entries = []
+    for user_id in followers.iterator():
+        entries.extend(FeedEntry(user_id=user_id, post_id=pk,
+                                 pub_date=pub_date)
+                       for pk, pub_date in posts)
+        if len(entries) >= BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    if entries:
+        _bulk_insert(entries)
+
+
+def rebuild(author_ids):
+    """
+    Раскладывает посты авторов author_ids по входящим их подписчиков:
+    после массовой загрузки через bulk_create, которая не вызывает
+    сигналов. Счетчики подписчиков должны быть уже пересчитаны.
+    """
+    if not is_materialized():
+        return
+    for author_id in author_ids:
+        backfill_followers(author_id)
+
+
+def prune(user_id, author_id):
+    """Убирает из входящих посты автора после отписки."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def follow_feed(user):
+    """
+    Queryset постов ленты подписок с датой для сортировки и курсоров в
+    аннотации FEED_DATE.
+
+    Без материализации - выборка по подпискам при чтении. С материализацией
+    посты берутся из входящих и листаются по FeedEntry.pub_date, то есть
+    по индексу (user, -pub_date); посты "знаменитостей" дочитываются, и
+    тогда сортировать приходится по дате поста.
+    """
+    if not is_materialized():
+        authors = Follow.objects.filter(user=user).values('author')
+        return Post.objects.filter(author__in=authors).annotate(
+            **{FEED_DATE: F('pub_date')})
+    followed = followed_celebrities(user)
+    if followed:
+        inbox = FeedEntry.objects.filter(user=user).values('post')
+        return Post.objects.filter(
+            Q(id__in=inbox) | Q(author_id__in=followed)).annotate(
+                **{FEED_DATE: F('pub_date')})
+    return Post.objects.filter(feed_entries__user=user).annotate(
+        **{FEED_DATE: F('feed_entries__pub_date')})
@@ -0,0 +1,149 @@
+"""
+Массовые подписки и отписки: онбординг ("подписаться на всех") и
+импорт графа подписок с других платформ (команда import_follows).
+
+Пачка пар (подписчик, автор) очищается от подписок на себя и повторов
+и сверяется с таблицей Follow; новые пары вставляются через
+bulk_create(ignore_conflicts=True), лишние удаляются одним DELETE.
+Сигналы при этом не отправляются, поэтому счетчики UserStats, версии
+кэша и задачи ленты подписок обновляются здесь же - один раз на пачку,
+а не на каждую подписку. Подписка, созданная параллельно между сверкой
+и вставкой, может сдвинуть счетчик на единицу; такие расхождения
+исправляет команда reconcile_counters.
+"""
+from collections import Counter
+
+from django.db import router, transaction
+
+from . import caching, counters, feed, tasks
+from .models import Follow, User
+
+
+BATCH_SIZE = 500
+# Пар в одном запросе сверки и сброса кэша: по два параметра на пару.
+CHUNK = 400
+
+
+def _chunks(items, size=CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _clean(pairs):
+    return {(user_id, author_id) for user_id, author_id in pairs
+            if user_id != author_id}
+
+
+def existing(pairs):
+    """Подписки из pairs, которые уже есть: {(user_id, author_id): pk}."""
+    found = {}
+    for chunk in _chunks(pairs):
+        rows = Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in chunk},
+            author_id__in={author_id for _, author_id in chunk},
+        ).values_list('user_id', 'author_id', 'pk')
+        found.update(((user_id, author_id), pk)
+                     for user_id, author_id, pk in rows)
+    return {pair: pk for pair, pk in found.items() if pair in pairs}
+
+
+def resolve(usernames):
+    """{username: id} для существующих пользователей."""
+    found = {}
+    for chunk in _chunks(set(usernames), 900):
+        found.update(User.objects.filter(username__in=chunk).values_list(
+            'username', 'pk'))
+    return found
+
+
+def known_ids(ids):
+    """{id: id} для существующих пользователей."""
+    found = {}
+    for chunk in _chunks(set(ids), 900):
+        found.update((pk, pk) for pk in User.objects.filter(
+            pk__in=chunk).values_list('pk', flat=True))
+    return found
+
+
+def _apply(pairs, sign):
+    """Счетчики, кэш и лента подписок после изменения пачки подписок."""
+    if not pairs:
+        return
+    followers = Counter(author_id for _, author_id in pairs)
+    following = Counter(user_id for user_id, _ in pairs)
+    counters.bump_users({
+        'followers_count': {user_id: sign * count
+                            for user_id, count in followers.items()},
+        'following_count': {user_id: sign * count
+                            for user_id, count in following.items()},
+    })
+    for chunk in _chunks(pairs):
+        caching.invalidate_follows(chunk)
+    if feed.is_materialized():
+        for user_id, author_id in pairs:
+            tasks.sync_follow.enqueue(
+                user_id, author_id, key=f'follow:{user_id}:{author_id}')
+        if sign < 0:
+            for chunk in _chunks(followers.items(), 900):
+                for author_id in feed.demoted(dict(chunk)):
+                    tasks.backfill_followers.enqueue(
+                        author_id, key=f'backfill:{author_id}')
+
+
+def follow_many(pairs):
+    """Создает подписки (user_id, author_id); возвращает число новых."""
+    pairs = _clean(pairs)
+    with transaction.atomic():
+        new = sorted(pairs - set(existing(pairs)))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in new],
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        _apply(new, 1)
+    return len(new)
+
+
+def unfollow_many(pairs):
+    """Удаляет подписки (user_id, author_id); возвращает число удаленных."""
+    pairs = _clean(pairs)
+    with transaction.atomic():
+        found = existing(pairs)
+        for chunk in _chunks(found.values(), 900):
+            # Без сигналов: счетчики и кэш обновляются пачкой в _apply.
+            Follow.objects.filter(pk__in=chunk)._raw_delete(
+                router.db_for_write(Follow))
+        _apply(sorted(found), -1)
+    return len(found)
+
+
+def import_edges(edges, batch_size=BATCH_SIZE, by_username=True):
+    """
+    Импортирует поток пар (подписчик, автор) пачками по batch_size, не
+    читая его целиком. Возвращает Counter: read, created, existing
+    (уже были или повторились в пачке) и skipped (неизвестные
+    пользователи и подписки на себя).
+    """
+    stats = Counter()
+    batch = []
+
+    def flush():
+        names = {name for pair in batch for name in pair}
+        ids = resolve(names) if by_username else known_ids(names)
+        valid = [(ids[user], ids[author]) for user, author in batch
+                 if user in ids and author in ids
+                 and ids[user] != ids[author]]
+        created = follow_many(valid)
+        stats['read'] += len(batch)
+        stats['created'] += created
+        stats['existing'] += len(valid) - created
+        stats['skipped'] += len(batch) - len(valid)
+        batch.clear()
+
+    for edge in edges:
+        batch.append(edge)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
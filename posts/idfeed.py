@@ -0,0 +1,179 @@
+"""
+ID-списки лент: окно ленты кэшируется как упакованный array('q') с id
+постов, а сами посты берутся из кэша объектов (posts.objects).
+
+Один список годится для всех пользователей: разметка, зависящая от
+пользователя, строится уже после гидратации, а правка текста поста
+сбрасывает только сам пост. Окно хранится вместе с версиями ленты,
+при которых оно прочитано:
+- 'feed:<лента>' - состав ленты: меняется при удалении поста и смене
+  группы, после чего устаревают все окна;
+- 'feed:<лента>:new' - новые посты: устаревают окна со смещением и
+  окна "назад" от курсора. Окна "вперед" от курсора новые посты не
+  сдвигают, а в первые окна id нового поста дописывается в начало.
+"""
+import hashlib
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube import replicas
+
+from . import caching, objects
+from .pagination import HEAD, NEXT
+
+
+DEFAULTS = {
+    'enabled': True,
+    'timeout': 600,
+}
+
+INDEX = 'index'
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_FEED_IDS', {}))
+    return options
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def feeds_of(post):
+    """Ленты, в которых выводится пост."""
+    names = [INDEX, author_feed(post.author_id)]
+    if post.group_id is not None:
+        names.append(group_feed(post.group_id))
+    return names
+
+
+def _members_version(name):
+    return f'feed:{name}'
+
+
+def _inserts_version(name):
+    return f'feed:{name}:new'
+
+
+def _heads_key(name):
+    return f'ids:{name}:heads'
+
+
+def pack(ids):
+    return array('q', ids).tobytes()
+
+
+def unpack(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids.tolist()
+
+
+def _now_and_on_commit(func):
+    # Сразу - для чтений внутри той же транзакции, после коммита - чтобы
+    # окно, перечитанное до коммита, не осталось в кэше.
+    func()
+    transaction.on_commit(func)
+
+
+class CachedFeed:
+    """ID-список ленты name; окна - срезы QuerySet ленты."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def key(self, rows, kind):
+        sql, params = rows.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+        return f'ids:{self.name}:{kind}:{digest}'
+
+    def load(self, rows, kind):
+        """
+        Посты окна rows: id из кэша или одним запросом values_list,
+        посты - из кэша объектов. kind - вид окна из posts.pagination.
+        """
+        options = config()
+        if not options['enabled'] or rows.query.is_empty():
+            return list(rows)
+        members, inserts = caching.get_versions(
+            [_members_version(self.name), _inserts_version(self.name)])
+        stamp = (members, None if kind == NEXT else inserts)
+        key = self.key(rows, kind)
+        cached = cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            ids = unpack(cached[2])
+        else:
+            with replicas.filling():
+                ids = list(rows.values_list('pk', flat=True))
+            limit = rows.query.high_mark - rows.query.low_mark
+            cache.set(key, (stamp, limit, pack(ids)), options['timeout'])
+            if kind == HEAD:
+                heads = cache.get(_heads_key(self.name)) or set()
+                if key not in heads:
+                    cache.set(_heads_key(self.name), heads | {key},
+                              options['timeout'])
+        return objects.hydrate(ids)
+
+
+def _prepend(name, post_id, timeout):
+    heads = list(cache.get(_heads_key(name)) or ())
+    found = cache.get_many(heads) if heads else {}
+    members, previous = caching.get_versions(
+        [_members_version(name), _inserts_version(name)])
+    inserts = caching.bump(_inserts_version(name))[_inserts_version(name)]
+    for key, (stamp, limit, data) in found.items():
+        # Окно переносится, только если с момента чтения в ленту не
+        # добавлялось ничего, кроме этого поста.
+        if stamp != (members, previous):
+            continue
+        ids = unpack(data)
+        if post_id not in ids:
+            ids = [post_id] + ids[:limit - 1]
+        cache.set(key, ((members, inserts), limit, pack(ids)), timeout)
+
+
+def post_created(post):
+    """Дописывает id нового поста в первые окна его лент."""
+    options = config()
+    if not options['enabled']:
+        return
+    names = feeds_of(post)
+
+    def prepend():
+        for name in names:
+            _prepend(name, post.pk, options['timeout'])
+
+    _now_and_on_commit(prepend)
+
+
+def _changed(names):
+    versions = [_members_version(name) for name in names]
+    _now_and_on_commit(lambda: caching.bump(*versions))
+
+
+def invalidate(names):
+    """Устаревают все окна лент names: для записи в обход сигналов."""
+    _changed(names)
+
+
+def post_deleted(post):
+    _changed(feeds_of(post))
+
+
+def post_moved(post, old_group_id):
+    """Пост сменил группу: меняется состав лент обеих групп."""
+    _changed([group_feed(group_id)
+              for group_id in (old_group_id, post.group_id)
+              if group_id is not None])
+
+
+def group_deleted(group):
+    _changed([group_feed(group.pk)])
@@ -0,0 +1,77 @@
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts import queryplan
+from posts.models import Post, Follow
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов основных страниц и отмечает '
+            'полные сканирования таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Пользователь для ленты подписок.')
+        parser.add_argument('--ignore', action='append', default=[],
+                            metavar='TABLE',
+                            help='Не отмечать сканирование таблицы.')
+        parser.add_argument('--verbose', action='store_true',
+                            help='Печатать планы всех запросов.')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться ошибкой при замечаниях.')
+
+    def handle(self, *args, **options):
+        client = Client()
+        user = self.get_user(options['user'])
+        if user is not None:
+            client.force_login(user)
+        # Кэш страниц скрыл бы запросы представлений.
+        with override_settings(POSTS_CACHE={'enabled': False}):
+            report = queryplan.audit(client, self.urls(user),
+                                     options['ignore'])
+
+        flagged = 0
+        for row in report:
+            if not row['problems'] and not options['verbose']:
+                continue
+            flagged += bool(row['problems'])
+            marker = '!!' if row['problems'] else 'ok'
+            self.stdout.write(f'{marker} {row["view"]} {row["url"]}: '
+                              f'{", ".join(row["problems"])}')
+            self.stdout.write(f'   {row["sql"]}')
+            for line in row['plan']:
+                self.stdout.write(f'     {line}')
+        self.stdout.write(f'Запросов: {len(report)}, с замечаниями: {flagged}')
+        if flagged and options['fail']:
+            raise CommandError('Найдены запросы с полным сканированием.')
+
+    def get_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        follow = Follow.objects.select_related('user').first()
+        return follow.user if follow else User.objects.first()
+
+    def urls(self, user):
+        urls = [('index', reverse('index'))]
+        post = Post.objects.select_related('author').first()
+        if post is not None:
+            username = post.author.username
+            urls += [
+                ('profile', reverse('profile', args=[username])),
+                ('post', reverse('post', args=[username, post.pk])),
+                ('search', reverse('search') + '?' + urlencode(
+                    {'q': post.text[:30]})),
+            ]
+        grouped = Post.objects.filter(group__isnull=False).select_related(
+            'group').first()
+        if grouped is not None:
+            urls.append(('group', reverse('group', args=[grouped.group.slug])))
+        if user is not None:
+            urls.append(('follow_index', reverse('follow_index')))
+        return urls
@@ -0,0 +1,154 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from posts.models import Post, Group, Follow
+from yatube import benchmark
+from yatube.wsgi import application
+
+
+User = get_user_model()
+
+DEFAULT_MIX = 'index=40,index_deep=10,group=15,profile=15,post=15,follow=5'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        mix[kind.strip()] = float(weight or 1)
+    unknown = set(mix) - set(Command.KINDS)
+    if unknown:
+        raise CommandError(f'Неизвестные виды запросов: {", ".join(unknown)}')
+    return mix
+
+
+def sample(model, size, rnd, **filters):
+    """Случайные объекты без ORDER BY RANDOM(): поиск от случайного pk."""
+    queryset = model.objects.filter(**filters)
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    found = {}
+    for _ in range(size * 2):
+        pk = rnd.randint(bounds['low'], bounds['high'])
+        obj = queryset.filter(pk__gte=pk).order_by('pk').first()
+        if obj is not None:
+            found[obj.pk] = obj
+        if len(found) >= size:
+            break
+    return list(found.values())
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет смесь URL через WSGI- или ASGI-приложение и сообщает '
+            'p50/p95/p99, число SQL-запросов и пропускную способность.')
+
+    KINDS = ('index', 'index_deep', 'group', 'profile', 'post', 'follow')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Число одновременных клиентов.')
+        parser.add_argument('--server', choices=('wsgi', 'asgi', 'both'),
+                            default='wsgi')
+        parser.add_argument('--workers', type=int,
+                            help='Потоков сервера (по умолчанию '
+                                 '--concurrency); у ASGI - размер пулов.')
+        parser.add_argument('--slow-client', type=float, default=0,
+                            metavar='MS',
+                            help='Сколько миллисекунд клиент получает ответ.')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help='Веса видов запросов: index=40,post=10,...')
+        parser.add_argument('--pool', type=int, default=100,
+                            help='Сколько объектов выбрать для URL.')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--save-baseline', metavar='PATH')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Сравнить с сохраненным прогоном.')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        if options['server'] == 'both' and (options['save_baseline']
+                                            or options['compare']):
+            raise CommandError('Базовый прогон сохраняется и сравнивается '
+                               'для одного сервера.')
+        rnd = random.Random(options['seed'])
+        mix = parse_mix(options['mix'])
+        pools = self.build_pools(options['pool'], rnd)
+        available = {kind: weight for kind, weight in mix.items()
+                     if pools.get(kind)}
+        if not available:
+            raise CommandError('Нет данных для запросов: '
+                               'запустите generate_data.')
+        kinds = list(available)
+        weights = [available[kind] for kind in kinds]
+        plan = []
+        for _ in range(options['requests']):
+            kind, = rnd.choices(kinds, weights)
+            url, cookies = rnd.choice(pools[kind])
+            plan.append((kind, url, cookies))
+
+        servers = (('wsgi', 'asgi') if options['server'] == 'both'
+                   else (options['server'],))
+        reports = {}
+        for server in servers:
+            report = self.run_server(server, plan, options)
+            reports[server] = report
+            self.stdout.write(f'{server.upper()}:')
+            self.stdout.write(benchmark.format_report(report))
+        if len(reports) > 1:
+            ratio = (reports['asgi']['throughput']
+                     / max(reports['wsgi']['throughput'], 1e-9))
+            self.stdout.write(f'ASGI/WSGI по пропускной способности: '
+                              f'x{ratio:.2f}')
+
+        if options['save_baseline']:
+            benchmark.save_baseline(report, options['save_baseline'])
+        if options['compare']:
+            regressions = benchmark.compare(
+                report, benchmark.load_baseline(options['compare']),
+                options['tolerance'])
+            if regressions:
+                raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write('Регрессий нет.')
+
+    def run_server(self, server, plan, options):
+        workers = options['workers'] or options['concurrency']
+        client_delay = options['slow_client'] / 1000
+        if server == 'wsgi':
+            # Клиентов больше, чем потоков, WSGI-сервер все равно
+            # обслуживает не больше workers одновременно.
+            samples, elapsed = benchmark.run(application, plan, workers,
+                                             client_delay)
+        else:
+            from yatube.asgi import ASGIHandler
+            handler = ASGIHandler(read_workers=workers, workers=workers)
+            try:
+                samples, elapsed = benchmark.run_asgi(
+                    handler, plan, options['concurrency'], client_delay)
+            finally:
+                handler.close()
+        return benchmark.summarize(samples, elapsed)
+
+    def build_pools(self, size, rnd):
+        posts = sample(Post, size, rnd)
+        authors = {post.author_id for post in posts}
+        usernames = dict(User.objects.filter(pk__in=authors).values_list(
+            'pk', 'username'))
+        pages = max(1, Post.objects.count() // 10)
+        followers = sample(Follow, max(1, size // 10), rnd)
+        return {
+            'index': [('/', None)],
+            'index_deep': [(f'/?page={rnd.randint(1, pages)}', None)
+                           for _ in range(size)],
+            'group': [(f'/group/{group.slug}/', None)
+                      for group in sample(Group, size, rnd)],
+            'profile': [(f'/{name}/', None) for name in usernames.values()],
+            'post': [(f'/{usernames[post.author_id]}/{post.pk}/', None)
+                     for post in posts],
+            'follow': [('/follow/', benchmark.session_cookies(follow.user))
+                       for follow in followers],
+        }
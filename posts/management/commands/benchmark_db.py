@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.conf import settings
+from django.test import override_settings
+
+from posts.models import Post, Comment
+from yatube import writes
+from yatube.benchmark import percentile
+
+
+MARKER = 'benchmark_db'
+
+PROFILES = {
+    # Журнал по умолчанию: читатели и писатель блокируют друг друга.
+    'default': {'pragmas': {'journal_mode': 'DELETE'}, 'coalesce': False},
+    'production': {'pragmas': settings.SQLITE_PRAGMAS, 'coalesce': False},
+}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает основную БД параллельными читателями ленты и '
+            'писателями комментариев и сравнивает профили SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append',
+                            choices=sorted(PROFILES),
+                            help='Профиль (можно несколько; по умолчанию '
+                                 'все).')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--coalesce', choices=('auto', 'on', 'off'),
+                            default='auto',
+                            help='Объединять записи: auto - как в профиле.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        targets = list(Post.objects.values_list('pk', 'author_id')[:1000])
+        if not targets:
+            raise CommandError('Нет постов: запустите generate_data.')
+        database = connections.databases[DEFAULT_DB_ALIAS]
+        original = database.get('OPTIONS', {})
+        self.stdout.write(f'{"profile":<12}{"reads/s":>10}{"writes/s":>10}'
+                          f'{"w p95 ms":>10}{"errors":>8}')
+        try:
+            for name in options['profile'] or sorted(PROFILES):
+                profile = PROFILES[name]
+                # Новые соединения потоков откроются уже с PRAGMA профиля.
+                connections.close_all()
+                database['OPTIONS'] = dict(original, timeout=5,
+                                           pragmas=profile['pragmas'])
+                # journal_mode сохраняется в файле БД и переключается
+                # только без других соединений - до запуска потоков.
+                connections[DEFAULT_DB_ALIAS].ensure_connection()
+                connections.close_all()
+                coalesce = {'on': True, 'off': False}.get(
+                    options['coalesce'], profile['coalesce'])
+                with override_settings(WRITE_COALESCING=dict(
+                        writes.config(), enabled=coalesce)):
+                    result = self.load(options, targets, rnd)
+                self.stdout.write(
+                    f'{name:<12}{result["reads"]:>10.1f}'
+                    f'{result["writes"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                    f'{result["errors"]:>8}')
+        finally:
+            connections.close_all()
+            database['OPTIONS'] = original
+            Comment.objects.filter(text=MARKER).delete()
+
+    def load(self, options, targets, rnd):
+        deadline = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        latencies = []
+
+        def reader():
+            while time.monotonic() < deadline:
+                try:
+                    list(Post.objects.select_related('author', 'group')[:10])
+                except OperationalError:
+                    with lock:
+                        counts['errors'] += 1
+                    continue
+                with lock:
+                    counts['reads'] += 1
+
+        def writer(seed):
+            local = random.Random(seed)
+            while time.monotonic() < deadline:
+                post_id, author_id = local.choice(targets)
+                start = time.perf_counter()
+                try:
+                    writes.run(Comment.objects.create, post_id=post_id,
+                               author_id=author_id, text=MARKER)
+                except OperationalError:
+                    with lock:
+                        counts['errors'] += 1
+                    continue
+                with lock:
+                    counts['writes'] += 1
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+        def run(target, *args):
+            try:
+                target(*args)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(reader,))
+                   for _ in range(options['readers'])]
+        threads += [threading.Thread(target=run,
+                                     args=(writer, rnd.random()))
+                    for _ in range(options['writers'])]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        return {'reads': counts['reads'] / elapsed,
+                'writes': counts['writes'] / elapsed,
+                'p95_ms': percentile(latencies, .95),
+                'errors': counts['errors']}
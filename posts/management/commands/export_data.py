@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты, комментарии, группы и подписки в '
+            'NDJSON или CSV, по файлу на таблицу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов выгрузки.')
+        parser.add_argument('--tables', nargs='+', choices=list(export.TABLES),
+                            default=list(export.TABLES))
+        parser.add_argument('--format', choices=export.FORMATS,
+                            default='ndjson')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать файлы (расширение .gz).')
+        parser.add_argument('--chunk-size', type=int,
+                            default=export.CHUNK_SIZE,
+                            help='Строк в пачке чтения и записи.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить с курсора прошлого запуска.')
+        parser.add_argument('--executor', choices=('thread', 'process'),
+                            default='thread')
+        parser.add_argument('--workers', type=int,
+                            help='Число воркеров (по умолчанию - по таблице '
+                                 'на воркер).')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным.')
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as error:
+            raise CommandError(error)
+        tables = list(dict.fromkeys(options['tables']))
+        workers = options['workers'] or len(tables)
+        failed = 0
+        with export.make_executor(options['executor'], workers) as executor:
+            futures = {
+                executor.submit(
+                    export.export_in_worker, table, directory,
+                    options['format'], options['gzip'],
+                    options['chunk_size'], options['resume']): table
+                for table in tables}
+            for future, table in futures.items():
+                try:
+                    _, path, written = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{table}: {error}')
+                    continue
+                self.stdout.write(f'{table}: {written} строк -> {path}')
+        if failed:
+            raise CommandError(f'Не выгружено таблиц: {failed}')
@@ -0,0 +1,229 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import caching, feed, idfeed
+from posts.models import Post, Group, Comment, Follow
+
+
+User = get_user_model()
+
+WORDS = ('пост', 'лента', 'новости', 'кот', 'город', 'погода', 'книга',
+         'музыка', 'путешествие', 'код', 'python', 'django', 'утро', 'вечер')
+
+
+# Версий в одном set_many при сбросе кэша.
+BUMP_CHUNK = 500
+
+
+def zipf_weights(n, alpha):
+    """Накопленные веса степенного распределения: ранг 1 самый популярный."""
+    return list(accumulate(1 / (rank ** alpha) for rank in range(1, n + 1)))
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add полей: даты генерируемых записей задаются."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def _chunks(items, size=BUMP_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = ('Генерирует нагрузочные данные через bulk_create: пользователей, '
+            'группы, посты, комментарии и подписки со степенным '
+            'распределением популярности авторов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного закона.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько последних дней идут посты.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс имен пользователей и групп.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        prefix = options['prefix']
+
+        user_ids = self.create_users(prefix, options['users'])
+        group_ids = self.create_groups(prefix, options['groups'])
+        # Популярность авторов: случайная перестановка рангов Zipf.
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        weights = zipf_weights(len(authors), options['alpha'])
+
+        posts = self.create_posts(authors, weights, group_ids,
+                                  options['posts'], options['days'])
+        self.create_comments(user_ids, posts, options['comments'])
+        followed = self.create_follows(user_ids, authors, weights,
+                                       options['follows'])
+        self.refresh(prefix, user_ids, group_ids, followed)
+
+    def refresh(self, prefix, user_ids, group_ids, followed):
+        """
+        bulk_create не вызывает сигналы: счетчики, поисковый индекс,
+        лента подписок и версии кэша обновляются разом после загрузки.
+        """
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        feed.rebuild(sorted(followed))
+        usernames = list(User.objects.filter(
+            username__startswith=f'{prefix}_user_').values_list(
+                'username', flat=True))
+        slugs = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-').values_list(
+                'slug', flat=True))
+        versions = ([caching.POSTS]
+                    + [caching.group_version(slug) for slug in slugs]
+                    + [caching.author_version(name) for name in usernames]
+                    + [caching.follow_version(pk) for pk in user_ids])
+        for chunk in _chunks(versions):
+            caching.bump(*chunk)
+        feeds = ([idfeed.INDEX]
+                 + [idfeed.group_feed(pk) for pk in group_ids]
+                 + [idfeed.author_feed(pk) for pk in user_ids])
+        for chunk in _chunks(feeds):
+            idfeed.invalidate(chunk)
+
+    def batches(self, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def text(self, words=12):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        users = (User(username=f'{prefix}_user_{i}', password=password)
+                 for i in range(count))
+        for batch in self.batches(users):
+            User.objects.bulk_create(batch, ignore_conflicts=True)
+        ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_user_').values_list(
+                'pk', flat=True))
+        self.stdout.write(f'Пользователей: {len(ids)}')
+        return ids
+
+    def create_groups(self, prefix, count):
+        groups = (Group(title=f'Группа {i}', slug=f'{prefix}-group-{i}',
+                        description=self.text())
+                  for i in range(count))
+        for batch in self.batches(groups):
+            Group.objects.bulk_create(batch, ignore_conflicts=True)
+        ids = list(Group.objects.filter(
+            slug__startswith=f'{prefix}-group-').values_list(
+                'pk', flat=True))
+        self.stdout.write(f'Групп: {len(ids)}')
+        return ids
+
+    def create_posts(self, authors, weights, group_ids, count, days):
+        """Посты за последние days дней по возрастанию даты: [(id, дата)]."""
+        first = self.now - timedelta(days=days)
+        step = (self.now - first) / max(count, 1)
+
+        def posts():
+            for number in range(count):
+                author, = self.random.choices(authors, cum_weights=weights)
+                group = (self.random.choice(group_ids)
+                         if group_ids and self.random.random() < 0.5
+                         else None)
+                pub_date = first + step * (number + self.random.random())
+                yield Post(text=self.text(), author_id=author,
+                           group_id=group, pub_date=pub_date)
+
+        start = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            for batch in self.batches(posts()):
+                Post.objects.bulk_create(batch)
+        rows = list(Post.objects.filter(pk__gt=start).order_by(
+            'pk').values_list('pk', 'pub_date'))
+        self.stdout.write(f'Постов: {len(rows)}')
+        return rows
+
+    def create_comments(self, user_ids, posts, count):
+        if not posts:
+            return
+        # Комментарии тоже скошены: свежие посты обсуждают чаще.
+        weights = zipf_weights(len(posts), 0.8)
+        recent_first = posts[::-1]
+
+        def comments():
+            for _ in range(count):
+                post_id, pub_date = self.random.choices(
+                    recent_first, cum_weights=weights)[0]
+                # Комментарий пишется после поста, чаще всего вскоре.
+                created = pub_date + (self.now - pub_date) * (
+                    self.random.random() ** 3)
+                yield Comment(text=self.text(6), post_id=post_id,
+                              author_id=self.random.choice(user_ids),
+                              created=created)
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            for batch in self.batches(comments()):
+                Comment.objects.bulk_create(batch)
+        self.stdout.write(f'Комментариев: {count}')
+
+    def create_follows(self, user_ids, authors, weights, count):
+        """
+        Создает до count новых подписок пачками; возвращает id авторов,
+        на которых подписывались.
+
+        Повторы убираются внутри пачки, а с уже существующими подписками
+        разбирается уникальный индекс (ignore_conflicts): весь граф в
+        память не читается. Число созданных считается по id после пачки.
+        """
+        created = 0
+        attempts = 0
+        followed = set()
+        while created < count and attempts < count * 10:
+            size = min(self.batch_size, count - created)
+            edges = set()
+            while len(edges) < size and attempts < count * 10:
+                attempts += 1
+                user = self.random.choice(user_ids)
+                author, = self.random.choices(authors, cum_weights=weights)
+                if user != author:
+                    edges.add((user, author))
+            last = Follow.objects.order_by('-pk').values_list(
+                'pk', flat=True).first() or 0
+            Follow.objects.bulk_create(
+                [Follow(user_id=user, author_id=author)
+                 for user, author in edges], ignore_conflicts=True)
+            created += Follow.objects.filter(pk__gt=last).count()
+            followed.update(author for _, author in edges)
+        self.stdout.write(f'Подписок: {created}')
+        return followed
@@ -0,0 +1,45 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Параллельно создает миниатюры для уже загруженных изображений.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--executor', choices=('thread', 'process'),
+                            help='Тип пула (по умолчанию из настроек).')
+        parser.add_argument('--workers', type=int,
+                            help='Число воркеров пула.')
+
+    def handle(self, *args, **options):
+        names = (Post.objects.exclude(image='').exclude(image__isnull=True)
+                 .values_list('image', flat=True).distinct())
+        workers = options['workers'] or thumbnails.config()['workers']
+        self.done = self.failed = 0
+        with thumbnails.make_executor(options['executor'],
+                                      workers) as executor:
+            pending = {}
+            for name in names.iterator():
+                future = executor.submit(thumbnails.generate_in_worker, name)
+                pending[future] = name
+                # Ограничиваем число задач в очереди, чтобы не держать
+                # в памяти весь список изображений.
+                if len(pending) >= workers * 4:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    self.collect(finished, pending)
+            self.collect(wait(pending)[0], pending)
+        self.stdout.write(
+            f'Создано миниатюр: {self.done}, ошибок: {self.failed}')
+
+    def collect(self, finished, pending):
+        for future in finished:
+            name = pending.pop(future)
+            try:
+                self.done += future.result()
+            except Exception as error:
+                self.failed += 1
+                self.stderr.write(f'{name}: {error}')
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+
+
+class Command(BaseCommand):
+    help = ('Импортирует подписки из CSV (столбцы follower, author) или '
+            'NDJSON ({"follower": ..., "author": ...}) пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл или '-' для stdin.")
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help='Формат (по умолчанию - по расширению).')
+        parser.add_argument('--ids', action='store_true',
+                            help='В файле id пользователей, а не username.')
+        parser.add_argument('--batch-size', type=int,
+                            default=follows.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        self.invalid = 0
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            try:
+                stream = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(error)
+        with stream:
+            rows = (self.read_csv(stream) if file_format == 'csv'
+                    else self.read_ndjson(stream))
+            stats = follows.import_edges(self.edges(rows, options['ids']),
+                                         options['batch_size'],
+                                         by_username=not options['ids'])
+        self.stdout.write(
+            f'Прочитано: {stats["read"]}; создано: {stats["created"]}; '
+            f'уже были: {stats["existing"]}; пропущено: {stats["skipped"]}; '
+            f'с ошибками: {self.invalid}')
+
+    def read_csv(self, stream):
+        reader = csv.DictReader(stream)
+        if not {'follower', 'author'} <= set(reader.fieldnames or ()):
+            raise CommandError('Нужны столбцы follower и author.')
+        for row in reader:
+            yield reader.line_num, row
+
+    def read_ndjson(self, stream):
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else {}
+
+    def edges(self, rows, ids):
+        """Пары (подписчик, автор); некорректные строки пропускаются."""
+        for number, row in rows:
+            follower, author = row.get('follower'), row.get('author')
+            try:
+                if ids:
+                    follower, author = int(follower), int(author)
+                elif follower and author:
+                    follower, author = str(follower), str(author)
+                else:
+                    raise ValueError
+            except (TypeError, ValueError):
+                self.invalid += 1
+                self.stderr.write(f'Строка {number}: нет follower/author.')
+                continue
+            yield follower, author
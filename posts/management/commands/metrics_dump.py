@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import instrumentation
+
+
+class Command(BaseCommand):
+    help = 'Выводит метрики запросов, собранные QueryBudgetMiddleware.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', dest='directory',
+            help='Каталог снимков (по умолчанию '
+                 'INSTRUMENTATION["snapshot_dir"]).')
+        parser.add_argument(
+            '--format', choices=('summary', 'prometheus'), default='summary')
+
+    def handle(self, *args, **options):
+        directory = (options['directory']
+                     or instrumentation.config()['snapshot_dir'])
+        if not directory:
+            raise CommandError('Не задан каталог снимков метрик.')
+        views = instrumentation.merge_snapshots(
+            instrumentation.load_snapshots(directory))
+        if options['format'] == 'prometheus':
+            self.stdout.write(instrumentation.render_prometheus(views))
+        else:
+            self.stdout.write(instrumentation.render_summary(views))
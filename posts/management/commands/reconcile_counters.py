@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.models import UserStats
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки при создании недостающих UserStats.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True)
+        created = 0
+        with transaction.atomic():
+            batch = []
+            for user_id in missing.iterator():
+                batch.append(UserStats(user_id=user_id))
+                if len(batch) >= batch_size:
+                    created += len(UserStats.objects.bulk_create(
+                        batch, ignore_conflicts=True))
+                    batch = []
+            if batch:
+                created += len(UserStats.objects.bulk_create(
+                    batch, ignore_conflicts=True))
+            posts = counters.reconcile_posts()
+            users = counters.reconcile_users()
+        self.stdout.write(
+            f'Создано UserStats: {created}; исправлено постов: {posts}, '
+            f'пользователей: {users}')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yatube import replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite БД в локальные реплики '
+            '(замена репликации для разработки).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять каждые N секунд.')
+
+    def handle(self, *args, **options):
+        if not replicas.config()['aliases']:
+            raise CommandError(
+                'Реплики не настроены: задайте YATUBE_REPLICAS.')
+        while True:
+            synced = replicas.sync()
+            self.stdout.write(f'Синхронизированы: {", ".join(synced)}')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.6 on 2026-10-18 16:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db import DatabaseError
+
+
+def create_fts(apps, schema_editor):
+    # Таблица FTS5 нужна только на SQLite со сборкой, где есть FTS5;
+    # иначе posts.search использует индекс на моделях ниже.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search_fts USING "
+            "fts5(body, post_id UNINDEXED, tokenize='unicode61')")
+    except DatabaseError:
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('p', 'post'), ('c', 'comment')], max_length=1)),
+                ('object_id', models.PositiveIntegerField()),
+                ('length', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='posts.Post')),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=100)),
+                ('frequency', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='posts.SearchDocument')),
+            ],
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
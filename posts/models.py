@@ -8,14 +8,25 @@ class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(
         'date published', auto_now_add=True, db_index=True)
+    # Отдельные индексы не нужны: их заменяют составные индексы ниже.
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name='posts')
+                               related_name='posts', db_index=False)
     group = models.ForeignKey('Group', on_delete=models.SET_NULL,
-                              blank=True, null=True, related_name='posts')
+                              blank=True, null=True, related_name='posts',
+                              db_index=False)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Денормализованный счетчик, поддерживается posts.counters.
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        # Ленты профиля и группы: фильтр и сортировка по одному индексу.
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='posts_post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date'],
+                         name='posts_post_group_date_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -32,18 +43,81 @@ class Comment(models.Model):
     created = models.DateTimeField(verbose_name='date created ',
                                    auto_now_add=True)
     post = models.ForeignKey('Post', on_delete=models.CASCADE,
-                             related_name='comments')
+                             related_name='comments', db_index=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='comments')
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='posts_comment_post_date_idx'),
+        ]
 
 
 class Follow(models.Model):
     #  ссылка на объект пользователя, который подписывается.
+    # Индекс по user дает уникальный составной индекс (user, author).
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='follower')
+        User, on_delete=models.CASCADE, related_name='follower',
+        db_index=False)
     # ссылка на объект пользователя, на которого подписываются.
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='following')
+
+    class Meta:
+        unique_together = ('user', 'author')
+
+
+class UserStats(models.Model):
+    """Денормализованные счетчики пользователя, см. posts.counters."""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='stats')
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
+
+class FeedEntry(models.Model):
+    """Материализованная лента подписок: пост во "входящих" подписчика."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='feed_entries')
+    # Копия post.pub_date, чтобы лента читалась по индексу (user, pub_date).
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='posts_feed_user_date_idx'),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Документ переносимого поискового индекса (posts.search): текст поста
+    или комментария, приписанный к посту.
+    """
+    POST = 'p'
+    COMMENT = 'c'
+    KINDS = ((POST, 'post'), (COMMENT, 'comment'))
+
+    kind = models.CharField(max_length=1, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='search_documents')
+    # Число термов документа, нужно для BM25.
+    length = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+
+class SearchPosting(models.Model):
+    """Вхождение терма в документ: строка инвертированного индекса."""
+    term = models.CharField(max_length=100, db_index=True)
+    document = models.ForeignKey(
+        SearchDocument, on_delete=models.CASCADE, related_name='postings')
+    frequency = models.PositiveIntegerField()
@@ -0,0 +1,263 @@
+"""
+Кэш объектов по ключу: пользователь по username и id, пост по id,
+группа по slug и id.
+
+Представления берут автора, пост и группу отсюда, а не из БД. Объект
+ищется в LRU-кэше процесса (до max_entries записей, каждая живет
+local_ttl секунд), затем в общем кэше Django и только потом в БД;
+get_many делает это для пачки ключей одним get_many кэша и одним
+запросом. Хранится кортеж значений полей, а объект каждый раз
+собирается заново через from_db, поэтому вызывающий может его менять.
+
+Сигналы сохранения и удаления сбрасывают ключи объекта сразу и еще раз
+после коммита, чтобы параллельный запрос не вернул в кэш старую строку.
+Кэши процессов других воркеров видят изменение через local_ttl секунд,
+поэтому рендер страницы для общего кэша (posts.caching.cached_page)
+читает объекты внутри shared_only(), мимо кэша процесса: иначе старый
+объект попал бы в страницу под новой версией.
+
+Пользователь хранится без пароля, email и прочих полей, которые не
+нужны шаблонам (USER_FIELDS): остальные поля загрузятся из БД, если к
+ним обратятся.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+from django.utils.functional import cached_property
+
+from yatube import instrumentation, replicas
+
+from .models import Post, Group
+
+
+User = get_user_model()
+
+DEFAULTS = {
+    'enabled': True,
+    # Время жизни в общем кэше, сек.
+    'timeout': 300,
+    # Время жизни в кэше процесса, сек.
+    'local_ttl': 5,
+    'max_entries': 10000,
+}
+
+# Поля пользователя в кэше: то, что выводят шаблоны.
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_OBJECT_CACHE', {}))
+    return options
+
+
+class LRUCache:
+    """Записи с временем жизни; при переполнении вытесняются давно не
+    читанные."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, max_entries):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_local = LRUCache()
+_registry = {}
+_bypass = threading.local()
+
+
+@contextmanager
+def shared_only():
+    """Читает объекты в блоке мимо кэша процесса."""
+    previous = getattr(_bypass, 'active', False)
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = previous
+
+
+class ObjectCache:
+    """
+    Объекты модели model по значению уникального поля field. fields -
+    хранимые поля (по умолчанию все); field и первичный ключ нужны среди
+    них.
+    """
+
+    def __init__(self, model, field, fields=None):
+        self.model = model
+        self.field = field
+        self.fields = fields
+        _registry.setdefault(model, []).append(self)
+
+    @cached_property
+    def attnames(self):
+        if self.fields is None:
+            return [field.attname
+                    for field in self.model._meta.concrete_fields]
+        return [self.model._meta.get_field(name).attname
+                for name in self.fields]
+
+    @cached_property
+    def index(self):
+        """Позиция поля field в кортеже значений."""
+        field = self.model._meta.pk if self.field == 'pk' else (
+            self.model._meta.get_field(self.field))
+        return self.attnames.index(field.attname)
+
+    def key(self, value):
+        return f'obj:{self.model._meta.label_lower}:{self.field}:{value}'
+
+    def value(self, instance):
+        return instance.__dict__.get(self.attnames[self.index])
+
+    def build(self, row):
+        return self.model.from_db(DEFAULT_DB_ALIAS, self.attnames, row)
+
+    def fetch(self, values):
+        rows = self.model._base_manager.filter(
+            **{f'{self.field}__in': values}).values_list(*self.attnames)
+        with replicas.filling():
+            return {self.key(row[self.index]): row for row in rows}
+
+    def get_many(self, values):
+        """Объекты по значениям поля: {значение: объект}, без ненайденных."""
+        options = config()
+        keys = {self.key(value): value for value in values}
+        if not options['enabled']:
+            rows = self.fetch(list(keys.values()))
+        else:
+            now = time.monotonic()
+            rows = {}
+            if not getattr(_bypass, 'active', False):
+                for key in keys:
+                    row = _local.get(key, now)
+                    if row is not None:
+                        rows[key] = row
+            instrumentation.record_cache(True, len(rows))
+            rest = [key for key in keys if key not in rows]
+            if rest:
+                found = cache.get_many(rest)
+                missing = [keys[key] for key in rest if key not in found]
+                if missing:
+                    fetched = self.fetch(missing)
+                    cache.set_many(fetched, options['timeout'])
+                    found.update(fetched)
+                for key, row in found.items():
+                    _local.set(key, row, options['local_ttl'],
+                               options['max_entries'])
+                rows.update(found)
+        return {value: self.build(rows[key]) for key, value in keys.items()
+                if key in rows}
+
+    def get(self, value):
+        return self.get_many([value]).get(value)
+
+    def get_or_404(self, value):
+        instance = self.get(value)
+        if instance is None:
+            raise Http404(f'No {self.model._meta.object_name} matches '
+                          f'{self.field}={value}.')
+        return instance
+
+    def evict(self, value):
+        """Сбрасывает ключ, если строка изменилась в обход save()."""
+        _invalidate_keys([self.key(value)])
+
+
+users = ObjectCache(User, 'username', USER_FIELDS)
+users_by_id = ObjectCache(User, 'pk', USER_FIELDS)
+posts = ObjectCache(Post, 'pk')
+groups = ObjectCache(Group, 'slug')
+groups_by_id = ObjectCache(Group, 'pk')
+
+
+def _keys(instance):
+    return {cache_.key(cache_.value(instance))
+            for cache_ in _registry.get(type(instance), ())}
+
+
+def _forget(keys):
+    _local.delete_many(keys)
+    cache.delete_many(keys)
+    replicas.note_write()
+
+
+def _invalidate_keys(keys):
+    keys = list(keys)
+    _forget(keys)
+    transaction.on_commit(lambda: _forget(keys))
+
+
+def remember(instance):
+    """Запоминает ключи загруженного объекта: username и slug меняются."""
+    instance._object_keys = _keys(instance)
+
+
+def invalidate(instance):
+    keys = _keys(instance) | getattr(instance, '_object_keys', set())
+    instance._object_keys = _keys(instance)
+    _invalidate_keys(keys)
+
+
+def clear():
+    """Очищает кэш процесса (общий кэш очищается cache.clear())."""
+    _local.clear()
+
+
+def hydrate(post_ids):
+    """
+    Посты в порядке post_ids с авторами и группами из кэша объектов -
+    вместо запроса с JOIN. Ненайденные посты пропускаются.
+    """
+    found = posts.get_many(post_ids)
+    authors = users_by_id.get_many({post.author_id
+                                    for post in found.values()})
+    group_ids = {post.group_id for post in found.values()} - {None}
+    post_groups = groups_by_id.get_many(group_ids) if group_ids else {}
+    result = []
+    for post_id in post_ids:
+        post = found.get(post_id)
+        if post is None or post.author_id not in authors:
+            continue
+        post.author = authors[post.author_id]
+        post.group = post_groups.get(post.group_id)
+        result.append(post)
+    return result
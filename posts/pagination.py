@@ -0,0 +1,283 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator, Page, InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# Порядок ленты: pub_date индексирован, id разрешает совпадения дат.
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def ordering(field='pub_date'):
+    """Порядок ленты по дате field: FEED_ORDERING для pub_date."""
+    return f'-{field}', '-id'
+
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Виды окон ленты для posts.idfeed: первое окно, окна после и до
+# курсора (NEXT, PREVIOUS) и окна со смещением.
+HEAD = 'head'
+OFFSET = 'offset'
+
+
+def encode_position(direction, value, pk):
+    """Упаковывает позицию (дата, id) в непрозрачную строку."""
+    raw = f'{direction}|{value.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(obj, direction, field='pub_date'):
+    return encode_position(direction, getattr(obj, field), obj.pk)
+
+
+def decode_cursor(cursor):
+    """
+    Возвращает (direction, pub_date, id) или None, если курсор поврежден.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+def load(rows, feed, kind):
+    """
+    Вычисляет окно ленты rows (срез QuerySet): через ID-список feed
+    (posts.idfeed), если он задан, иначе обычным запросом.
+    """
+    if feed is None:
+        return list(rows)
+    return feed.load(rows, kind)
+
+
+def seek(queryset, cursor, limit, feed=None, field='pub_date'):
+    """
+    Выбирает limit постов после (или до) позиции курсора по дате field.
+
+    Запрос опирается только на индекс даты и не использует OFFSET,
+    поэтому стоимость не зависит от глубины страницы.
+    """
+    direction, value, pk = cursor
+    if direction == NEXT:
+        rows = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+        ).order_by(*ordering(field))[:limit]
+        return load(rows, feed, NEXT)
+    rows = queryset.filter(
+        Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk})
+    ).order_by(field, 'id')[:limit]
+    return list(reversed(load(rows, feed, PREVIOUS)))
+
+
+def after(queryset, cursor, field='pub_date'):
+    """
+    Объекты после позиции курсора NEXT в порядке (-field, -id); без
+    курсора - с самого начала. В отличие от seek возвращает QuerySet.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor is None or cursor[0] != NEXT:
+        return queryset
+    _, value, pk = cursor
+    return queryset.filter(
+        Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+
+def comments_page(queryset, cursor, limit):
+    """
+    Пачка из limit комментариев после позиции cursor (или самых новых)
+    и курсор следующей пачки.
+
+    Пачка возвращается вычисленным QuerySet: шаблон не повторит запрос.
+    Наличие продолжения проверяется чтением одной строки за пачкой.
+    """
+    queryset = after(queryset, decode_cursor(cursor), 'created')
+    page = queryset[:limit]
+    rows = list(page)
+    has_more = (len(rows) == limit
+                and queryset[limit:limit + 1].exists())
+    next_cursor = (encode_cursor(rows[-1], NEXT, field='created')
+                   if has_more else None)
+    return page, next_cursor
+
+
+class KeysetPage:
+    """Страница курсорной пагинации с интерфейсом, похожим на Page."""
+
+    def __init__(self, object_list, number, cursor,
+                 has_next, has_previous, field='pub_date'):
+        self.object_list = object_list
+        self.number = number
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = (encode_cursor(object_list[-1], NEXT, field)
+                            if has_next else None)
+        self.previous_cursor = (
+            encode_cursor(object_list[0], PREVIOUS, field)
+            if has_previous else None)
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return max(self.number - 1, 1)
+
+
+class KeysetPaginator:
+    """
+    Курсорная пагинация по (field, id) без COUNT и OFFSET.
+
+    Номер страницы хранится в URL только для отображения.
+    """
+
+    def __init__(self, object_list, per_page, count=None, feed=None,
+                 field='pub_date'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self._count = count
+        self.feed = feed
+        self.field = field
+
+    @property
+    def count(self):
+        # Считается лениво: только если шаблон действительно выводит число.
+        if callable(self._count):
+            self._count = self._count()
+        if self._count is None:
+            self._count = self.object_list.count()
+        return self._count
+
+    def page(self, cursor=None, number=1):
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            rows = load(self.object_list.order_by(
+                *ordering(self.field))[:self.per_page + 1], self.feed, HEAD)
+            has_more = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page], 1, None,
+                              has_next=has_more, has_previous=False,
+                              field=self.field)
+        direction = decoded[0]
+        rows = seek(self.object_list, decoded, self.per_page + 1,
+                    self.feed, self.field)
+        has_more = len(rows) > self.per_page
+        if direction == NEXT:
+            rows = rows[:self.per_page]
+            has_next, has_previous = has_more, True
+        else:
+            rows = rows[-self.per_page:]
+            has_next, has_previous = True, has_more
+        number = max(number, 1)
+        if not has_previous:
+            number = 1
+        return KeysetPage(rows, number, cursor,
+                          has_next=has_next and bool(rows),
+                          has_previous=has_previous and bool(rows),
+                          field=self.field)
+
+
+def _page_number(request):
+    try:
+        return int(request.GET.get('page') or 1)
+    except ValueError:
+        return 1
+
+
+def _offset_page(paginator, number, feed):
+    page = paginator.get_page(number)
+    # Paginator отдает окно страницы невычисленным срезом QuerySet.
+    page.object_list = load(page.object_list, feed,
+                            HEAD if page.number == 1 else OFFSET)
+    return page
+
+
+def _compat_page(paginator, cursor, number, feed=None, field='pub_date'):
+    """
+    Page для режима совместимости: номера страниц как у Paginator,
+    но при наличии курсора объекты выбираются через seek, без OFFSET.
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None:
+        page = _offset_page(paginator, number, feed)
+        page.cursor = None
+    else:
+        try:
+            number = paginator.validate_number(number)
+        except InvalidPage:
+            number = 1
+        rows = seek(paginator.object_list, decoded, paginator.per_page,
+                    feed, field)
+        page = Page(rows, number, paginator)
+        page.cursor = cursor
+    object_list = list(page.object_list)
+    page.object_list = object_list
+    page.next_cursor = (encode_cursor(object_list[-1], NEXT, field)
+                        if object_list and page.has_next() else None)
+    page.previous_cursor = (encode_cursor(object_list[0], PREVIOUS, field)
+                            if object_list and page.has_previous() else None)
+    return page
+
+
+def paginate(request, queryset, per_page=None, count=None, feed=None,
+             date_field='pub_date'):
+    """
+    Возвращает (paginator, page) для ленты постов.
+
+    Режим задается настройкой POSTS_PAGINATION:
+    'offset' - обычный Paginator, 'compat' - Paginator с переходом
+    на соседние страницы по курсору, 'keyset' - только курсоры.
+
+    count - готовое число постов или функция, которая его вернет
+    (см. posts.counting); без него Paginator выполнит COUNT(*).
+    feed - ID-список ленты (posts.idfeed.CachedFeed): окна страниц
+    берутся из него, а посты - из кэша объектов.
+    date_field - поле или аннотация даты, по которой лента сортируется
+    и листается курсорами.
+    """
+    per_page = per_page or getattr(settings, 'POSTS_PER_PAGE', 10)
+    mode = getattr(settings, 'POSTS_PAGINATION', 'compat')
+    queryset = queryset.order_by(*ordering(date_field))
+    number = _page_number(request)
+    cursor = request.GET.get('cursor')
+    if mode == 'keyset':
+        paginator = KeysetPaginator(queryset, per_page, count, feed,
+                                    date_field)
+        return paginator, paginator.page(cursor, number)
+    paginator = Paginator(queryset, per_page)
+    if count is not None:
+        # count у Paginator - cached_property, значение можно задать заранее.
+        paginator.count = count() if callable(count) else count
+    if mode == 'offset':
+        return paginator, _offset_page(paginator, number, feed)
+    return paginator, _compat_page(paginator, cursor, number, feed,
+                                   date_field)
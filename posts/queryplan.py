@@ -0,0 +1,78 @@
+"""
+Аудит планов запросов представлений: EXPLAIN для каждого SELECT,
+выполненного при рендере страницы, с пометкой полных сканирований
+таблиц и сортировок без индекса.
+"""
+import re
+
+from django.db import connection
+
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT_RE = re.compile(r'^\s*(?:->\s*)?Sort\b')
+
+
+class QueryCollector:
+    """execute_wrapper, запоминающий SELECT с параметрами."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    """Строки плана запроса для текущей БД."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            # (id, parent, notused, detail)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def problems(plan, ignore=()):
+    """Замечания к плану: полные сканирования и сортировки без индекса."""
+    found = []
+    for line in plan:
+        if connection.vendor == 'sqlite':
+            match = SQLITE_SCAN_RE.match(line.strip())
+            if line.strip().startswith('USE TEMP B-TREE FOR ORDER BY'):
+                found.append('сортировка без индекса')
+        else:
+            match = POSTGRES_SCAN_RE.search(line)
+            if POSTGRES_SORT_RE.match(line):
+                found.append('сортировка без индекса')
+        # Служебные таблицы SQLite (интроспекция схемы) не в счет.
+        if (match and match.group(1) not in ignore
+                and not match.group(1).startswith('sqlite_')):
+            found.append(f'полное сканирование {match.group(1)}')
+    return found
+
+
+def audit(client, urls, ignore=()):
+    """
+    Открывает urls клиентом и возвращает список замечаний:
+    [{'view': ..., 'url': ..., 'sql': ..., 'plan': [...],
+      'problems': [...]}, ...] - по одному на уникальный запрос.
+    """
+    report = []
+    for name, url in urls:
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            response = client.get(url)
+        seen = set()
+        for sql, params in collector.queries:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            plan = explain(sql, params)
+            report.append({'view': name, 'url': url,
+                           'status': response.status_code, 'sql': sql,
+                           'plan': plan, 'problems': problems(plan, ignore)})
+    return report
@@ -0,0 +1,278 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+Основной движок - виртуальная таблица SQLite FTS5 (см. миграцию 0011),
+в которой хранятся уже нормализованные основы слов (posts.stemmer).
+Без FTS5 используется инвертированный индекс на моделях SearchDocument
+и SearchPosting с ранжированием BM25 на Python. Индекс обновляется
+фоновой задачей posts.tasks.reindex, которую ставят сигналы при
+сохранении и удалении постов и комментариев.
+"""
+import base64
+import binascii
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count
+
+from .models import Post, Comment, SearchDocument, SearchPosting
+from .stemmer import tokenize
+
+
+FTS_TABLE = 'posts_search_fts'
+
+POST = SearchDocument.POST
+COMMENT = SearchDocument.COMMENT
+
+DEFAULTS = {
+    # 'fts5', 'python' или 'auto' - FTS5, если таблица есть в БД.
+    'backend': 'auto',
+    'per_page': 10,
+    # Вес совпадения в комментарии относительно совпадения в посте.
+    'comment_weight': 0.5,
+    # Сколько лучших документов ранжируется на один запрос.
+    'max_hits': 1000,
+    # Время жизни статистики корпуса для BM25 в Python-индексе.
+    'stats_timeout': 60,
+}
+
+# BM25 с теми же параметрами, что у bm25() в FTS5.
+K1 = 1.2
+B = 0.75
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_SEARCH', {}))
+    return options
+
+
+class FTS5Backend:
+    name = 'fts5'
+
+    @staticmethod
+    def rowid(kind, object_id):
+        # Пост и комментарий с одинаковым id не должны совпасть.
+        return object_id * 2 + (kind == COMMENT)
+
+    def index(self, kind, object_id, post_id, terms):
+        rowid = self.rowid(kind, object_id)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [rowid])
+            if terms:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, body, post_id) '
+                    f'VALUES (%s, %s, %s)', [rowid, ' '.join(terms), post_id])
+
+    def remove(self, kind, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [self.rowid(kind, object_id)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def hits(self, terms, limit):
+        """(post_id, kind, score) лучших документов со всеми термами."""
+        match = ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, post_id, -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+                [match, limit])
+            return [(post_id, COMMENT if rowid % 2 else POST, score)
+                    for rowid, post_id, score in cursor.fetchall()]
+
+
+class PythonBackend:
+    name = 'python'
+
+    def index(self, kind, object_id, post_id, terms):
+        self.remove(kind, object_id)
+        if not terms:
+            return
+        document = SearchDocument.objects.create(
+            kind=kind, object_id=object_id, post_id=post_id,
+            length=len(terms))
+        SearchPosting.objects.bulk_create(
+            SearchPosting(term=term[:100], document=document,
+                          frequency=frequency)
+            for term, frequency in Counter(terms).items())
+
+    def remove(self, kind, object_id):
+        SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+    def clear(self):
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        cache.delete('search:corpus')
+
+    def corpus(self):
+        """(число документов, средняя длина) - кэшируется ненадолго."""
+        stats = cache.get('search:corpus')
+        if stats is None:
+            row = SearchDocument.objects.aggregate(
+                documents=Count('pk'), length=Avg('length'))
+            stats = (row['documents'], row['length'] or 0)
+            cache.set('search:corpus', stats, config()['stats_timeout'])
+        return stats
+
+    def hits(self, terms, limit):
+        wanted = set(term[:100] for term in terms)
+        postings = SearchPosting.objects.filter(term__in=wanted).values_list(
+            'document_id', 'term', 'frequency', 'document__kind',
+            'document__post_id', 'document__length')
+        documents = {}
+        frequencies = Counter()
+        for document_id, term, frequency, kind, post_id, length in postings:
+            entry = documents.setdefault(document_id, (kind, post_id, length,
+                                                       {}))
+            entry[3][term] = frequency
+            frequencies[term] += 1
+
+        total, average = self.corpus()
+        total = max(total, len(documents))
+        average = average or 1
+        idf = {term: math.log(1 + (total - frequencies[term] + .5)
+                              / (frequencies[term] + .5))
+               for term in wanted}
+        hits = []
+        for kind, post_id, length, tf in documents.values():
+            if len(tf) < len(wanted):
+                continue
+            norm = K1 * (1 - B + B * length / average)
+            score = sum(idf[term] * tf[term] * (K1 + 1) / (tf[term] + norm)
+                        for term in wanted)
+            hits.append((post_id, kind, score))
+        hits.sort(key=lambda hit: hit[2], reverse=True)
+        return hits[:limit]
+
+
+BACKENDS = {backend.name: backend
+            for backend in (FTS5Backend(), PythonBackend())}
+
+_fts_available = {}
+
+
+def fts_available():
+    name = connection.settings_dict['NAME']
+    if name not in _fts_available:
+        _fts_available[name] = (
+            FTS_TABLE in connection.introspection.table_names())
+    return _fts_available[name]
+
+
+def get_backend():
+    name = config()['backend']
+    if name == 'auto':
+        name = 'fts5' if fts_available() else 'python'
+    return BACKENDS[name]
+
+
+def index_post(post):
+    get_backend().index(POST, post.pk, post.pk, tokenize(post.text))
+
+
+def index_comment(comment):
+    get_backend().index(COMMENT, comment.pk, comment.post_id,
+                        tokenize(comment.text))
+
+
+def remove_post(post):
+    get_backend().remove(POST, post.pk)
+
+
+def remove_comment(comment):
+    get_backend().remove(COMMENT, comment.pk)
+
+
+def sync(kind, object_id):
+    """Приводит документ индекса к текущему состоянию объекта в БД."""
+    if kind == POST:
+        post = Post.objects.filter(pk=object_id).only('pk', 'text').first()
+        if post is None:
+            return get_backend().remove(POST, object_id)
+        return index_post(post)
+    comment = Comment.objects.filter(pk=object_id).only(
+        'pk', 'post_id', 'text').first()
+    if comment is None:
+        return get_backend().remove(COMMENT, object_id)
+    return index_comment(comment)
+
+
+def encode_cursor(score, post_id):
+    raw = f'{score!r}|{post_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (score, post_id) или None, если курсор поврежден."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, post_id = base64.urlsafe_b64decode(
+            padded.encode()).decode().split('|')
+        return float(score), int(post_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def rank(terms):
+    """Посты по убыванию релевантности: [(score, post_id), ...]."""
+    options = config()
+    best = {}
+    for post_id, kind, score in get_backend().hits(terms,
+                                                   options['max_hits']):
+        if kind == COMMENT:
+            score *= options['comment_weight']
+        if score > best.get(post_id, -math.inf):
+            best[post_id] = score
+    return sorted(((score, post_id) for post_id, score in best.items()),
+                  reverse=True)
+
+
+def find(query, cursor=None, per_page=None):
+    """
+    Возвращает (посты, курсор следующей страницы).
+
+    Страницы листаются по позиции (score, post_id) последнего поста, а не
+    по смещению, поэтому новые совпадения не сдвигают уже показанные.
+    """
+    per_page = per_page or config()['per_page']
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return [], None
+    ranked = rank(terms)
+    position = decode_cursor(cursor)
+    if position is not None:
+        ranked = [item for item in ranked if item < position]
+    window = ranked[:per_page]
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [post_id for _, post_id in window])
+    # Индекс мог отстать от удаления: таких постов просто нет в выдаче.
+    found = [posts[post_id] for _, post_id in window if post_id in posts]
+    next_cursor = (encode_cursor(*window[-1])
+                   if len(ranked) > per_page else None)
+    return found, next_cursor
+
+
+def rebuild(batch_size=1000):
+    """Полностью перестраивает индекс; возвращает число документов."""
+    backend = get_backend()
+    backend.clear()
+    total = 0
+    for post in Post.objects.only('pk', 'text').iterator(batch_size):
+        backend.index(POST, post.pk, post.pk, tokenize(post.text))
+        total += 1
+    for comment in Comment.objects.only('pk', 'post_id', 'text').iterator(
+            batch_size):
+        backend.index(COMMENT, comment.pk, comment.post_id,
+                      tokenize(comment.text))
+        total += 1
+    return total
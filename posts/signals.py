@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching, counters, events, feed, idfeed, objects, tasks
+from .models import Post, Comment, Follow, Group, SearchDocument
+
+
+User = get_user_model()
+
+
+# Счетчики и сброс кэша выполняются сразу, чтобы автор видел свою запись
+# в следующем запросе. Лента подписок и поисковый индекс обновляются
+# задачами posts.tasks; ключ дедупликации схлопывает повторные задачи
+# одного объекта, пока они ждут в очереди.
+# Счетчики подключаются раньше ленты: fan_out и backfill опираются на
+# followers_count.
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.post_removed(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and feed.is_materialized():
+        tasks.fan_out.enqueue(instance.pk, key=f'fan_out:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def sync_follow(sender, instance, **kwargs):
+    if feed.is_materialized():
+        tasks.sync_follow.enqueue(
+            instance.user_id, instance.author_id,
+            key=f'follow:{instance.user_id}:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def backfill_demoted(sender, instance, **kwargs):
+    if feed.is_materialized():
+        for author_id in feed.demoted({instance.author_id: 1}):
+            tasks.backfill_followers.enqueue(
+                author_id, key=f'backfill:{author_id}')
+
+
+@receiver(post_save, sender=Post)
+def notify_post(sender, instance, created, **kwargs):
+    if created:
+        events.post_created(instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Нужна для сброса кэша прежней группы при смене группы поста.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def update_feed_ids(sender, instance, created, **kwargs):
+    if created:
+        idfeed.post_created(instance)
+    elif instance._loaded_group_id != instance.group_id:
+        idfeed.post_moved(instance, instance._loaded_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def remove_feed_ids(sender, instance, **kwargs):
+    idfeed.post_deleted(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance, instance._loaded_group_id)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    caching.invalidate_comment(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    # Счетчик comments_count меняется через update() без сигналов поста.
+    objects.posts.evict(instance.post_id)
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Group)
+def remember_object_keys(sender, instance, **kwargs):
+    objects.remember(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_object(sender, instance, **kwargs):
+    objects.invalidate(instance)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    caching.invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Group)
+def remove_group_feed_ids(sender, instance, **kwargs):
+    idfeed.group_deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    caching.invalidate_group(instance)
+
+
+def _reindex(kind, object_id):
+    tasks.reindex.enqueue(kind, object_id,
+                          key=f'search:{kind}:{object_id}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def index_post(sender, instance, **kwargs):
+    _reindex(SearchDocument.POST, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    _reindex(SearchDocument.COMMENT, instance.pk)
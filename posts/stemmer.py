@@ -0,0 +1,140 @@
+"""
+Токенизация и стемминг для поиска: алгоритм Портера (Snowball) для
+русского языка, латиница только приводится к нижнему регистру.
+"""
+import re
+
+
+VOWELS = 'аеиоуыэюя'
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+STOP_WORDS = frozenset('''
+    и в во не что он на я с со как а то все она так его но да ты к у же вы
+    за бы по только ее мне было вот от меня еще нет о из ему теперь когда
+    даже ну ли если уже или ни быть был него до вас нибудь опять уж вам
+    ведь там потом себя ничего ей может они тут где есть надо ней для мы
+    тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж
+    тогда кто этот того потому этого какой совсем ним здесь этом один
+    почти мой тем чтобы нее были куда зачем всех никогда можно при
+    наконец два об другой хоть после над больше тот через эти нас про
+    всего них какая много разве три эту моя впрочем хорошо свою этой
+    перед иногда лучше чуть том нельзя такой им более всегда конечно
+    всю между это
+'''.split())
+
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой',
+             'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых',
+             'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+        'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+        'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я')
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+
+def _by_length(endings):
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+PERFECTIVE_GERUND = tuple(map(_by_length, PERFECTIVE_GERUND))
+PARTICIPLE = tuple(map(_by_length, PARTICIPLE))
+VERB = tuple(map(_by_length, VERB))
+ADJECTIVE, NOUN, REFLEXIVE = map(_by_length, (ADJECTIVE, NOUN, REFLEXIVE))
+
+
+def _strip(word, endings):
+    for ending in endings:
+        if word.endswith(ending):
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_grouped(word, groups):
+    """Первая группа окончаний допустима только после 'а' или 'я'."""
+    first, second = groups
+    for ending in first:
+        if word.endswith(ending) and word[:-len(ending)][-1:] in ('а', 'я'):
+            return word[:-len(ending)]
+    return _strip(word, second)
+
+
+def _region(word, start=0):
+    """Позиция после первой согласной, следующей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv_start = i + 1
+            break
+    else:
+        return word
+    r2_start = _region(word, _region(word))
+    head, rv = word[:rv_start], word[rv_start:]
+
+    # Шаг 1.
+    stripped = _strip_grouped(rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        reflexive = _strip(rv, REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        stripped = _strip(rv, ADJECTIVE)
+        if stripped is not None:
+            participle = _strip_grouped(stripped, PARTICIPLE)
+            stripped = stripped if participle is None else participle
+        else:
+            stripped = _strip_grouped(rv, VERB)
+            if stripped is None:
+                stripped = _strip(rv, NOUN)
+    if stripped is not None:
+        rv = stripped
+
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3: словообразовательные окончания только в R2.
+    r2 = max(r2_start - rv_start, 0)
+    for ending in DERIVATIONAL:
+        if rv.endswith(ending) and len(rv) - len(ending) >= r2:
+            rv = rv[:-len(ending)]
+            break
+
+    # Шаг 4.
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        stripped = _strip(rv, SUPERLATIVE)
+        if stripped is not None:
+            rv = stripped[:-1] if stripped.endswith('нн') else stripped
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return head + rv
+
+
+def tokenize(text):
+    """Нормализованные основы слов текста без стоп-слов."""
+    terms = []
+    for word in WORD_RE.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS:
+            continue
+        if CYRILLIC_RE.search(word):
+            word = stem(word)
+        terms.append(word)
+    return terms
@@ -0,0 +1,41 @@
+"""
+Фоновые задачи постов (см. tasks.queue). Задачи получают id и читают
+текущее состояние БД, поэтому повтор или запоздалое выполнение не
+восстанавливает удаленное.
+"""
+from tasks.queue import task
+
+from . import feed, search, thumbnails
+from .models import Post, Follow
+
+
+@task(priority=10)
+def fan_out(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date').first()
+    if post is not None:
+        feed.fan_out(post)
+
+
+@task(priority=10)
+def sync_follow(user_id, author_id):
+    """Дополняет или чистит входящие по тому, есть ли подписка сейчас."""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        feed.backfill(user_id, author_id)
+    else:
+        feed.prune(user_id, author_id)
+
+
+@task(priority=10)
+def backfill_followers(author_id):
+    feed.backfill_followers(author_id)
+
+
+@task(priority=5)
+def reindex(kind, object_id):
+    search.sync(kind, object_id)
+
+
+@task(priority=5)
+def generate_thumbnails(name):
+    thumbnails.generate(name)
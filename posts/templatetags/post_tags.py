@@ -0,0 +1,51 @@
+import time
+
+from django import template
+
+from yatube import instrumentation
+
+
+register = template.Library()
+
+POST_ITEM = 'post_item.html'
+
+
+class PostItemsNode(template.Node):
+    """
+    Карточки постов одним проходом по скомпилированному post_item.html:
+    без {% for %} и {% include %} на каждый пост - один push контекста,
+    шаблон берется из render_context, как у IncludeNode.
+    """
+
+    def __init__(self, posts):
+        self.posts = posts
+
+    def fragment(self, context):
+        cache = context.render_context.dicts[0].setdefault(self, {})
+        if POST_ITEM not in cache:
+            cache[POST_ITEM] = context.template.engine.get_template(
+                POST_ITEM)
+        return cache[POST_ITEM]
+
+    def render(self, context):
+        posts = self.posts.resolve(context)
+        nodelist = self.fragment(context).nodelist
+        start = time.perf_counter()
+        output = []
+        with context.push():
+            for post in posts:
+                context['post'] = post
+                output.append(nodelist.render(context))
+        instrumentation.record_template(POST_ITEM, len(output),
+                                        time.perf_counter() - start)
+        return ''.join(output)
+
+
+@register.tag
+def post_items(parser, token):
+    """{% post_items page %} - карточки всех постов страницы."""
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает один аргумент: список постов.')
+    return PostItemsNode(parser.compile_filter(bits[1]))
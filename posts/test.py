@@ -1,8 +1,7 @@
 import random
-import time
 from string import ascii_letters
 
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, Client
 from django.test.utils import setup_test_environment
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -11,10 +10,6 @@ from django.core.cache import cache
 from posts.models import Post, Comment, Follow
 
 
-DUMMY_CACHE = {
-    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
-}
-
 User = get_user_model()
 
 
@@ -82,7 +77,6 @@ class TestPostsApp(TestCase):
         response = self.guest_client.get(self.test_urls[2])
         self.assertEqual(response.context['post'], self.post)
     
-    @override_settings(CACHES=DUMMY_CACHE)
     def test_edit_post(self):
         self.post_dict['text'] = 'Now post editted'
         # URL /username/post_id/edit
@@ -105,7 +99,6 @@ class TestPostsApp(TestCase):
             reverse('profile', args=[test_str]))
         self.assertEqual(response.status_code, 404)
 
-    @override_settings(CACHES=DUMMY_CACHE)
     def test_img_all(self):
         edit_url = reverse('post_edit', args=[
                            self.user.username, self.post.id])
@@ -130,17 +123,16 @@ class TestPostsApp(TestCase):
         # открываем список постов - видим пост
         response = self.client.get(reverse('index'))
         self.assertContains(response, self.post.text, status_code=200)
-        #обновляем пост
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, self.post.text, status_code=200)
+        # обновляем пост - версия ленты меняется, кэш сразу устаревает
         self.post.text = 'New text, old post!'
         self.post.save()
-        #открываем список постов - пост не изменился
-        response = self.client.get(reverse('index'))
-        self.assertNotContains(response, self.post.text, status_code=200)
-        time.sleep(21)
-        #Ждем таймаут и проверяем, что теперь уже пост изменился.
-        response = self.client.get(reverse('index'))
-        self.assertContains(response, self.post.text, status_code=200)
-
+        for client in (self.client, self.guest_client):
+            with self.subTest():
+                response = client.get(reverse('index'))
+                self.assertContains(response, self.post.text,
+                                    status_code=200)
 
     def test_comment_auth_user(self):
         # URL Отправки комментария.
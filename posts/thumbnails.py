@@ -0,0 +1,182 @@
+"""
+Предварительная генерация миниатюр для Post.image.
+
+Миниатюры создаются через sorl-thumbnail с теми же параметрами, что и в
+post_item.html, поэтому тег {% thumbnail %} находит их в KV-хранилище и не
+ресайзит изображение во время запроса.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 'thread', 'process', 'queue' (задача tasks.queue) или 'sync'
+    # (прямо в запросе, для тестов).
+    'executor': 'thread',
+    'workers': 2,
+    # Геометрия и параметры sorl; первая запись совпадает с post_item.html.
+    'sizes': [
+        ('960x339', {'crop': 'center', 'upscale': True}),
+    ],
+    'formats': ['JPEG'],
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'POSTS_THUMBNAILS', {}))
+    return options
+
+
+def variants():
+    """Все комбинации (геометрия, параметры) для генерации."""
+    options = config()
+    for geometry, params in options['sizes']:
+        for image_format in options['formats']:
+            yield geometry, dict(params, format=image_format)
+
+
+def generate(name):
+    """Создает все миниатюры изображения name; возвращает их число."""
+    count = 0
+    for geometry, params in variants():
+        get_thumbnail(name, geometry, **params)
+        count += 1
+    return count
+
+
+def generate_in_worker(name):
+    try:
+        return generate(name)
+    finally:
+        # Поток или процесс пула держит свое соединение с БД.
+        connections.close_all()
+
+
+def _init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def make_executor(kind=None, workers=None):
+    options = config()
+    kind = kind or options['executor']
+    workers = workers or options['workers']
+    if kind == 'process':
+        return ProcessPoolExecutor(workers, initializer=_init_worker)
+    return ThreadPoolExecutor(workers, thread_name_prefix='thumbnails')
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = make_executor()
+        return _executor
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Thumbnail generation failed: %s', error)
+
+
+def submit(name):
+    executor = config()['executor']
+    if executor == 'sync':
+        return generate(name)
+    if executor == 'queue':
+        from .tasks import generate_thumbnails
+        return generate_thumbnails.enqueue(name, key=f'thumbnails:{name}')
+    future = get_executor().submit(generate_in_worker, name)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в пул после коммита транзакции."""
+    if not post.image:
+        return
+    name = post.image.name
+    transaction.on_commit(lambda: submit(name))
+
+
+def thumbnail_name(name, geometry, params):
+    """
+    Имя файла миниатюры, как его вычисляет sorl в get_thumbnail,
+    но без обращения к хранилищу.
+    """
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(params)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(thumbnail_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def _fetch_raw(keys):
+    """
+    Читает значения KV-хранилища sorl одним get_many и, для промахов,
+    одним запросом к таблице KVStore.
+    """
+    if not isinstance(default.kvstore, CachedDBKVStore):
+        values = {key: default.kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    kv_cache = default.kvstore.cache
+    found = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(KVStore.objects.filter(key__in=missing)
+                    .values_list('key', 'value'))
+        fetched = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fetched,
+                          thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(fetched)
+    return {key: value for key, value in found.items()
+            if value != EMPTY_VALUE}
+
+
+def attach_urls(posts):
+    """
+    Проставляет post.thumbnail_url для страницы постов за один проход
+    по KV-хранилищу. Посты без готовой миниатюры получают None, и шаблон
+    генерирует ее тегом {% thumbnail %} как раньше.
+    """
+    geometry, params = next(variants())
+    keys = {}
+    for post in posts:
+        post.thumbnail_url = None
+        if post.image:
+            name = thumbnail_name(post.image.name, geometry, params)
+            keys[post] = add_prefix(ImageFile(name, default.storage).key)
+    if not keys:
+        return posts
+    values = _fetch_raw(list(set(keys.values())))
+    for post, key in keys.items():
+        if key in values:
+            post.thumbnail_url = deserialize_image_file(values[key]).url
+    return posts
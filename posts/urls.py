@@ -6,10 +6,16 @@ urlpatterns = [
     path('', views.index, name='index'),  # Главная страница
     path('new/', views.new_post, name='new_post'),  # Новая запись
     path('follow/', views.follow_index, name='follow_index'),
+    # Поиск и поток SSE "N новых постов" для лент. Два сегмента - чтобы
+    # не перекрывать профили пользователей "search" и "events".
+    path('search/posts/', views.search_posts, name='search'),
+    path('events/stream/', views.post_events, name='events'),
     path('<str:username>/', views.profile,
          name='profile'),  # Профайл пользователя
     path('<str:username>/<int:post_id>/',
          views.post_view, name='post'),  # Просмотр записи
+    path('<str:username>/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
     path('<str:username>/<int:post_id>/edit/',
          views.post_edit, name='post_edit'),
     path('<str:username>/<int:post_id>/comment/',
@@ -1,43 +1,122 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from django.views.decorators.cache import cache_page
 
-from .models import Post, Group, Comment, Follow
+from yatube import writes
+
+from .models import Post, Follow
 from .forms import PostForm, CommentForm
+from . import events, idfeed, objects, search, thumbnails
+from .pagination import paginate, comments_page
+from .feed import FEED_DATE, follow_feed
+from .counters import stats_for
+from .counting import cached_count, index_count
+from .caching import (cached_page, conditional, page_variant, POSTS,
+                      group_version, author_version, post_version,
+                      follow_version)
 
 
 User = get_user_model()
 
 
+# Версии, от которых зависят страницы: по ним строятся ключи кэша,
+# ETag и Last-Modified.
+
+def index_versions(request):
+    return [POSTS]
+
+
+def group_versions(request, slug):
+    return [group_version(slug)]
+
+
+def profile_versions(request, username):
+    return [author_version(username)]
+
+
+def post_versions(request, username, post_id):
+    return [post_version(post_id), author_version(username)]
+
+
+def comments_versions(request, username, post_id):
+    return [post_version(post_id)]
+
+
+def follow_versions(request):
+    return [POSTS, follow_version(request.user.pk)]
+
+
+@conditional('index', index_versions, variant=page_variant)
+@cached_page('index', index_versions)
 def index(request):
     post_list = Post.objects.select_related(
         'author', 'group').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(request, post_list,
+                               count=lambda: index_count(post_list),
+                               feed=idfeed.CachedFeed(idfeed.INDEX))
+    thumbnails.attach_urls(page.object_list)
     return render(request, 'index.html', {'page': page, 'paginator': paginator})
 
 
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search.find(query, request.GET.get('cursor'))
+    thumbnails.attach_urls(posts)
+    return render(request, 'search.html', {'query': query, 'posts': posts,
+                                           'next_cursor': next_cursor})
+
+
+def post_events(request):
+    """Поток server-sent events с числом новых постов ленты."""
+    if not events.config()['enabled']:
+        raise Http404
+    feed = request.GET.get('feed', 'index')
+    group = None
+    if feed == 'group':
+        group = objects.groups.get_or_404(request.GET.get('slug', ''))
+    elif feed == 'follow':
+        if not request.user.is_authenticated:
+            return HttpResponse(status=401)
+    elif feed != 'index':
+        raise Http404
+    # При переподключении браузер сам присылает id последнего события.
+    since = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since')
+    since = int(since) if since and since.isdigit() else None
+    channels, posts = events.feed_channels(feed, request.user, group)
+    return events.EventStreamResponse(
+        events.EventStream(channels, posts, since))
+
+
+@conditional('group', group_versions, variant=page_variant)
+@cached_page('group', group_versions)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = objects.groups.get_or_404(slug)
     post_list = group.posts.select_related(
         'author').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(
+        request, post_list,
+        count=lambda: cached_count(post_list, group_versions(request, slug)),
+        feed=idfeed.CachedFeed(idfeed.group_feed(group.pk)))
+    thumbnails.attach_urls(page.object_list)
     return render(request, 'group.html', {'group': group, 'page': page,
                                           'paginator': paginator})
 
 
+@conditional('profile', profile_versions, variant=page_variant)
+@cached_page('profile', profile_versions)
 def profile(request, username):
     """View функция профайла пользователя."""
-    author = get_object_or_404(User, username=username)
+    author = objects.users.get_or_404(username)
     post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    stats = stats_for(author.pk)
+    paginator, page = paginate(request, post_list, count=stats.posts_count,
+                               feed=idfeed.CachedFeed(
+                                   idfeed.author_feed(author.pk)))
+    thumbnails.attach_urls(page.object_list)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -45,18 +124,54 @@ def profile(request, username):
     return render(request, 'profile.html',
                   context={'author': author, 'page': page,
                            'paginator': paginator,
+                           'stats': stats,
                            'following': following})
 
 
+@conditional('post', post_versions, variant=page_variant)
+@cached_page('post', post_versions)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id, author=author)
-    comments = post.comments.all()
+    post = _get_post(username, post_id)
+    author = post.author
+    thumbnails.attach_urls([post])
+    comments, next_cursor = _comments(request, post)
     form = CommentForm()
     return render(request, 'post.html', {'post': post,
                                          'author': author,
+                                         'stats': stats_for(author.pk),
                                          'form': form,
-                                         'comments': comments})
+                                         'comments': comments,
+                                         'next_cursor': next_cursor})
+
+
+def _get_post(username, post_id):
+    """Пост автора username с автором и группой из кэша объектов."""
+    author = objects.users.get_or_404(username)
+    post = objects.posts.get(post_id)
+    if post is None or post.author_id != author.pk:
+        raise Http404
+    post.author = author
+    if post.group_id is not None:
+        post.group = objects.groups_by_id.get(post.group_id)
+    return post
+
+
+def _comments(request, post):
+    """Пачка комментариев поста с авторами по курсору из запроса."""
+    per_page = getattr(settings, 'POSTS_COMMENTS_PER_PAGE', 50)
+    return comments_page(post.comments.select_related('author'),
+                         request.GET.get('cursor'), per_page)
+
+
+@conditional('post_comments', comments_versions, variant=page_variant)
+@cached_page('post_comments', comments_versions)
+def post_comments(request, username, post_id):
+    """Следующая пачка комментариев для кнопки "Показать еще"."""
+    post = _get_post(username, post_id)
+    comments, next_cursor = _comments(request, post)
+    return render(request, 'comments_list.html',
+                  {'post': post, 'comments': comments,
+                   'next_cursor': next_cursor})
 
 
 @login_required
@@ -69,63 +184,66 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None,
                     files=request.FILES or None, instance=post)
     if form.is_valid():
-        post = form.save()
+        post = form.save(commit=False)
+        # Только поля формы: comments_count, прочитанный до сохранения, не
+        # затирает комментарии, добавленные за это время.
+        post.save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('post', username, post_id)
     return render(request, 'newpost.html', {'form': form, 'edit': True, 'post': post})
 
 
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            thumbnails.schedule(post)
         return redirect('index')
     return render(request, 'newpost.html', {'form': form, 'edit': False})
 
 
 @login_required
 def add_comment(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, id=post_id, author=author)
+    post = _get_post(username, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writes.run(comment.save)
     return redirect('post', username, post_id)
 
 
 @login_required
+@conditional('follow_index', follow_versions, variant=page_variant)
+@cached_page('follow_index', follow_versions)
 def follow_index(request):
-    # Тут я понимаю что на SQL можно достучаться до постов сразу, но как через
-    # ORM ума не хватает
-    authors = Follow.objects.filter(
-        user=request.user).prefetch_related('author').values('author')
-    post_list = Post.objects.filter(
-        author__in=authors).all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = follow_feed(request.user).select_related('author', 'group')
+    paginator, page = paginate(request, post_list, count=lambda: cached_count(
+        post_list, follow_versions(request)), date_field=FEED_DATE)
+    thumbnails.attach_urls(page.object_list)
     return render(request, 'follow.html', {'page': page, 'paginator': paginator})
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = objects.users.get_or_404(username)
     if author != request.user:
-        follow, created = Follow.objects.get_or_create(
-            user=request.user, author=author)
+        writes.run(Follow.objects.get_or_create, user=request.user,
+                   author=author)
     return redirect('profile', author)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = objects.users.get_or_404(username)
     follow = Follow.objects.filter(user=request.user, author=author)
-    if follow.exists():
+    with transaction.atomic():
         follow.delete()
     return redirect('profile', author)
 
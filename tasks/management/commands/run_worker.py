@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи фоновой очереди в пуле потоков или процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--executor', choices=('thread', 'process'),
+                            help='Тип пула (по умолчанию из настроек).')
+        parser.add_argument('--workers', type=int,
+                            help='Число воркеров пула.')
+        parser.add_argument('--batch', type=int,
+                            help='Сколько задач забирать за раз.')
+        parser.add_argument('--poll', type=float,
+                            help='Пауза между опросами пустой очереди, с.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['executor'], options['workers'],
+                        options['batch'], options['poll'])
+        self.stdout.write(f'Воркер {worker.name}: {worker.executor} '
+                          f'x{worker.workers}')
+        try:
+            counts = worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            counts = worker.counts
+        summary = ', '.join(f'{status}: {count}'
+                            for status, count in sorted(counts.items()))
+        self.stdout.write(f'Выполнено задач: {summary or 0}')
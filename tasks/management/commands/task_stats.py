@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from tasks import queue
+from tasks.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Выводит метрики фоновой очереди по именам задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true',
+                            help='Удалить выполненные задачи старше '
+                                 'TASKS["keep_done"].')
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            self.stdout.write(f'Удалено задач: {queue.purge()}')
+        columns = (Job.QUEUED, Job.RUNNING, Job.DONE, Job.FAILED, 'retried',
+                   'lag_s', 'avg_ms', 'p95_ms')
+        self.stdout.write(' '.join(['task'.ljust(40)]
+                                   + [name.rjust(8) for name in columns]))
+        for name, row in sorted(queue.stats().items()):
+            values = [f'{row[column]:.1f}' if isinstance(row[column], float)
+                      else str(row[column]) for column in columns]
+            self.stdout.write(' '.join([name.ljust(40)]
+                                       + [value.rjust(8) for value in values]))
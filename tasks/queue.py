@@ -0,0 +1,260 @@
+"""
+Очередь фоновых задач в таблице Job.
+
+Задача - функция, зарегистрированная декоратором @task в модуле tasks.py
+приложения. enqueue() записывает ее вызов в очередь одной вставкой, а
+команда run_worker выбирает готовые задачи по приоритету и выполняет их
+в пуле потоков или процессов. Упавшая задача повторяется с растущей
+задержкой до max_attempts раз.
+
+Аргументы сохраняются в JSON, поэтому задачи получают id объектов и
+читают их текущее состояние при выполнении: к этому моменту объект мог
+измениться или исчезнуть.
+
+В режиме 'inline' (по умолчанию, тесты и разработка) задача выполняется
+сразу при постановке, без таблицы и воркера.
+"""
+import json
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from yatube.instrumentation import MS_BUCKETS, Histogram
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 'inline' - выполнять при постановке, 'queue' - через run_worker.
+    'mode': 'inline',
+    # Пул воркера: 'thread' или 'process'.
+    'executor': 'thread',
+    'workers': 4,
+    # Сколько задач воркер забирает за один запрос к очереди.
+    'batch_size': 20,
+    # Пауза между опросами пустой очереди, секунд.
+    'poll_interval': 1.0,
+    # Задержка перед повтором: retry_delay * 2 ** (попытка - 1), секунд.
+    'retry_delay': 5,
+    # Задача в статусе running дольше этого срока считается брошенной
+    # (воркер упал) и возвращается в очередь.
+    'lock_timeout': 600,
+    # Сколько секунд хранить выполненные задачи.
+    'keep_done': 24 * 60 * 60,
+}
+
+_registry = {}
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'TASKS', {}))
+    return options
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args):
+        return self.func(*args)
+
+    def enqueue(self, *args, **kwargs):
+        return enqueue(self, *args, **kwargs)
+
+
+def task(name=None, priority=0, max_attempts=3):
+    """Регистрирует функцию как задачу очереди."""
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}',
+                          priority, max_attempts)
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f'Задача {name} не зарегистрирована.')
+
+
+def enqueue(task, *args, key=None, priority=None, delay=0):
+    """
+    Ставит вызов task(*args) в очередь; возвращает Job или None, если
+    задача выполнена сразу (режим 'inline') или такая уже ждет в очереди
+    (совпал key).
+    """
+    if isinstance(task, str):
+        task = get_task(task)
+    # Аргументы проходят через JSON и в режиме inline, чтобы задача
+    # не зависела от объектов, которые не переживут очередь.
+    payload = json.dumps(args)
+    if config()['mode'] == 'inline':
+        task(*json.loads(payload))
+        return None
+    job = Job(name=task.name, args=payload, key=key,
+              priority=task.priority if priority is None else priority,
+              max_attempts=task.max_attempts,
+              run_at=timezone.now() + timedelta(seconds=delay))
+    try:
+        with transaction.atomic():
+            job.save(force_insert=True)
+    except IntegrityError:
+        if key is None:
+            raise
+        # Такая задача уже ждет в очереди (частичный уникальный индекс
+        # по key) и выполнит ту же работу.
+        return None
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def requeue_stale(now=None):
+    """Возвращает в очередь задачи упавших воркеров; возвращает их число."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=config()['lock_timeout'])
+    stale = Job.objects.filter(status=Job.RUNNING, started__lt=cutoff)
+    requeued = 0
+    for job in stale.only('pk', 'key'):
+        try:
+            with transaction.atomic():
+                requeued += Job.objects.filter(
+                    pk=job.pk, status=Job.RUNNING).update(
+                        status=Job.QUEUED, worker='', run_at=now)
+        except IntegrityError:
+            # Та же работа уже снова в очереди.
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.DONE, finished=now, error='superseded')
+    return requeued
+
+
+def claim(worker, limit):
+    """
+    Забирает до limit готовых задач для воркера worker.
+
+    Кандидаты помечаются условным UPDATE (только из статуса queued), так
+    что параллельные воркеры не получат одну задачу дважды.
+    """
+    now = timezone.now()
+    ids = list(Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+               .order_by('-priority', 'run_at', 'pk')
+               .values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+        status=Job.RUNNING, worker=worker, started=now)
+    jobs = Job.objects.filter(pk__in=ids, status=Job.RUNNING, worker=worker)
+    return sorted(jobs, key=lambda job: (-job.priority, job.run_at, job.pk))
+
+
+def _retry(job, error, now):
+    delay = config()['retry_delay'] * 2 ** (job.attempts - 1)
+    try:
+        with transaction.atomic():
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.QUEUED, attempts=job.attempts, worker='',
+                run_at=now + timedelta(seconds=delay), error=error)
+    except IntegrityError:
+        # Пока задача выполнялась, в очередь встала такая же: она и
+        # выполнит работу по свежим данным.
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.DONE, attempts=job.attempts, finished=now,
+            error='superseded')
+
+
+def execute(job):
+    """Выполняет забранную задачу и записывает итог; возвращает статус."""
+    job.attempts += 1
+    try:
+        get_task(job.name)(*json.loads(job.args))
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            logger.warning('Task %s #%s failed, retrying', job.name, job.pk)
+            _retry(job, error, now)
+            return Job.QUEUED
+        logger.error('Task %s #%s failed: %s', job.name, job.pk, error)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.FAILED, attempts=job.attempts, finished=now,
+            error=error)
+        return Job.FAILED
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.DONE, attempts=job.attempts, finished=timezone.now(),
+        error='')
+    return Job.DONE
+
+
+def execute_in_worker(job_id):
+    try:
+        job = Job.objects.get(pk=job_id)
+        return execute(job)
+    finally:
+        # Поток или процесс пула держит свое соединение с БД.
+        connections.close_all()
+
+
+def purge(older_than=None):
+    """Удаляет выполненные задачи старше срока; возвращает их число."""
+    if older_than is None:
+        older_than = config()['keep_done']
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    deleted, _ = Job.objects.filter(status=Job.DONE,
+                                    finished__lt=cutoff).delete()
+    return deleted
+
+
+def stats(recent=1000):
+    """
+    Метрики очереди по имени задачи: число задач по статусам, повторы,
+    задержка старейшей готовой задачи и длительность последних recent
+    выполненных (среднее и p95 в мс).
+    """
+    now = timezone.now()
+    result = {}
+
+    def entry(name):
+        return result.setdefault(name, {
+            Job.QUEUED: 0, Job.RUNNING: 0, Job.DONE: 0, Job.FAILED: 0,
+            'retried': 0, 'lag_s': 0.0, 'avg_ms': 0.0, 'p95_ms': 0})
+
+    for row in Job.objects.values('name', 'status').annotate(
+            count=Count('pk')).order_by():
+        entry(row['name'])[row['status']] = row['count']
+    for row in Job.objects.filter(attempts__gt=1).values('name').annotate(
+            count=Count('pk')).order_by():
+        entry(row['name'])['retried'] = row['count']
+    for row in Job.objects.filter(status=Job.QUEUED, run_at__lte=now).values(
+            'name').annotate(oldest=Min('run_at')).order_by():
+        entry(row['name'])['lag_s'] = (now - row['oldest']).total_seconds()
+
+    histograms = {}
+    finished = Job.objects.filter(status=Job.DONE).order_by(
+        '-finished').values_list('name', 'started', 'finished')[:recent]
+    for name, started, done in finished:
+        if started is None or done is None:
+            continue
+        histogram = histograms.setdefault(name, Histogram(MS_BUCKETS))
+        histogram.observe((done - started).total_seconds() * 1000)
+    for name, histogram in histograms.items():
+        entry(name).update(avg_ms=histogram.sum / histogram.count,
+                           p95_ms=histogram.percentile(0.95))
+    return result
@@ -0,0 +1,92 @@
+"""
+Цикл воркера очереди: забирает готовые задачи пачками и выполняет их
+в пуле потоков или процессов, не держа в работе больше задач, чем
+воркеров в пуле.
+"""
+import logging
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+from django.db import connections
+
+from . import queue
+
+
+logger = logging.getLogger(__name__)
+
+# Как часто воркер чистит очередь от брошенных и старых задач, секунд.
+MAINTENANCE_INTERVAL = 60
+
+
+def _init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def make_executor(kind, workers):
+    if kind == 'process':
+        return ProcessPoolExecutor(workers, initializer=_init_worker)
+    return ThreadPoolExecutor(workers, thread_name_prefix='tasks')
+
+
+class Worker:
+
+    def __init__(self, executor=None, workers=None, batch_size=None,
+                 poll_interval=None):
+        options = queue.config()
+        self.executor = executor or options['executor']
+        self.workers = workers or options['workers']
+        self.batch_size = batch_size or options['batch_size']
+        self.poll_interval = (options['poll_interval'] if poll_interval is None
+                              else poll_interval)
+        self.name = queue.worker_name()
+        self.counts = {}
+        self.last_maintenance = 0
+
+    def maintain(self):
+        now = time.monotonic()
+        if now - self.last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self.last_maintenance = now
+        requeued = queue.requeue_stale()
+        if requeued:
+            logger.warning('Requeued %s stale tasks', requeued)
+        queue.purge()
+
+    def collect(self, finished, pending):
+        for future in finished:
+            job_id = pending.pop(future)
+            try:
+                status = future.result()
+            except Exception as error:
+                # Сбой вне задачи (например, БД недоступна): задача
+                # останется running и вернется в очередь по lock_timeout.
+                logger.error('Task #%s crashed: %s', job_id, error)
+                status = 'crashed'
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def run(self, once=False):
+        """
+        Выполняет задачи до остановки; с once=True - пока в очереди есть
+        готовые задачи. Возвращает число задач по итоговым статусам.
+        """
+        with make_executor(self.executor, self.workers) as pool:
+            pending = {}
+            while True:
+                self.maintain()
+                free = self.workers - len(pending)
+                jobs = queue.claim(self.name, min(free, self.batch_size))
+                for job in jobs:
+                    pending[pool.submit(queue.execute_in_worker,
+                                        job.pk)] = job.pk
+                if pending:
+                    finished, _ = wait(pending, timeout=self.poll_interval,
+                                       return_when=FIRST_COMPLETED)
+                    self.collect(finished, pending)
+                elif once:
+                    break
+                else:
+                    time.sleep(self.poll_interval)
+        return self.counts
@@ -1,4 +1,17 @@
+import pytest
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_object_cache():
+    # Откат БД между тестами не отправляет сигналов, поэтому закэшированные
+    # объекты прошлого теста сбрасываются явно.
+    from django.core.cache import cache
+    from posts import objects
+    objects.clear()
+    cache.clear()
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from django.core.cache import cache
+from django.test import Client
+
+from posts.models import Post, Comment, Follow
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def ndjson(response):
+    body = b''.join(response.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+class TestApi:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_posts_cursor_paging(self, client, user):
+        posts = [Post.objects.create(text=f'Пост {i}', author=user)
+                 for i in range(5)]
+        response = client.get('/api/v1/posts/', {'limit': 2})
+        data = response.json()
+        assert [row['id'] for row in data['results']] == [
+            posts[4].pk, posts[3].pk]
+        assert data['results'][0]['author'] == user.username
+
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = client.get('/api/v1/posts/', params).json()
+            ids += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        assert ids == [post.pk for post in reversed(posts)]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_ndjson_stream(self, client, user):
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=user)
+        response = client.get('/api/v1/posts/', {'limit': 2},
+                              HTTP_ACCEPT='application/x-ndjson')
+        assert response.streaming
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = ndjson(response)
+        assert len(lines) == 3
+        assert lines[-1]['next_cursor']
+
+        rest = ndjson(client.get('/api/v1/posts/', {
+            'format': 'ndjson', 'cursor': lines[-1]['next_cursor']}))
+        assert [row['text'] for row in rest[:-1]] == ['Пост 0']
+        assert rest[-1] == {'next_cursor': None}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_conditional_get(self, client, post, django_assert_num_queries):
+        response = client.get('/api/v1/posts/')
+        etag, modified = response['ETag'], response['Last-Modified']
+        anonymous = Client()
+        with django_assert_num_queries(0):
+            response = anonymous.get('/api/v1/posts/',
+                                     HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        response = anonymous.get('/api/v1/posts/',
+                                 HTTP_IF_MODIFIED_SINCE=modified)
+        assert response.status_code == 304
+
+        Post.objects.create(text='Новый пост', author=post.author)
+        response = anonymous.get('/api/v1/posts/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_post_group_profile_and_comments(self, client, post_with_group):
+        post = post_with_group
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=post.author)
+        assert client.get(f'/api/v1/posts/{post.pk}/').json()['group'] == (
+            'test-link')
+        comments = client.get(f'/api/v1/posts/{post.pk}/comments/').json()
+        assert [row['text'] for row in comments['results']] == [
+            'Комментарий']
+        groups = client.get('/api/v1/groups/').json()['results']
+        assert [group['slug'] for group in groups] == ['test-link']
+        group_posts = client.get('/api/v1/groups/test-link/posts/').json()
+        assert [row['id'] for row in group_posts['results']] == [post.pk]
+        profile = client.get(
+            f'/api/v1/profiles/{post.author.username}/').json()
+        assert profile['posts_count'] == 1
+        assert client.get('/api/v1/posts/999/').status_code == 404
+        assert client.get('/api/v1/groups/nope/posts/').status_code == 404
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_feed(self, user_client, user, django_user_model):
+        author = django_user_model.objects.create(username='author')
+        post = Post.objects.create(text='Пост автора', author=author)
+        Post.objects.create(text='Чужой пост', author=django_user_model
+                            .objects.create(username='other'))
+        Follow.objects.create(user=user, author=author)
+        data = user_client.get('/api/v1/follow/').json()
+        assert [row['id'] for row in data['results']] == [post.pk]
+        assert Client().get('/api/v1/follow/').status_code == 401
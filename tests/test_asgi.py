@@ -0,0 +1,178 @@
+import asyncio
+import json
+import threading
+from http.cookies import SimpleCookie
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from posts.models import Post
+from yatube import benchmark
+from yatube.asgi import ASGIHandler
+
+
+@pytest.fixture
+def handler(settings):
+    settings.ASGI = dict(settings.ASGI, chunk_size=1024)
+    handler = ASGIHandler(read_workers=2, workers=2)
+    yield handler
+    handler.close()
+
+
+def call(handler, path, method='GET', body=b'', headers=(), query=''):
+    scope = dict(benchmark.make_scope(path), method=method,
+                 query_string=query.encode(), headers=list(headers))
+    messages = [{'type': 'http.request', 'body': body[:10],
+                 'more_body': len(body) > 10},
+                {'type': 'http.request', 'body': body[10:],
+                 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(handler(scope, receive, send))
+    start, *chunks = sent
+    assert all(chunk.get('more_body') for chunk in chunks[:-1])
+    assert not chunks[-1].get('more_body')
+    return (start['status'], dict(start['headers']),
+            [chunk['body'] for chunk in chunks])
+
+
+class TestASGI:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_sent_in_chunks(self, handler, user):
+        for i in range(12):
+            Post.objects.create(text=f'Пост {i} ' + 'x' * 200, author=user)
+        status, headers, chunks = call(handler, '/')
+        assert status == 200
+        assert headers[b'content-type'].startswith(b'text/html')
+        # Ответ отдается частями по chunk_size.
+        assert len(chunks) > 1
+        assert 'Пост 11' in b''.join(chunks).decode()
+        assert handler.pool_for({'method': 'GET', 'path': '/'}) is (
+            handler.read_pool)
+        assert handler.pool_for({'method': 'POST', 'path': '/'}) is (
+            handler.pool)
+        # Приложение, смонтированное под префиксом.
+        assert handler.pool_for({'method': 'GET', 'path': '/yatube/',
+                                 'root_path': '/yatube'}) is (
+            handler.read_pool)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_streaming_and_head(self, handler, user):
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=user)
+        status, headers, chunks = call(handler, '/api/v1/posts/',
+                                       query='format=ndjson')
+        assert status == 200
+        lines = b''.join(chunks).decode().splitlines()
+        assert len(lines) == 4
+        assert json.loads(lines[-1]) == {'next_cursor': None}
+
+        status, _, chunks = call(handler, '/', method='HEAD')
+        assert status == 200
+        assert b''.join(chunks) == b''
+
+    @pytest.mark.django_db(transaction=True)
+    def test_post_with_body(self, handler, user):
+        status, headers, _ = call(handler, '/auth/login/')
+        cookie = SimpleCookie(headers[b'set-cookie'].decode())
+        token = cookie['csrftoken'].value
+        body = (f'username={user.username}&password=1234567'
+                f'&csrfmiddlewaretoken={token}').encode()
+        status, headers, _ = call(
+            handler, '/auth/login/', method='POST', body=body, headers=[
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+                (b'cookie', f'csrftoken={token}'.encode())])
+        assert status == 302
+        assert b'sessionid' in headers[b'set-cookie']
+
+    def test_stream_drained_on_one_thread(self, handler):
+        class Stream:
+            threads = []
+
+            def __iter__(self):
+                for _ in range(10):
+                    self.threads.append(threading.get_ident())
+                    yield b'x'
+
+            def close(self):
+                self.threads.append(threading.get_ident())
+
+        sent = []
+
+        async def send(message):
+            sent.append(message['body'])
+            # Медленный клиент: поток успевает упереться в буфер.
+            await asyncio.sleep(0.001)
+
+        asyncio.run(handler.send_stream(send, Stream(), handler.pool))
+        assert sent == [b'x'] * 10 + [b'']
+        assert len(Stream.threads) == 11 and len(set(Stream.threads)) == 1
+
+    def test_stream_closed_on_disconnect(self, handler):
+        closed = threading.Event()
+
+        def chunks():
+            try:
+                while True:
+                    yield b'x'
+            finally:
+                closed.set()
+
+        class Stream:
+            def __iter__(self):
+                return chunks()
+
+            def close(self):
+                pass
+
+        async def send(message):
+            raise OSError('клиент отключился')
+
+        with pytest.raises(OSError):
+            asyncio.run(handler.send_stream(send, Stream(), handler.pool))
+        assert closed.wait(1)
+
+    def test_lifespan(self, handler):
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(handler({'type': 'lifespan'}, receive, send))
+        assert sent == ['lifespan.startup.complete',
+                        'lifespan.shutdown.complete']
+
+
+class TestSlowClientBenchmark:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_compare_servers(self, user):
+        for i in range(5):
+            Post.objects.create(text=f'Пост {i}', author=user)
+        out = StringIO()
+        call_command('benchmark', requests=16, concurrency=8, workers=2,
+                     server='both', slow_client=20, mix='index=1,post=1',
+                     seed=1, pool=3, stdout=out)
+        output = out.getvalue()
+        assert 'WSGI:' in output and 'ASGI:' in output
+        assert 'ASGI/WSGI' in output
+
+    def test_both_servers_reject_baseline(self):
+        with pytest.raises(CommandError):
+            call_command('benchmark', server='both', save_baseline='x.json',
+                         stdout=StringIO())
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F, Max, Min
+
+from posts import caching, search
+from posts.models import Post, Comment, FeedEntry, Follow, UserStats
+from yatube import benchmark
+
+
+User = get_user_model()
+
+
+@pytest.fixture
+def load_data(db):
+    call_command('generate_data', users=20, groups=3, posts=60, comments=30,
+                 follows=40, seed=1, batch_size=25, stdout=StringIO())
+
+
+class TestGenerateData:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_counts_and_counters(self, load_data):
+        assert User.objects.filter(
+            username__startswith='load_user_').count() == 20
+        assert Post.objects.count() == 60
+        assert Comment.objects.count() == 30
+        assert Follow.objects.count() == 40
+        assert not Follow.objects.filter(user_id=F('author_id')).exists()
+
+        # Счетчики пересчитаны после bulk_create.
+        for stats in UserStats.objects.all():
+            assert stats.followers_count == Follow.objects.filter(
+                author_id=stats.user_id).count()
+            assert stats.posts_count == Post.objects.filter(
+                author_id=stats.user_id).count()
+        post = Post.objects.filter(comments_count__gt=0).first()
+        assert post.comments_count == post.comments.count()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_signal_side_effects_refreshed(self, settings):
+        settings.FOLLOW_FEED_MATERIALIZED = True
+        versions = caching.get_versions([caching.POSTS])
+        call_command('generate_data', users=10, groups=2, posts=30,
+                     comments=10, follows=15, seed=2, batch_size=10,
+                     days=30, stdout=StringIO())
+
+        assert caching.get_versions([caching.POSTS]) != versions
+        assert FeedEntry.objects.exists()
+        assert search.find('django')[0]
+        dates = Post.objects.aggregate(first=Min('pub_date'),
+                                       last=Max('pub_date'))
+        assert dates['last'] - dates['first'] > timedelta(days=20)
+
+
+class TestBenchmark:
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert benchmark.percentile(values, .5) == 50
+        assert benchmark.percentile(values, .99) == 99
+        assert benchmark.percentile([], .5) == 0.0
+
+    def test_compare_reports_regressions(self):
+        base = {'throughput': 100.0, 'views': {
+            'index': {'p95_ms': 10.0, 'queries': 3.0}}}
+        same = {'throughput': 95.0, 'views': {
+            'index': {'p95_ms': 11.0, 'queries': 3.0}}}
+        worse = {'throughput': 50.0, 'views': {
+            'index': {'p95_ms': 30.0, 'queries': 4.0}}}
+        assert benchmark.compare(same, base) == []
+        assert len(benchmark.compare(worse, base)) == 3
+
+    @pytest.mark.django_db(transaction=True)
+    def test_command_runs_and_compares(self, load_data, tmp_path):
+        path = str(tmp_path / 'baseline.json')
+        out = StringIO()
+        call_command('benchmark', requests=30, concurrency=2, seed=1,
+                     pool=5, save_baseline=path, stdout=out)
+        report = benchmark.load_baseline(path)
+        assert report['requests'] == 30
+        for row in report['views'].values():
+            assert row['errors'] == 0
+        assert 'p95 ms' in out.getvalue()
+
+        # Недостижимая базовая пропускная способность - это регрессия.
+        report['throughput'] = 10 ** 9
+        benchmark.save_baseline(report, path)
+        with pytest.raises(CommandError):
+            call_command('benchmark', requests=30, seed=1, pool=5,
+                         compare=path, stdout=StringIO())
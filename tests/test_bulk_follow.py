@@ -0,0 +1,127 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import Client
+
+from posts import counters, follows
+from posts.models import Post, Follow, FeedEntry, UserStats
+
+
+@pytest.fixture
+def people(django_user_model):
+    return [django_user_model.objects.create_user(username=f'user{i}')
+            for i in range(5)]
+
+
+def stats(user):
+    row = UserStats.objects.get(user=user)
+    return row.followers_count, row.following_count
+
+
+class TestFollowMany:
+
+    @pytest.mark.django_db
+    def test_follow_and_unfollow(self, people):
+        first, *rest = people
+        # Счетчики первого уже есть, остальные создаются при вставке.
+        counters.stats_for(first.pk)
+        Follow.objects.create(user=first, author=rest[0])
+        pairs = [(first.pk, author.pk) for author in rest]
+        pairs += [(first.pk, first.pk), (rest[1].pk, first.pk),
+                  (rest[1].pk, first.pk)]
+        # Новые: first -> rest[1:] и rest[1] -> first.
+        assert follows.follow_many(pairs) == len(rest)
+        assert Follow.objects.count() == len(rest) + 1
+        assert stats(first) == (1, len(rest))
+        assert stats(rest[0]) == (1, 0)
+        assert stats(rest[1]) == (1, 1)
+
+        assert follows.unfollow_many(
+            [(first.pk, rest[0].pk), (first.pk, rest[0].pk),
+             (rest[2].pk, first.pk)]) == 1
+        assert stats(first) == (1, len(rest) - 1)
+        assert stats(rest[0]) == (0, 0)
+        assert not Follow.objects.filter(user=first, author=rest[0]).exists()
+
+    @pytest.mark.django_db
+    def test_invalidates_follow_feed(self, settings, people):
+        settings.FOLLOW_FEED_MATERIALIZED = True
+        reader, author = people[:2]
+        post = Post.objects.create(text='Пост', author=author)
+        follows.follow_many([(reader.pk, author.pk)])
+        assert FeedEntry.objects.filter(user=reader, post=post).exists()
+        follows.unfollow_many([(reader.pk, author.pk)])
+        assert not FeedEntry.objects.filter(user=reader).exists()
+
+
+class TestBulkAPI:
+
+    @pytest.mark.django_db
+    def test_bulk_follow(self, user_client, user, people):
+        url = '/api/v1/follow/bulk/'
+        body = {'follow': [p.username for p in people] + ['ghost'],
+                'unfollow': []}
+        response = user_client.post(url, json.dumps(body),
+                                    content_type='application/json')
+        assert response.json() == {'followed': 5, 'unfollowed': 0,
+                                   'missing': ['ghost']}
+        assert stats(user) == (0, 5)
+
+        body = {'unfollow': [people[0].username]}
+        response = user_client.post(url, json.dumps(body),
+                                    content_type='application/json')
+        assert response.json()['unfollowed'] == 1
+        assert stats(user) == (0, 4)
+
+    @pytest.mark.django_db
+    def test_errors(self, user_client, settings):
+        url = '/api/v1/follow/bulk/'
+        assert Client().post(url).status_code == 401
+        assert user_client.get(url).status_code == 405
+        assert user_client.post(url, 'x', content_type='application/json'
+                                ).status_code == 400
+        assert user_client.post(url, json.dumps({'follow': 'a'}),
+                                content_type='application/json'
+                                ).status_code == 400
+        settings.POSTS_API = dict(settings.POSTS_API, max_bulk_follow=1)
+        assert user_client.post(url, json.dumps({'follow': ['a', 'b']}),
+                                content_type='application/json'
+                                ).status_code == 400
+
+
+class TestImportCommand:
+
+    @pytest.mark.django_db
+    def test_csv(self, tmp_path, people):
+        path = tmp_path / 'edges.csv'
+        lines = ['author,follower']
+        lines += [f'user0,user{i}' for i in range(1, 5)]
+        lines += ['user0,user1', 'user0,user0', 'user0,ghost', 'user0,']
+        path.write_text('\n'.join(lines) + '\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_follows', str(path), batch_size=3,
+                     stdout=out, stderr=err)
+        assert out.getvalue().strip() == (
+            'Прочитано: 7; создано: 4; уже были: 1; пропущено: 2; '
+            'с ошибками: 1')
+        assert 'Строка 9' in err.getvalue()
+        assert stats(people[0]) == (4, 0)
+        # Повторный импорт ничего не меняет.
+        call_command('import_follows', str(path), stdout=out, stderr=err)
+        assert stats(people[0]) == (4, 0)
+
+    @pytest.mark.django_db
+    def test_ndjson_ids(self, tmp_path, people):
+        path = tmp_path / 'edges.ndjson'
+        rows = [{'follower': people[0].pk, 'author': people[1].pk},
+                {'follower': people[1].pk, 'author': people[0].pk},
+                {'follower': people[0].pk, 'author': 10 ** 6}]
+        path.write_text('\n'.join(map(json.dumps, rows)) + '\nnot json\n')
+        out = StringIO()
+        call_command('import_follows', str(path), ids=True, stdout=out,
+                     stderr=StringIO())
+        assert 'создано: 2' in out.getvalue()
+        assert 'с ошибками: 1' in out.getvalue()
+        assert stats(people[0]) == (1, 1)
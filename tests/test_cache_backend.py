@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import caches
+
+from yatube.cache import single_flight
+
+
+@pytest.fixture
+def two_tier(settings, tmp_path):
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'L1_TIMEOUT': 60, 'BYPASS_PREFIXES': ['ver:']},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        },
+    }
+    cache = caches['default']
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+class TestTwoTierCache:
+
+    def test_l1_serves_after_l2_miss(self, two_tier):
+        two_tier.set('page:1', 'html')
+        assert caches['shared'].get('page:1') == 'html'
+        caches['shared'].delete('page:1')
+        assert two_tier.get('page:1') == 'html'
+
+    def test_bypass_prefix_reads_l2(self, two_tier):
+        two_tier.set('ver:posts', 1)
+        caches['shared'].set('ver:posts', 5)
+        assert two_tier.get('ver:posts') == 5
+        assert two_tier.incr('ver:posts') == 6
+        assert two_tier.get_many(['ver:posts', 'nope']) == {'ver:posts': 6}
+
+    def test_l1_filled_from_l2(self, two_tier):
+        caches['shared'].set('page:2', 'shared html')
+        assert two_tier.get('page:2') == 'shared html'
+        caches['shared'].delete('page:2')
+        assert two_tier.get('page:2') == 'shared html'
+
+
+class TestSingleFlight:
+
+    def test_concurrent_misses_compute_once(self, two_tier):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value', 60
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            single_flight(two_tier, 'feed:1', compute)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ['value'] * 5
+        assert len(calls) == 1
+
+    def test_uncacheable_result_not_stored(self, two_tier):
+        assert single_flight(two_tier, 'feed:2',
+                             lambda: ('error', None)) == 'error'
+        assert two_tier.get('feed:2') is None
+
+    def test_foreign_lock_not_released(self, two_tier):
+        # Блокировку держит другой воркер: по истечении ожидания значение
+        # вычисляется, но чужая блокировка остается.
+        two_tier.set('lock:feed:3', 'other', 60)
+        assert single_flight(two_tier, 'feed:3', lambda: ('value', 60),
+                             lock_timeout=0.1, poll=0.01) == 'value'
+        assert two_tier.get('lock:feed:3') == 'other'
@@ -0,0 +1,104 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.utils.cache import patch_vary_headers
+
+from posts import caching
+from posts.models import Post, Group, Comment
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def is_cached(response):
+    # Ответ из кэша страниц не проходит через рендеринг шаблонов.
+    return response.context is None
+
+
+class TestPageCache:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_invalidated_by_new_post(self, client, post):
+        assert not is_cached(client.get('/'))
+        assert is_cached(client.get('/'))
+
+        new_post = Post.objects.create(text='Свежий пост', author=post.author)
+        response = client.get('/')
+        assert not is_cached(response)
+        assert new_post.text in response.content.decode()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_precise_group_invalidation(self, client, post_with_group):
+        other = Group.objects.create(title='Другая', slug='other',
+                                     description='Другая группа')
+        url = f'/group/{post_with_group.group.slug}/'
+        client.get(url)
+        client.get(f'/group/{other.slug}/')
+
+        Post.objects.create(text='В другой группе',
+                            author=post_with_group.author,
+                            group=other)
+        assert is_cached(client.get(url))
+        assert not is_cached(client.get(f'/group/{other.slug}/'))
+
+    @pytest.mark.django_db(transaction=True)
+    def test_comment_invalidates_post_page(self, client, post):
+        url = f'/{post.author.username}/{post.id}/'
+        client.get(url)
+        assert is_cached(client.get(url))
+        Comment.objects.create(text='Новый комментарий', post=post,
+                               author=post.author)
+        response = client.get(url)
+        assert 'Новый комментарий' in response.content.decode()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_authenticated_variant_not_shared(self, user_client, post):
+        guest = Client()
+        guest.get('/')
+        response = user_client.get('/')
+        assert not is_cached(response)
+        assert 'Редактировать' in response.content.decode()
+        assert 'Редактировать' not in guest.get('/').content.decode()
+
+    def test_hit_keeps_view_headers(self, settings):
+        settings.POSTS_CACHE = dict(settings.POSTS_CACHE,
+                                    views={'headers': {'timeout': 60}})
+
+        @caching.cached_page('headers', lambda request: [caching.POSTS])
+        def view(request):
+            response = HttpResponse('<p>Страница</p>',
+                                    content_type='text/html; charset=utf-8')
+            response['Cache-Control'] = 'max-age=60'
+            patch_vary_headers(response, ['Accept'])
+            response.set_cookie('seen', '1')
+            return response
+
+        def get():
+            request = RequestFactory().get('/headers/')
+            request.user = AnonymousUser()
+            return view(request)
+
+        miss, hit = get(), get()
+        assert hit.content == miss.content
+        assert list(hit.items()) == list(miss.items())
+        assert 'seen' not in hit.cookies
+
+    @pytest.mark.django_db(transaction=True)
+    def test_versions_bumped_again_on_commit(self, post):
+        with transaction.atomic():
+            Post.objects.create(text='Свежий пост', author=post.author)
+            # Версия, под которой параллельный запрос мог закэшировать
+            # страницу без еще не закоммиченного поста.
+            inside = caching.get_versions([caching.POSTS])
+        assert caching.get_versions([caching.POSTS]) != inside
+
+    def test_bump_writes_unique_versions(self):
+        versions = {caching.bump(caching.POSTS)[caching.POSTS]
+                    for _ in range(100)}
+        assert len(versions) == 100
+        assert caching.get_versions([caching.POSTS])[0] in versions
@@ -0,0 +1,76 @@
+import pytest
+from django.core.cache import cache
+from django.test import Client
+
+from posts.models import Post, Comment, Follow
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+class TestConditionalGet:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_anonymous_index_not_modified(self, post,
+                                          django_assert_num_queries):
+        guest = Client()
+        response = guest.get('/')
+        etag, modified = response['ETag'], response['Last-Modified']
+        with django_assert_num_queries(0):
+            response = guest.get('/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert guest.get('/', HTTP_IF_MODIFIED_SINCE=modified
+                         ).status_code == 304
+
+        Post.objects.create(text='Новый пост', author=post.author)
+        assert guest.get('/', HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_views_change_etag_on_related_writes(self, post_with_group):
+        post = post_with_group
+        guest = Client()
+        urls = {
+            'group': '/group/test-link/',
+            'profile': f'/{post.author.username}/',
+            'post': f'/{post.author.username}/{post.id}/',
+        }
+        etags = {name: guest.get(url)['ETag'] for name, url in urls.items()}
+        for name, url in urls.items():
+            assert guest.get(url, HTTP_IF_NONE_MATCH=etags[name]
+                             ).status_code == 304
+
+        Comment.objects.create(text='Комментарий', post=post,
+                               author=post.author)
+        for name, url in urls.items():
+            assert guest.get(url, HTTP_IF_NONE_MATCH=etags[name]
+                             ).status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_etag_is_per_user(self, user_client, user, post,
+                              django_user_model):
+        url = f'/{post.author.username}/{post.id}/'
+        guest_etag = Client().get(url)['ETag']
+        # Первый ответ ставит CSRF-cookie, без нее ETag не выдается.
+        user_client.get(url)
+        etag = user_client.get(url)['ETag']
+        assert etag != guest_etag
+        assert user_client.get(url, HTTP_IF_NONE_MATCH=etag
+                               ).status_code == 304
+        assert user_client.get(url, HTTP_IF_NONE_MATCH=guest_etag
+                               ).status_code == 200
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follow_index(self, user_client, user, django_user_model):
+        author = django_user_model.objects.create(username='author')
+        # CSRF-cookie пользователь получает на любой странице с формой.
+        user_client.get('/new/')
+        etag = user_client.get('/follow/')['ETag']
+        assert user_client.get('/follow/', HTTP_IF_NONE_MATCH=etag
+                               ).status_code == 304
+
+        Follow.objects.create(user=user, author=author)
+        assert user_client.get('/follow/', HTTP_IF_NONE_MATCH=etag
+                               ).status_code == 200
+        assert Client().get('/follow/').status_code == 302
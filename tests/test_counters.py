@@ -0,0 +1,76 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from posts import views
+from posts.counters import stats_for
+from posts.forms import PostForm
+from posts.models import Post, Comment, Follow, UserStats
+
+
+class TestCounters:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_counters_follow_writes(self, user_client, user, post):
+        author = get_user_model().objects.create_user(username='author_2')
+        user_client.get(f'/{author.username}/follow/')
+        user_client.post(f'/{post.author.username}/{post.id}/comment/',
+                         {'text': 'Комментарий'})
+        user_client.post('/new/', {'text': 'Новый пост'})
+
+        post.refresh_from_db()
+        assert post.comments_count == 1
+        assert stats_for(author.pk).followers_count == 1
+        assert stats_for(user.pk).following_count == 1
+        assert stats_for(user.pk).posts_count == 2
+
+        user_client.get(f'/{author.username}/unfollow/')
+        assert stats_for(author.pk).followers_count == 0
+        assert stats_for(user.pk).following_count == 0
+
+    @pytest.mark.django_db(transaction=True)
+    def test_edit_keeps_comment_count(self, user_client, user, post,
+                                      monkeypatch):
+        class RacingForm(PostForm):
+            def is_valid(self):
+                # Комментарий добавлен, пока пост редактируется.
+                Comment.objects.create(text='Комментарий', post=post,
+                                       author=user)
+                return super().is_valid()
+
+        monkeypatch.setattr(views, 'PostForm', RacingForm)
+        user_client.post(f'/{user.username}/{post.id}/edit/',
+                         {'text': 'Новый текст'})
+
+        post.refresh_from_db()
+        assert post.text == 'Новый текст'
+        assert post.comments_count == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_reconcile_command(self, user, post):
+        Comment.objects.create(text='Комментарий', post=post, author=user)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        UserStats.objects.filter(user=user).update(posts_count=42)
+
+        call_command('reconcile_counters')
+
+        post.refresh_from_db()
+        assert post.comments_count == 1
+        assert stats_for(user.pk).posts_count == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_delete_user_with_posts_and_follows(self, user, post):
+        author = get_user_model().objects.create_user(username='author_2')
+        Post.objects.create(text='Пост автора', author=author)
+        Comment.objects.create(text='Комментарий', post=post, author=user)
+        Comment.objects.create(text='Ответ', post=post, author=author)
+        Follow.objects.create(user=user, author=author)
+        Follow.objects.create(user=author, author=user)
+
+        user.delete()
+
+        assert not UserStats.objects.filter(user_id=user.pk).exists()
+        assert stats_for(author.pk).followers_count == 0
+        assert stats_for(author.pk).following_count == 0
+        assert stats_for(author.pk).posts_count == 1
+        assert Post.objects.filter(author=author).count() == 1
@@ -0,0 +1,71 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+
+from posts import counting
+from posts.caching import POSTS
+from posts.models import Post
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+class TestCounting:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_cached_count_invalidated_by_signal(
+            self, post, django_assert_num_queries):
+        queryset = Post.objects.all()
+        assert counting.cached_count(queryset, [POSTS]) == 1
+        with django_assert_num_queries(0):
+            assert counting.cached_count(queryset, [POSTS]) == 1
+
+        Post.objects.create(text='Еще пост', author=post.author)
+        assert counting.cached_count(queryset, [POSTS]) == 2
+
+    @pytest.mark.django_db(transaction=True)
+    def test_signature_depends_on_filter(self, post, post_with_group):
+        everything = Post.objects.all()
+        in_group = Post.objects.filter(group=post_with_group.group)
+        assert counting.signature(everything) != counting.signature(in_group)
+        assert counting.cached_count(in_group, [POSTS]) == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_estimated_count(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS sqlite_stat1')
+        posts = [Post.objects.create(text=f'Пост {i}', author=user)
+                 for i in range(5)]
+        assert counting.estimated_count(Post) == posts[-1].pk
+
+        cache.clear()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        assert counting.estimated_count(Post) == 5
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_paginator_count_mode(self, client, settings, post):
+        settings.POSTS_COUNT = dict(settings.POSTS_COUNT, index='estimated')
+        settings.POSTS_PAGINATION = 'keyset'
+        Post.objects.create(text='Второй пост', author=post.author)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Post.objects.create(text='После ANALYZE', author=post.author)
+        response = client.get('/')
+        # Оценка берется из статистики и не видит последний пост.
+        assert response.context['paginator'].count == 2
+
+    @pytest.mark.django_db(transaction=True)
+    def test_estimate_not_used_for_page_links(self, client, settings, user):
+        settings.POSTS_COUNT = dict(settings.POSTS_COUNT, index='estimated')
+        posts = [Post.objects.create(text=f'Пост {i}', author=user)
+                 for i in range(25)]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Post.objects.filter(pk__in=[post.pk for post in posts[:20]]).delete()
+        response = client.get('/')
+        # Статистика говорит о 25 постах, но ссылок на пустые страницы нет.
+        assert response.context['paginator'].count == 5
+        assert response.context['paginator'].num_pages == 1
@@ -0,0 +1,162 @@
+import asyncio
+import json
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client
+
+from posts import events
+from posts.models import Post, Follow
+from yatube import benchmark
+from yatube.asgi import ASGIHandler
+
+
+BACKENDS = ['posts.events.LocalBackend', 'posts.events.CacheBackend']
+
+
+@pytest.fixture(params=BACKENDS)
+def broker(request, settings):
+    settings.POSTS_EVENTS = dict(settings.POSTS_EVENTS, enabled=True,
+                                 backend=request.param, heartbeat=0.05,
+                                 max_duration=1, poll_interval=0.01)
+    cache.clear()
+    return settings
+
+
+def parse(chunks):
+    """SSE-события new_posts из частей потока."""
+    found = []
+    for block in b''.join(chunks).decode().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines()
+                     if not line.startswith(':') and ': ' in line)
+        if lines.get('event') == 'new_posts':
+            found.append(json.loads(lines['data']))
+    return found
+
+
+class TestBroker:
+
+    def test_publish_subscribe(self, broker):
+        backend = events.get_backend()
+        subscription = backend.subscribe(['a', 'b'])
+        backend.publish('a', {'post_id': 1})
+        backend.publish('c', {'post_id': 2})
+        backend.publish('b', {'post_id': 3})
+        assert subscription.get(0.1) == [{'post_id': 1}, {'post_id': 3}]
+        assert subscription.get(0.01) == []
+        subscription.close()
+
+
+class TestEventStream:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_counts_new_posts(self, broker, client, user):
+        first = Post.objects.create(text='Старый', author=user)
+        response = client.get(f'/events/stream/?since={first.pk}')
+        assert response['Content-Type'] == 'text/event-stream'
+        stream = iter(response.streaming_content)
+        assert next(stream).startswith(b'retry:')
+
+        post = Post.objects.create(text='Новый', author=user)
+        assert parse([next(stream)]) == [{'count': 1, 'latest': post.pk}]
+        Post.objects.create(text='Еще', author=user)
+        assert parse([next(stream)])[0]['count'] == 2
+        assert next(stream) == b': keepalive\n\n'
+        response.close()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_reconnect_counts_missed(self, broker, client, user):
+        first = Post.objects.create(text='Старый', author=user)
+        Post.objects.create(text='Пропущенный', author=user)
+        last = Post.objects.create(text='Пропущенный', author=user)
+        response = client.get('/events/stream/',
+                              HTTP_LAST_EVENT_ID=str(first.pk))
+        assert parse([next(iter(response.streaming_content))]) == [
+            {'count': 2, 'latest': last.pk}]
+        response.close()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_group_and_follow_feeds(self, broker, client, user, group):
+        author = get_user_model().objects.create_user(username='author_1')
+        Follow.objects.create(user=user, author=author)
+        client.force_login(user)
+        group_stream = client.get(
+            f'/events/stream/?feed=group&slug={group.slug}&since=0')
+        follow_stream = client.get('/events/stream/?feed=follow&since=0')
+        group_chunks = iter(group_stream.streaming_content)
+        follow_chunks = iter(follow_stream.streaming_content)
+        next(group_chunks), next(follow_chunks)
+
+        Post.objects.create(text='Без группы', author=user)
+        in_group = Post.objects.create(text='В группе', author=user,
+                                       group=group)
+        followed = Post.objects.create(text='От автора', author=author)
+        assert parse([next(group_chunks)]) == [
+            {'count': 1, 'latest': in_group.pk}]
+        assert parse([next(follow_chunks)]) == [
+            {'count': 1, 'latest': followed.pk}]
+        group_stream.close()
+        follow_stream.close()
+
+        assert Client().get('/events/stream/?feed=follow').status_code == 401
+        response = client.get('/events/stream/?feed=group&slug=nope')
+        assert response.status_code == 404
+
+    @pytest.mark.django_db(transaction=True)
+    def test_asgi_stream_without_thread(self, broker, user):
+        first = Post.objects.create(text='Старый', author=user)
+        handler = ASGIHandler(read_workers=1, workers=1)
+        scope = dict(benchmark.make_scope('/events/stream/'),
+                     query_string=f'since={first.pk}'.encode())
+        requested = []
+        sent = []
+
+        async def receive():
+            if not requested:
+                requested.append(True)
+                return {'type': 'http.request', 'body': b''}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            body = message.get('body', b'')
+            if body.startswith(b'retry'):
+                Post.objects.create(text='Новый', author=user)
+            elif b'new_posts' in body:
+                disconnected.set()
+
+        async def main():
+            # Event привязывается к циклу при создании (Python 3.8).
+            nonlocal disconnected
+            disconnected = asyncio.Event()
+            await asyncio.wait_for(handler(scope, receive, send), 5)
+
+        disconnected = None
+
+        asyncio.run(main())
+        handler.close()
+        assert sent[0]['status'] == 200
+        assert parse([m.get('body', b'') for m in sent[1:]])[0]['count'] == 1
+
+    @pytest.mark.django_db
+    def test_feed_page_links_stream(self, broker, client, post):
+        response = client.get('/')
+        assert f'since={post.pk}' in response.content.decode()
+        response = client.get('/events/stream/', {'since': post.pk})
+        assert isinstance(response, events.EventStreamResponse)
+        response.close()
+
+    @pytest.mark.django_db
+    def test_empty_feed_has_no_stream(self, broker, client):
+        # Без поста в ленте since=0 посчитал бы новыми все посты сайта.
+        assert 'EventSource' not in client.get('/').content.decode()
+
+    @pytest.mark.django_db
+    def test_stream_off_by_default(self, client, post):
+        assert 'EventSource' not in client.get('/').content.decode()
+        assert client.get('/events/stream/').status_code == 404
+        # Профиль пользователя "events" не перекрыт потоком.
+        get_user_model().objects.create_user(username='events')
+        assert client.get('/events/').status_code == 200
@@ -0,0 +1,106 @@
+import csv
+import gzip
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from posts import export
+from posts.models import Post, Comment, Follow
+
+
+def read_ndjson(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture
+def posts(user):
+    return [Post.objects.create(text=f'Пост {i}', author=user)
+            for i in range(5)]
+
+
+class TestExportTable:
+
+    @pytest.mark.django_db
+    def test_ndjson(self, tmp_path, posts, group):
+        posts[0].group = group
+        posts[0].save()
+        _, path, written = export.export_table('posts', str(tmp_path),
+                                               chunk_size=2)
+        assert written == 5
+        rows = read_ndjson(tmp_path / 'posts.ndjson')
+        assert [row['id'] for row in rows] == [post.pk for post in posts]
+        assert rows[0]['group_id'] == group.pk
+        assert rows[0]['author_id'] == posts[0].author_id
+        assert export.read_cursor(path)['pk'] == posts[-1].pk
+
+    @pytest.mark.django_db
+    def test_resume_appends_new_rows_only(self, tmp_path, posts, user):
+        export.export_table('posts', str(tmp_path), chunk_size=2)
+        new = Post.objects.create(text='Новый', author=user)
+        _, _, written = export.export_table('posts', str(tmp_path),
+                                            resume=True)
+        assert written == 1
+        rows = read_ndjson(tmp_path / 'posts.ndjson')
+        assert [row['id'] for row in rows] == (
+            [post.pk for post in posts] + [new.pk])
+
+    @pytest.mark.django_db
+    def test_resume_drops_unconfirmed_tail(self, tmp_path, posts):
+        _, path, _ = export.export_table('posts', str(tmp_path),
+                                         chunk_size=2)
+        # Запуск оборвался после записи строк, но до записи курсора.
+        with open(path, 'a') as output:
+            output.write('{"id": 1')
+        export.export_table('posts', str(tmp_path), resume=True)
+        assert len(read_ndjson(tmp_path / 'posts.ndjson')) == 5
+
+    @pytest.mark.django_db
+    def test_csv_gzip(self, tmp_path, user):
+        follower = type(user).objects.create_user(username='reader')
+        Follow.objects.create(user=follower, author=user)
+        export.export_table('follows', str(tmp_path), 'csv', compress=True)
+        Follow.objects.create(user=user, author=follower)
+        export.export_table('follows', str(tmp_path), 'csv', compress=True,
+                            resume=True)
+        with gzip.open(tmp_path / 'follows.csv.gz', 'rt') as stream:
+            rows = list(csv.DictReader(stream))
+        assert [(int(row['follower']), int(row['author'])) for row in rows] \
+            == [(follower.pk, user.pk), (user.pk, follower.pk)]
+
+    @pytest.mark.django_db
+    def test_empty_csv_has_header(self, tmp_path):
+        _, path, written = export.export_table('comments', str(tmp_path),
+                                               'csv')
+        assert written == 0
+        with open(path) as stream:
+            assert next(csv.reader(stream)) == list(
+                export.TABLES['comments'][1])
+
+
+class TestExportCommand:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_all_tables(self, tmp_path, post, user):
+        Comment.objects.create(text='Комментарий', post=post, author=user)
+        out = StringIO()
+        call_command('export_data', str(tmp_path), workers=2, stdout=out)
+        assert 'posts: 1 строк' in out.getvalue()
+        assert 'comments: 1 строк' in out.getvalue()
+        assert read_ndjson(tmp_path / 'comments.ndjson')[0]['post_id'] \
+            == post.pk
+        assert read_ndjson(tmp_path / 'groups.ndjson') == []
+
+    @pytest.mark.django_db(transaction=True)
+    def test_follows_round_trip(self, tmp_path, user, django_user_model):
+        reader = django_user_model.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=user)
+        call_command('export_data', str(tmp_path), tables=['follows'],
+                     format='csv', stdout=StringIO())
+        Follow.objects.all().delete()
+        out = StringIO()
+        call_command('import_follows', str(tmp_path / 'follows.csv'),
+                     ids=True, stdout=out)
+        assert 'создано: 1' in out.getvalue()
+        assert Follow.objects.filter(user=reader, author=user).exists()
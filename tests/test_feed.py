@@ -0,0 +1,76 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from posts.feed import follow_feed
+from posts.models import Post, FeedEntry
+
+
+def feed_ids(client):
+    response = client.get('/follow/')
+    return {post.pk for post in response.context['page'].object_list}
+
+
+@pytest.fixture(autouse=True)
+def materialized(settings):
+    settings.FOLLOW_FEED_MATERIALIZED = True
+    settings.FOLLOW_FEED_CELEBRITY_THRESHOLD = 1
+    cache.clear()
+
+
+class TestMaterializedFeed:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_fan_out_backfill_prune(self, user_client, user):
+        author = get_user_model().objects.create_user(username='author_1')
+        old_post = Post.objects.create(text='Старый пост', author=author)
+
+        user_client.get(f'/{author.username}/follow/')
+        assert FeedEntry.objects.filter(user=user).count() == 1
+
+        new_post = Post.objects.create(text='Новый пост', author=author)
+        assert FeedEntry.objects.filter(user=user).count() == 2
+        assert feed_ids(user_client) == {old_post.pk, new_post.pk}
+
+        user_client.get(f'/{author.username}/unfollow/')
+        assert FeedEntry.objects.filter(user=user).count() == 0
+        assert feed_ids(user_client) == set()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_celebrity_read_path(self, user_client, user):
+        User = get_user_model()
+        star = User.objects.create_user(username='star')
+        fan = User.objects.create_user(username='fan')
+        user_client.get(f'/{star.username}/follow/')
+        user_client.force_login(fan)
+        user_client.get(f'/{star.username}/follow/')
+
+        post = Post.objects.create(text='Пост знаменитости', author=star)
+        assert not FeedEntry.objects.filter(post=post).exists()
+        assert feed_ids(user_client) == {post.pk}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_demoted_celebrity_backfills_followers(self, user_client, user):
+        User = get_user_model()
+        star = User.objects.create_user(username='star')
+        fan = User.objects.create_user(username='fan')
+        user_client.get(f'/{star.username}/follow/')
+        user_client.force_login(fan)
+        user_client.get(f'/{star.username}/follow/')
+        post = Post.objects.create(text='Пост знаменитости', author=star)
+        assert not FeedEntry.objects.filter(post=post).exists()
+
+        user_client.get(f'/{star.username}/unfollow/')
+        assert FeedEntry.objects.filter(user=user, post=post).exists()
+        user_client.force_login(user)
+        assert feed_ids(user_client) == {post.pk}
+
+    @pytest.mark.django_db(transaction=True)
+    def test_inbox_ordered_by_feed_entry_date(self, user_client, user):
+        author = get_user_model().objects.create_user(username='author_1')
+        user_client.get(f'/{author.username}/follow/')
+        Post.objects.create(text='Пост', author=author)
+
+        sql = str(follow_feed(user).order_by('-feed_date').query)
+        assert '"posts_feedentry"."pub_date" AS "feed_date"' in sql
+        assert 'ORDER BY "feed_date" DESC' in sql
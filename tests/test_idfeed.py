@@ -0,0 +1,115 @@
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts import idfeed
+from posts.models import Post, Group
+
+
+def feed_queries(client, url, **params):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, params)
+    assert response.status_code == 200
+    sql = [query['sql'] for query in queries]
+    ids = [q for q in sql if q.startswith('SELECT "posts_post"."id" FROM')]
+    joined = [q for q in sql if '"posts_post"."text"' in q and 'JOIN' in q]
+    return response, ids, joined
+
+
+def page_ids(response):
+    return [post.pk for post in response.context['page'].object_list]
+
+
+@pytest.fixture
+def posts(user):
+    return [Post.objects.create(text=f'Пост {i}', author=user)
+            for i in range(12)]
+
+
+class TestPacking:
+
+    def test_round_trip(self):
+        ids = [3, 2 ** 40, 1]
+        assert idfeed.unpack(idfeed.pack(ids)) == ids
+        assert len(idfeed.pack(ids)) == 24
+
+
+class TestIdFeed:
+
+    @pytest.mark.django_db
+    def test_shared_between_users(self, user_client, posts,
+                                  django_user_model):
+        response, ids, joined = feed_queries(user_client, '/')
+        assert len(ids) == 1 and not joined
+        assert page_ids(response) == [post.pk for post in posts[::-1][:10]]
+
+        other = Client()
+        other.force_login(django_user_model.objects.create_user('other'))
+        response, ids, _ = feed_queries(other, '/')
+        assert not ids
+        assert page_ids(response) == [post.pk for post in posts[::-1][:10]]
+        # Ссылка на редактирование - только у автора.
+        assert 'Редактировать' not in response.content.decode()
+
+    @pytest.mark.django_db
+    def test_new_post_prepended(self, user_client, user, posts):
+        feed_queries(user_client, f'/{user.username}/')
+        feed_queries(user_client, '/', page=2)
+        post = Post.objects.create(text='Новый', author=user)
+        response, ids, _ = feed_queries(user_client, f'/{user.username}/')
+        assert not ids
+        assert page_ids(response)[:2] == [post.pk, posts[-1].pk]
+        assert len(page_ids(response)) == 10
+        # Окна со смещением сдвинулись и читаются заново.
+        _, ids, _ = feed_queries(user_client, '/', page=2)
+        assert len(ids) == 1
+
+    @pytest.mark.django_db
+    def test_next_cursor_window_survives_new_post(self, settings,
+                                                  user_client, user, posts):
+        settings.POSTS_PAGINATION = 'keyset'
+        response, _, _ = feed_queries(user_client, '/')
+        cursor = response.context['page'].next_cursor
+        first, ids, _ = feed_queries(user_client, '/', cursor=cursor)
+        assert len(ids) == 1
+        Post.objects.create(text='Новый', author=user)
+        second, ids, _ = feed_queries(user_client, '/', cursor=cursor)
+        assert not ids
+        assert page_ids(second) == page_ids(first)
+
+    @pytest.mark.django_db
+    def test_delete_and_move(self, user_client, user, posts):
+        group = Group.objects.create(title='Группа', slug='g',
+                                     description='-')
+        feed_queries(user_client, '/')
+        feed_queries(user_client, '/group/g/')
+        posts[-1].delete()
+        response, ids, _ = feed_queries(user_client, '/')
+        assert len(ids) == 1 and posts[-1].pk not in page_ids(response)
+
+        moved = posts[0]
+        moved.group = group
+        moved.save()
+        response, ids, _ = feed_queries(user_client, '/group/g/')
+        assert len(ids) == 1 and page_ids(response) == [moved.pk]
+        # Состав главной ленты не изменился.
+        _, ids, _ = feed_queries(user_client, '/')
+        assert not ids
+
+    @pytest.mark.django_db
+    def test_edit_keeps_ids(self, user_client, posts):
+        feed_queries(user_client, '/')
+        post = posts[-1]
+        post.text = 'Исправлено'
+        post.save()
+        response, ids, _ = feed_queries(user_client, '/')
+        assert not ids
+        assert response.context['page'].object_list[0].text == 'Исправлено'
+
+    @pytest.mark.django_db
+    def test_disabled(self, settings, user_client, posts):
+        settings.POSTS_FEED_IDS = dict(settings.POSTS_FEED_IDS,
+                                       enabled=False)
+        _, ids, joined = feed_queries(user_client, '/')
+        assert not ids and len(joined) == 1
@@ -0,0 +1,90 @@
+import logging
+
+import pytest
+from django.core.cache import caches
+from django.core.management import call_command
+from django.template.base import Template
+
+from yatube import instrumentation
+
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path):
+    settings.INSTRUMENTATION = dict(settings.INSTRUMENTATION,
+                                    snapshot_dir=str(tmp_path),
+                                    snapshot_every=1)
+    instrumentation.registry.reset()
+    return tmp_path
+
+
+class TestInstrumentation:
+
+    def test_fingerprint(self):
+        first = instrumentation.fingerprint(
+            "SELECT * FROM t WHERE id = 1 AND name = 'a' AND x IN (%s, %s)")
+        second = instrumentation.fingerprint(
+            "SELECT * FROM t  WHERE id = 25 AND name = 'b' AND x IN (%s)")
+        assert first == second
+
+    @pytest.mark.django_db(transaction=True)
+    def test_request_recorded(self, client, post, metrics_dir):
+        client.get('/')
+        client.get(f'/{post.author.username}/')
+        snapshot = instrumentation.registry.snapshot()
+        assert snapshot['index']['histograms']['queries']['count'] == 1
+        assert snapshot['profile']['histograms']['queries']['sum'] > 0
+        assert list(metrics_dir.glob('metrics-*.json'))
+
+    @pytest.mark.django_db(transaction=True)
+    def test_budget_logs_duplicates(self, client, post, settings,
+                                    metrics_dir, caplog):
+        settings.INSTRUMENTATION = dict(settings.INSTRUMENTATION,
+                                        budgets={'default': {'queries': 0}})
+        with caplog.at_level(logging.WARNING, 'yatube.instrumentation'):
+            client.get(f'/{post.author.username}/')
+        assert 'profile over budget' in caplog.text
+        snapshot = instrumentation.registry.snapshot()
+        assert snapshot['profile']['over_budget'] == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_endpoint_and_dump(self, client, admin_client, post,
+                               metrics_dir, capsys):
+        response = client.get('/admin/metrics/')
+        assert response.status_code == 302
+        response = admin_client.get('/admin/metrics/')
+        assert 'yatube_request_queries_bucket{view="index"' not in \
+            response.content.decode()
+        admin_client.get('/')
+        response = admin_client.get('/admin/metrics/')
+        assert 'yatube_request_queries_bucket{view="index"' in \
+            response.content.decode()
+
+        call_command('metrics_dump')
+        response = client.get('/metrics/')
+        assert response.status_code == 404
+        assert 'index' in capsys.readouterr().out
+
+    @pytest.mark.django_db(transaction=True)
+    def test_originals_restored(self, client, post, settings):
+        settings.INSTRUMENTATION = dict(settings.INSTRUMENTATION,
+                                        profile_templates=True)
+        response = client.get('/')
+        assert response.has_header('Server-Timing')
+        assert Template.render is instrumentation._original_render
+        assert 'get' not in vars(caches['default'])
+
+    def test_cache_bookkeeping_not_counted(self):
+        cache = caches['default']
+        cache.set('page:counted', 1)
+        stats = instrumentation.RequestStats()
+        instrumentation._local.stats = stats
+        try:
+            with instrumentation.counting_cache(cache):
+                cache.get('ver:posts')
+                cache.get('lock:page:counted')
+                cache.get('replicas:written')
+                cache.get('page:counted')
+                cache.get_many(['mod:posts', 'page:counted', 'page:missing'])
+        finally:
+            instrumentation._local.stats = None
+        assert (stats.cache_hits, stats.cache_misses) == (2, 1)
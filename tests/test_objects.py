@@ -0,0 +1,144 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts import objects
+from posts.models import Post, Comment
+
+
+def count_queries(func, *args):
+    with CaptureQueriesContext(connection) as queries:
+        result = func(*args)
+    return result, len(queries)
+
+
+class TestLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        lru = objects.LRUCache()
+        for key in 'abc':
+            lru.set(key, key.upper(), 60, max_entries=2)
+        assert lru.get('a', 0) is None
+        assert lru.get('b', 0) == 'B'
+        lru.set('d', 'D', 60, max_entries=2)
+        # c читали раньше b, поэтому вытеснен он.
+        assert lru.get('c', 0) is None
+        assert len(lru) == 2
+
+    def test_expires(self):
+        lru = objects.LRUCache()
+        lru.set('a', 1, 0.001, max_entries=10)
+        assert lru.get('a', float('inf')) is None
+        assert len(lru) == 0
+
+
+class TestObjectCache:
+
+    @pytest.mark.django_db
+    def test_read_through(self, user):
+        found, queries = count_queries(objects.users.get, user.username)
+        assert found == user and queries == 1
+        found, queries = count_queries(objects.users.get, user.username)
+        assert found.username == user.username and queries == 0
+        # Каждый раз новый объект: изменения не попадают в кэш.
+        found.first_name = 'Изменено'
+        assert objects.users.get(user.username).first_name == ''
+        assert objects.users.get('nobody') is None
+
+    @pytest.mark.django_db
+    def test_shared_tier(self, user):
+        objects.users.get(user.username)
+        objects.clear()
+        _, queries = count_queries(objects.users.get, user.username)
+        assert queries == 0
+
+    @pytest.mark.django_db
+    def test_get_many_one_query(self, user, group):
+        posts = [Post.objects.create(text=f'Пост {i}', author=user,
+                                     group=group if i % 2 else None)
+                 for i in range(4)]
+        ids = [post.pk for post in reversed(posts)] + [10 ** 6]
+        found, queries = count_queries(objects.posts.get_many, ids)
+        assert queries == 1
+        assert sorted(found) == sorted(post.pk for post in posts)
+
+        ids = ids[:-1]
+        hydrated, queries = count_queries(objects.hydrate, ids)
+        # Посты уже в кэше, авторы и группы - по запросу на модель.
+        assert queries == 2
+        assert [post.pk for post in hydrated] == ids
+        assert hydrated[0].author.username == user.username
+        assert hydrated[0].group.slug == group.slug
+        assert hydrated[1].group is None
+        _, queries = count_queries(objects.hydrate, ids)
+        assert queries == 0
+
+    @pytest.mark.django_db
+    def test_invalidation(self, user, group, post):
+        objects.users.get(user.username)
+        user.username = 'renamed'
+        user.save()
+        assert objects.users.get('TestUser') is None
+        assert objects.users.get('renamed').pk == user.pk
+
+        objects.groups.get(group.slug)
+        group.title = 'Новое название'
+        group.save()
+        assert objects.groups.get(group.slug).title == 'Новое название'
+
+        objects.posts.get(post.pk)
+        Comment.objects.create(text='Комментарий', post=post, author=user)
+        assert objects.posts.get(post.pk).comments_count == 1
+        post.delete()
+        assert objects.posts.get(post.pk) is None
+
+    @pytest.mark.django_db
+    def test_user_fields(self, user):
+        objects.users.get(user.username)
+        row = cache.get(objects.users.key(user.username))
+        assert user.password not in row and len(row) == 4
+        found = objects.users.get(user.username)
+        assert found.get_full_name() == user.get_full_name()
+        # Остальные поля догружаются из БД.
+        assert found.password == user.password
+
+    @pytest.mark.django_db
+    def test_shared_only_skips_local(self, user):
+        objects.users.get(user.username)
+        # Запись в другом воркере: общий ключ сброшен, кэш процесса - нет.
+        User = type(user)
+        User.objects.filter(pk=user.pk).update(first_name='Новое')
+        cache.delete(objects.users.key(user.username))
+        assert objects.users.get(user.username).first_name == ''
+        with objects.shared_only():
+            found = objects.users.get(user.username)
+        assert found.first_name == 'Новое'
+
+    @pytest.mark.django_db
+    def test_disabled(self, settings, user):
+        settings.POSTS_OBJECT_CACHE = dict(settings.POSTS_OBJECT_CACHE,
+                                           enabled=False)
+        objects.users.get(user.username)
+        _, queries = count_queries(objects.users.get, user.username)
+        assert queries == 1
+
+
+class TestViews:
+
+    @pytest.mark.django_db
+    def test_post_view_uses_cache(self, settings, post_with_group):
+        settings.POSTS_CACHE = dict(settings.POSTS_CACHE, enabled=False)
+        post = post_with_group
+        url = f'/{post.author.username}/{post.pk}/'
+        client = Client()
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        tables = ' '.join(query['sql'] for query in queries)
+        assert '"posts_post"."text"' not in tables
+        assert 'FROM "auth_user"' not in tables
+        assert response.context['post'].group.slug == post.group.slug
+        assert Client().get(f'/nobody/{post.pk}/').status_code == 404
+        assert Client().get(f'/{post.author.username}/0/').status_code == 404
@@ -0,0 +1,64 @@
+import pytest
+
+from posts.models import Post
+from posts.pagination import (KeysetPaginator, decode_cursor, encode_cursor,
+                              NEXT)
+
+
+@pytest.fixture
+def many_posts(user):
+    return [Post.objects.create(text=f'Пост {i}', author=user)
+            for i in range(25)]
+
+
+class TestKeysetPagination:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_cursor_roundtrip(self, post):
+        cursor = encode_cursor(post, NEXT)
+        direction, pub_date, pk = decode_cursor(cursor)
+        assert direction == NEXT
+        assert pub_date == post.pub_date
+        assert pk == post.pk
+        assert decode_cursor('мусор') is None
+        assert decode_cursor('') is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_keyset_walk(self, many_posts):
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor, page.next_page_number())
+            seen.extend(page)
+        assert page.number == 3
+        assert [p.pk for p in seen] == [p.pk for p in reversed(many_posts)]
+
+        page = paginator.page(page.previous_cursor,
+                              page.previous_page_number())
+        assert page.number == 2
+        assert [p.pk for p in page] == [p.pk for p in seen[10:20]]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_compat_view_follows_cursor(self, client, many_posts):
+        response = client.get('/')
+        page = response.context['page']
+        assert page.next_cursor
+        response = client.get(f'/?page=2&cursor={page.next_cursor}')
+        page = response.context['page']
+        assert page.number == 2
+        expected = [p.pk for p in reversed(many_posts)][10:20]
+        assert [p.pk for p in page.object_list] == expected
+        assert f'cursor={page.next_cursor}' in response.content.decode()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_keyset_mode_view(self, client, settings, many_posts):
+        settings.POSTS_PAGINATION = 'keyset'
+        response = client.get('/')
+        page = response.context['page']
+        response = client.get(f'/?page=2&cursor={page.next_cursor}')
+        response = client.get(
+            f'/?page=3&cursor={response.context["page"].next_cursor}')
+        page = response.context['page']
+        assert len(page) == 5
+        assert not page.has_next()
@@ -0,0 +1,66 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment
+
+
+@pytest.fixture
+def no_page_cache(settings):
+    settings.POSTS_CACHE = dict(settings.POSTS_CACHE, enabled=False)
+
+
+def add_comments(post, django_user_model, count, start=0):
+    comments = []
+    for i in range(start, start + count):
+        author = django_user_model.objects.create(username=f'commenter{i}')
+        comments.append(Comment.objects.create(
+            text=f'Комментарий {i}', post=post, author=author))
+    return comments
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url).status_code == 200
+    return len(queries)
+
+
+class TestPostComments:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_queries_do_not_grow_with_comments(
+            self, client, post, django_user_model, no_page_cache):
+        url = f'/{post.author.username}/{post.id}/'
+        add_comments(post, django_user_model, 2)
+        # Первый запрос создает UserStats автора.
+        count_queries(client, url)
+        few = count_queries(client, url)
+        add_comments(post, django_user_model, 20, start=2)
+        # Комментарии сбросили пост в кэше объектов: он читается заново.
+        count_queries(client, url)
+        assert count_queries(client, url) == few
+
+    @pytest.mark.django_db(transaction=True)
+    def test_load_more(self, client, post, django_user_model,
+                       settings, no_page_cache):
+        settings.POSTS_COMMENTS_PER_PAGE = 3
+        comments = add_comments(post, django_user_model, 7)
+        newest_first = comments[::-1]
+
+        response = client.get(f'/{post.author.username}/{post.id}/')
+        assert list(response.context['comments']) == newest_first[:3]
+        cursor = response.context['next_cursor']
+
+        url = f'/{post.author.username}/{post.id}/comments/'
+        response = client.get(url, {'cursor': cursor})
+        assert list(response.context['comments']) == newest_first[3:6]
+        assert 'Показать еще' in response.content.decode()
+
+        response = client.get(url, {'cursor': response.context['next_cursor']})
+        assert list(response.context['comments']) == newest_first[6:]
+        assert response.context['next_cursor'] is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_wrong_author_is_404(self, client, post, no_page_cache):
+        assert client.get(f'/nobody/{post.id}/').status_code == 404
+        assert client.get(f'/nobody/{post.id}/comments/').status_code == 404
@@ -0,0 +1,50 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+
+from posts import queryplan
+from posts.models import Post, Comment, Follow
+
+
+def plan_problems(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return queryplan.problems(queryplan.explain(sql, params))
+
+
+class TestQueryPlan:
+
+    @pytest.mark.django_db
+    def test_full_scan_flagged(self):
+        queryset = Post.objects.filter(text='пост').order_by()
+        assert plan_problems(queryset) == ['полное сканирование posts_post']
+        plan = queryplan.explain(*queryset.query.sql_with_params())
+        assert queryplan.problems(plan, ignore=['posts_post']) == []
+
+    @pytest.mark.django_db
+    def test_feeds_use_composite_indexes(self, user, group):
+        assert plan_problems(
+            Post.objects.filter(author=user).order_by('-pub_date')) == []
+        assert plan_problems(
+            Post.objects.filter(group=group).order_by('-pub_date')) == []
+        assert plan_problems(
+            Comment.objects.filter(post_id=1).order_by('-created')) == []
+        assert plan_problems(
+            Follow.objects.filter(user=user, author_id=1)) == []
+
+    @pytest.mark.django_db
+    def test_follow_is_unique(self, user, django_user_model):
+        author = django_user_model.objects.create(username='author')
+        Follow.objects.create(user=user, author=author)
+        with pytest.raises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_audit_command(self, post_with_group):
+        out = StringIO()
+        call_command('audit_queries', '--verbose', stdout=out)
+        output = out.getvalue()
+        assert 'index /' in output
+        assert 'group /group/test-link/' in output
+        assert 'Запросов:' in output
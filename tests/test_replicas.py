@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from posts import caching
+from posts.models import Post
+from yatube import replicas
+
+
+@pytest.fixture
+def replica_settings(settings):
+    settings.REPLICAS = dict(settings.REPLICAS, aliases=['replica1'],
+                             pin_seconds=5)
+    return settings
+
+
+def route(request, write=False):
+    """Прогоняет запрос через middleware и возвращает выбранные БД."""
+    router = replicas.ReplicaRouter()
+    used = {}
+
+    def view(request):
+        used['before'] = router.db_for_read(Post)
+        if write:
+            router.db_for_write(Post)
+        used['after'] = router.db_for_read(Post)
+        return HttpResponse()
+
+    response = replicas.ReplicaMiddleware(view)(request)
+    return used, response
+
+
+class TestReplicaRouting:
+
+    def test_reads_outside_requests_use_primary(self, replica_settings):
+        router = replicas.ReplicaRouter()
+        assert router.db_for_read(Post) == 'default'
+        with replicas.reading():
+            assert router.db_for_read(Post) == 'replica1'
+            with replicas.use_primary():
+                assert router.db_for_read(Post) == 'default'
+        assert router.db_for_write(Post) == 'default'
+
+    def test_safe_request_reads_from_replica(self, replica_settings):
+        used, response = route(RequestFactory().get('/'))
+        assert used == {'before': 'replica1', 'after': 'replica1'}
+        assert 'pin_primary' not in response.cookies
+
+    def test_write_pins_client_to_primary(self, replica_settings):
+        used, response = route(RequestFactory().get('/'), write=True)
+        assert used == {'before': 'replica1', 'after': 'default'}
+        assert response.cookies['pin_primary']['max-age'] == 5
+
+        request = RequestFactory().get('/')
+        request.COOKIES['pin_primary'] = '1'
+        used, response = route(request)
+        assert used == {'before': 'default', 'after': 'default'}
+
+    def test_unsafe_method_uses_primary(self, replica_settings):
+        used, _ = route(RequestFactory().post('/new/'), write=True)
+        assert used == {'before': 'default', 'after': 'default'}
+
+    def test_cache_fills_use_primary_after_write(self, replica_settings):
+        router = replicas.ReplicaRouter()
+        with replicas.reading():
+            with replicas.filling():
+                assert router.db_for_read(Post) == 'replica1'
+            # Запись любого клиента: версии сброшены, кэш заполняется
+            # только из основной БД, пока реплика может отставать.
+            caching.bump(caching.POSTS)
+            with replicas.filling():
+                assert router.db_for_read(Post) == 'default'
+            assert router.db_for_read(Post) == 'replica1'
+            cache.delete(replicas.WRITTEN_KEY)
+            with replicas.filling():
+                assert router.db_for_read(Post) == 'replica1'
+
+    def test_copy_database(self, tmp_path):
+        source, target = str(tmp_path / 'db.sqlite3'), str(tmp_path / 'r1')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE t (x)')
+            db.execute('INSERT INTO t VALUES (1)')
+        replicas.copy_database(source, target)
+        with sqlite3.connect(source) as db:
+            db.execute('INSERT INTO t VALUES (2)')
+        replica = sqlite3.connect(target)
+        # Реплика отстает до следующей синхронизации.
+        assert replica.execute('SELECT COUNT(*) FROM t').fetchone() == (1,)
+        replica.close()
+        replicas.copy_database(source, target)
+        replica = sqlite3.connect(target)
+        assert replica.execute('SELECT COUNT(*) FROM t').fetchone() == (2,)
+        replica.close()
@@ -0,0 +1,103 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from posts import search
+from posts.models import Post, Comment
+from posts.stemmer import stem, tokenize
+
+
+@pytest.fixture(params=['fts5', 'python'])
+def backend(request, settings):
+    settings.POSTS_SEARCH = dict(settings.POSTS_SEARCH,
+                                 backend=request.param)
+    search.get_backend().clear()
+    yield search.get_backend()
+    search.get_backend().clear()
+
+
+class TestStemmer:
+
+    def test_word_forms_share_stem(self):
+        assert stem('котами') == stem('коты') == stem('кот')
+        assert stem('путешествие') == stem('путешествия')
+        assert stem('читающий') == stem('читать')
+
+    def test_tokenize(self):
+        assert tokenize('Ёлки и Django!') == ['елк', 'django']
+
+
+class TestSearch:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_finds_post_by_word_form(self, backend, user):
+        post = Post.objects.create(text='Про котов и собак', author=user)
+        Post.objects.create(text='Про погоду', author=user)
+        posts, cursor = search.find('кот')
+        assert posts == [post]
+        assert cursor is None
+        assert search.find('собаками кот')[0] == [post]
+        assert search.find('кот погода')[0] == []
+
+    @pytest.mark.django_db(transaction=True)
+    def test_finds_post_by_comment(self, backend, user):
+        post = Post.objects.create(text='Просто пост', author=user)
+        comment = Comment.objects.create(text='Отличные фотографии',
+                                         post=post, author=user)
+        assert search.find('фотография')[0] == [post]
+
+        comment.delete()
+        assert search.find('фотография')[0] == []
+
+    @pytest.mark.django_db(transaction=True)
+    def test_index_follows_edit_and_delete(self, backend, user):
+        post = Post.objects.create(text='Старый текст', author=user)
+        post.text = 'Новый текст'
+        post.save()
+        assert search.find('старый')[0] == []
+        assert search.find('новый')[0] == [post]
+
+        post.delete()
+        assert search.find('текст')[0] == []
+
+    @pytest.mark.django_db(transaction=True)
+    def test_ranking_and_cursor(self, backend, user):
+        in_comment = Post.objects.create(text='Пост о погоде', author=user)
+        Comment.objects.create(text='Люблю кофе', post=in_comment,
+                               author=user)
+        weak = Post.objects.create(
+            text='Кофе, а еще чай, сок, вода, молоко и лимонад', author=user)
+        strong = Post.objects.create(text='Кофе кофе кофе', author=user)
+
+        found = []
+        posts, cursor = search.find('кофе', per_page=2)
+        assert posts == [strong, weak]
+        found += posts
+        posts, cursor = search.find('кофе', cursor, per_page=2)
+        found += posts
+        assert found == [strong, weak, in_comment]
+        assert cursor is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rebuild(self, backend, user):
+        post = Post.objects.create(text='Индекс', author=user)
+        backend.clear()
+        assert search.find('индекс')[0] == []
+        call_command('rebuild_search_index', stdout=StringIO())
+        assert search.find('индекс')[0] == [post]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_search_view(self, backend, client, post):
+        response = client.get('/search/posts/', {'q': post.text.split()[0]})
+        assert response.status_code == 200
+        assert response.context['posts'] == [post]
+        assert client.get('/search/posts/').status_code == 200
+
+    @pytest.mark.django_db
+    def test_profile_named_search(self, client):
+        get_user_model().objects.create_user(username='search')
+        response = client.get('/search/')
+        assert response.status_code == 200
+        assert response.context['author'].username == 'search'
@@ -0,0 +1,141 @@
+import threading
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper as DefaultWrapper
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Post, Comment, Follow
+from yatube import replicas, writes
+from yatube.sqlite3.base import DatabaseWrapper
+
+
+@pytest.fixture
+def coalescing(settings):
+    settings.WRITE_COALESCING = dict(settings.WRITE_COALESCING, enabled=True,
+                                     max_delay=0.05)
+    return writes.coalescer
+
+
+class TestBackend:
+
+    def test_pragmas_on_connect(self, settings, tmp_path):
+        settings_dict = dict(settings.DATABASES['default'],
+                             NAME=str(tmp_path / 'db.sqlite3'),
+                             OPTIONS={'timeout': 5,
+                                      'pragmas': settings.SQLITE_PRAGMAS})
+        wrapper = DatabaseWrapper(settings_dict)
+        params = wrapper.get_connection_params()
+        assert 'pragmas' not in params
+        conn = wrapper.get_new_connection(params)
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        # NORMAL
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1
+        conn.close()
+
+        plain = DefaultWrapper(dict(settings_dict, OPTIONS={}))
+        conn = plain.get_new_connection(plain.get_connection_params())
+        # Режим WAL сохраняется в самом файле БД.
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        conn.close()
+
+
+class TestWriteCoalescing:
+
+    @pytest.mark.django_db
+    def test_disabled_runs_inline(self, settings, post):
+        settings.WRITE_COALESCING = dict(settings.WRITE_COALESCING,
+                                         enabled=False)
+        comment = writes.run(Comment.objects.create, post=post,
+                             author=post.author, text='Сразу')
+        assert Comment.objects.get(pk=comment.pk).text == 'Сразу'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_views_write_through_coalescer(self, coalescing, user_client,
+                                           user, django_user_model):
+        author = django_user_model.objects.create_user(username='author_1')
+        post = Post.objects.create(text='Пост', author=author)
+        writes_before = coalescing.writes
+        user_client.post(f'/{author.username}/{post.pk}/comment/',
+                         {'text': 'Комментарий'})
+        user_client.get(f'/{author.username}/follow/')
+        assert coalescing.writes == writes_before + 2
+        assert Comment.objects.filter(post=post, author=user).exists()
+        assert Follow.objects.filter(user=user, author=author).exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_writes_share_commits(self, coalescing, user):
+        post = Post.objects.create(text='Пост', author=user)
+        batches_before = coalescing.batches
+        errors = []
+
+        def write(i):
+            try:
+                writes.run(Comment.objects.create, post_id=post.pk,
+                           author_id=user.pk, text=f'Комментарий {i}')
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(i,))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+        assert Comment.objects.filter(post=post).count() == 8
+        assert coalescing.batches - batches_before < 8
+
+    @pytest.mark.django_db(transaction=True)
+    def test_failed_write_raises_in_caller(self, coalescing, user):
+        post = Post.objects.create(text='Пост', author=user)
+        Follow.objects.create(user=user, author=post.author)
+        with pytest.raises(IntegrityError):
+            writes.run(Follow.objects.create, user=user, author=post.author)
+        comment = writes.run(Comment.objects.create, post=post, author=user,
+                             text='После ошибки')
+        assert Comment.objects.filter(pk=comment.pk).exists()
+        # Запрос читает свою запись с основной БД.
+        assert replicas.wrote()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_batch_begins_immediate(self, coalescing, user):
+        pending = writes.Pending(Post.objects.create, (),
+                                 {'text': 'Пачка', 'author': user})
+        with CaptureQueriesContext(connection) as queries:
+            coalescing.flush([pending])
+        assert queries[0]['sql'] == 'BEGIN IMMEDIATE'
+        assert pending.error is None and pending.result.pk
+
+    @pytest.mark.django_db(transaction=True)
+    def test_stalled_writer_falls_back(self, coalescing, settings, user,
+                                       monkeypatch):
+        settings.WRITE_COALESCING = dict(settings.WRITE_COALESCING,
+                                         timeout=0.1)
+        stalled = writes.Coalescer()
+        # Писатель не запускается: запись остается в очереди.
+        monkeypatch.setattr(stalled, 'submit', stalled.queue.put)
+        monkeypatch.setattr(writes, 'coalescer', stalled)
+        post = writes.run(Post.objects.create, text='Напрямую', author=user)
+        assert Post.objects.filter(pk=post.pk).exists()
+
+        # Отозванную запись писатель пропускает и не считает.
+        stalled.flush([stalled.queue.get_nowait()])
+        assert Post.objects.filter(text='Напрямую').count() == 1
+        assert stalled.writes == 0
+
+
+class TestBenchmarkDB:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_compares_profiles(self, user):
+        Post.objects.create(text='Пост', author=user)
+        out = StringIO()
+        call_command('benchmark_db', seconds=0.3, readers=1, writers=1,
+                     seed=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        assert [line.split()[0] for line in lines] == [
+            'profile', 'default', 'production']
+        assert not Comment.objects.filter(text='benchmark_db').exists()
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+
+from posts import search
+from posts.models import Post, FeedEntry
+from tasks import queue
+from tasks.models import Job
+from tasks.worker import Worker
+
+
+calls = []
+
+
+@queue.task(name='tests.record', priority=1)
+def record(value):
+    calls.append(value)
+
+
+@queue.task(name='tests.urgent', priority=9)
+def urgent(value):
+    calls.append(value)
+
+
+@queue.task(name='tests.flaky', max_attempts=3)
+def flaky(failures):
+    calls.append(failures)
+    if len(calls) <= failures:
+        raise RuntimeError('сбой')
+
+
+@pytest.fixture
+def queued(settings):
+    settings.TASKS = dict(settings.TASKS, mode='queue', retry_delay=0,
+                          poll_interval=0.01)
+    calls.clear()
+    cache.clear()
+    return settings
+
+
+def run_worker(**kwargs):
+    return Worker(workers=2, **kwargs).run(once=True)
+
+
+class TestQueue:
+
+    @pytest.mark.django_db
+    def test_inline_mode_runs_immediately(self, settings):
+        settings.TASKS = dict(settings.TASKS, mode='inline')
+        calls.clear()
+        assert record.enqueue('сразу') is None
+        assert calls == ['сразу']
+        assert not Job.objects.exists()
+
+    @pytest.mark.django_db
+    def test_dedupe_by_key(self, queued):
+        assert record.enqueue(1, key='same') is not None
+        assert record.enqueue(1, key='same') is None
+        record.enqueue(2)
+        record.enqueue(2)
+        assert Job.objects.count() == 3
+
+        job = Job.objects.get(key='same')
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING)
+        # Пока задача выполняется, такую же можно поставить снова.
+        assert record.enqueue(1, key='same') is not None
+
+    @pytest.mark.django_db
+    def test_claim_by_priority(self, queued):
+        record.enqueue('low')
+        urgent.enqueue('high')
+        record.enqueue('later', delay=60)
+        jobs = queue.claim('worker', 10)
+        assert [job.name for job in jobs] == ['tests.urgent', 'tests.record']
+        assert queue.claim('other', 10) == []
+        assert Job.objects.filter(status=Job.QUEUED).count() == 1
+
+    @pytest.mark.django_db(transaction=True)
+    def test_worker_runs_jobs(self, queued):
+        for i in range(5):
+            record.enqueue(i)
+        counts = run_worker()
+        assert counts == {Job.DONE: 5}
+        assert sorted(calls) == list(range(5))
+        assert not Job.objects.exclude(status=Job.DONE).exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_retry_then_success(self, queued):
+        flaky.enqueue(2)
+        run_worker()
+        job = Job.objects.get()
+        assert job.status == Job.DONE
+        assert job.attempts == 3
+        assert calls == [2, 2, 2]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_fails_after_max_attempts(self, queued):
+        flaky.enqueue(10)
+        run_worker()
+        job = Job.objects.get()
+        assert job.status == Job.FAILED
+        assert job.attempts == 3
+        assert 'RuntimeError' in job.error
+
+    @pytest.mark.django_db
+    def test_requeue_stale(self, queued):
+        record.enqueue('x', key='stale')
+        Job.objects.update(status=Job.RUNNING,
+                           started=timezone.now() - timedelta(hours=1))
+        assert queue.requeue_stale() == 1
+        assert Job.objects.get().status == Job.QUEUED
+
+    @pytest.mark.django_db(transaction=True)
+    def test_stats_and_command(self, queued, capsys):
+        record.enqueue(1)
+        flaky.enqueue(10)
+        run_worker()
+        record.enqueue(2)
+        stats = queue.stats()
+        assert stats['tests.record'][Job.DONE] == 1
+        assert stats['tests.record'][Job.QUEUED] == 1
+        assert stats['tests.flaky'][Job.FAILED] == 1
+        assert stats['tests.flaky']['retried'] == 1
+
+        call_command('task_stats')
+        output = capsys.readouterr().out
+        assert 'tests.flaky' in output
+        call_command('run_worker', '--once', '--workers', '1')
+        assert 'done: 1' in capsys.readouterr().out
+
+
+class TestSideEffects:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_feed_and_search_deferred(self, queued, user_client, user):
+        queued.FOLLOW_FEED_MATERIALIZED = True
+        queued.POSTS_SEARCH = dict(queued.POSTS_SEARCH, backend='python')
+        author = get_user_model().objects.create_user(username='author_1')
+        user_client.get(f'/{author.username}/follow/')
+        post = Post.objects.create(text='Отложенная публикация', author=author)
+        assert not FeedEntry.objects.exists()
+        assert search.find('публикация')[0] == []
+
+        run_worker()
+        assert FeedEntry.objects.filter(user=user, post=post).exists()
+        assert search.find('публикация')[0] == [post]
+
+        user_client.get(f'/{author.username}/unfollow/')
+        post.delete()
+        run_worker()
+        assert not FeedEntry.objects.exists()
+        assert search.find('публикация')[0] == []
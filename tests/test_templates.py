@@ -0,0 +1,64 @@
+import pytest
+from django.core.cache import cache
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.test import Client, RequestFactory
+
+from posts.models import Post
+
+
+@pytest.fixture
+def production_templates(settings):
+    options = dict(settings.TEMPLATES[0]['OPTIONS'], debug=False, loaders=[
+        ('django.template.loaders.cached.Loader',
+         settings.TEMPLATE_LOADERS)])
+    settings.TEMPLATES = [dict(settings.TEMPLATES[0], OPTIONS=options)]
+    return settings
+
+
+class TestTemplates:
+
+    @pytest.mark.django_db
+    def test_post_items_matches_include(self, user, group):
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=user,
+                                group=group if i % 2 else None)
+        posts = list(Post.objects.select_related('author', 'group'))
+        request = RequestFactory().get('/')
+        request.user = user
+        engine = engines['django']
+        included = engine.from_string(
+            '{% for post in posts %}'
+            '{% include "post_item.html" with post=post %}'
+            '{% endfor %}').render({'posts': posts, 'user': user}, request)
+        flattened = engine.from_string(
+            '{% load post_tags %}{% post_items posts %}').render(
+                {'posts': posts, 'user': user}, request)
+        assert flattened == included
+        assert 'Редактировать' in flattened
+
+    def test_production_mode_caches_compiled(self, production_templates):
+        engine = engines['django']
+        loader = engine.engine.template_loaders[0]
+        assert isinstance(loader, CachedLoader)
+        first = engine.get_template('post_item.html').template
+        assert engine.get_template('post_item.html').template is first
+
+    @pytest.mark.django_db
+    def test_render_profile_header(self, settings, user, production_templates):
+        settings.INSTRUMENTATION = dict(settings.INSTRUMENTATION,
+                                        profile_templates=True)
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=user)
+        cache.clear()
+        response = Client().get('/')
+        timing = response['Server-Timing']
+        assert 'desc="index.html x1"' in timing
+        assert 'desc="post_item.html x3"' in timing
+        assert 'desc="paginator.html' not in timing
+
+    @pytest.mark.django_db
+    def test_no_header_by_default(self, settings, post):
+        settings.INSTRUMENTATION = dict(settings.INSTRUMENTATION,
+                                        profile_templates=False)
+        assert not Client().get('/').has_header('Server-Timing')
@@ -0,0 +1,72 @@
+import pytest
+from django.core.files import File
+from django.core.management import call_command
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+
+
+@pytest.fixture
+def thumbnail_settings(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.POSTS_THUMBNAILS = dict(settings.POSTS_THUMBNAILS,
+                                     executor='sync',
+                                     formats=['JPEG', 'PNG'])
+    return settings
+
+
+def stored_thumbnails(name):
+    return default.kvstore._get(ImageFile(name).key,
+                                identity='thumbnails') or []
+
+
+class TestThumbnails:
+
+    @pytest.mark.django_db(transaction=True)
+    def test_new_post_generates_thumbnails(self, user_client,
+                                           thumbnail_settings):
+        with open('posts/image.jpeg', 'rb') as img:
+            user_client.post('/new/', {'text': 'С картинкой', 'image': img})
+        post = Post.objects.get(text='С картинкой')
+        assert post.image
+        assert len(stored_thumbnails(post.image.name)) == 2
+
+    @pytest.mark.django_db(transaction=True)
+    def test_backfill_command(self, user, thumbnail_settings, capsys):
+        with open('posts/image.jpeg', 'rb') as img:
+            post = Post(text='Старый пост', author=user)
+            post.image.save('old.jpeg', File(img))
+        assert not stored_thumbnails(post.image.name)
+
+        call_command('generate_thumbnails', '--executor', 'thread',
+                     '--workers', '2')
+        assert len(stored_thumbnails(post.image.name)) == 2
+        assert 'Создано миниатюр: 2' in capsys.readouterr().out
+
+    @pytest.mark.django_db(transaction=True)
+    def test_batch_url_resolution(self, user, client, thumbnail_settings,
+                                  django_assert_max_num_queries):
+        posts = []
+        for i in range(3):
+            with open('posts/image.jpeg', 'rb') as img:
+                post = Post(text=f'Пост {i}', author=user)
+                post.image.save(f'batch_{i}.jpeg', File(img))
+            thumbnails.generate(post.image.name)
+            posts.append(post)
+        posts.append(Post.objects.create(text='Без картинки', author=user))
+
+        default.kvstore.cache.clear()
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in posts]))
+        with django_assert_max_num_queries(1):
+            thumbnails.attach_urls(posts)
+        assert sum(bool(p.thumbnail_url) for p in posts) == 3
+        with django_assert_max_num_queries(0):
+            thumbnails.attach_urls(posts)
+
+        response = client.get('/')
+        page_posts = response.context['page'].object_list
+        with_image = [p for p in page_posts if p.image]
+        assert all(p.thumbnail_url for p in with_image)
+        assert with_image[0].thumbnail_url in response.content.decode()
@@ -0,0 +1,282 @@
+"""
+ASGI-точка входа (uvicorn yatube.asgi:application).
+
+Django 2.2 не умеет ASGI и async-представления, поэтому здесь небольшой
+адаптер ASGI 3 поверх обычного обработчика: тело запроса читается и
+ответ отдается клиенту в цикле событий, а код Django (middleware,
+представления, ORM, шаблоны) выполняется в ограниченных пулах потоков.
+Поток занят только на время рендера, а медленный клиент держит лишь
+корутину.
+
+Read-only ленты (index, group, profile, post) получают свой пул, чтобы
+долгие записи и загрузки картинок не отнимали у них потоки. Потоковый
+ответ (NDJSON API, выгрузки) читается и закрывается одним потоком пула:
+курсор и соединение с БД принадлежат потоку, который их открыл. Поток
+кладет части в очередь на несколько частей вперед и ждет, пока клиент
+их заберет. Поток событий /events/stream/ (EventStreamResponse)
+отдается из цикла событий и не держит поток, пока клиент подключен.
+"""
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+django.setup(set_prefix=False)
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.urls import Resolver404, resolve  # noqa: E402
+
+from posts.events import EventStreamResponse  # noqa: E402
+
+
+DEFAULTS = {
+    # Имена URL, которые выполняются в пуле чтения (только GET/HEAD).
+    'read_views': ['index', 'group', 'profile', 'post'],
+    'read_workers': 8,
+    # Пул для остальных запросов.
+    'workers': 4,
+    # Размер частей, которыми ответ отдается клиенту.
+    'chunk_size': 64 * 1024,
+    # Сколько частей потокового ответа читается впрок.
+    'stream_buffer': 4,
+    # Тело запроса больше этого размера читается во временный файл.
+    'body_memory': 1024 * 1024,
+}
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'ASGI', {}))
+    return options
+
+
+def app_path(scope):
+    """Путь запроса внутри приложения, без префикса root_path."""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    return path
+
+
+def build_environ(scope, body):
+    """WSGI environ из ASGI scope и файла с телом запроса."""
+    root_path = scope.get('root_path', '')
+    path = app_path(scope)
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        # WSGI передает путь байтами в latin-1.
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+
+    def __init__(self, read_workers=None, workers=None):
+        self.options = config()
+        self.handler = WSGIHandler()
+        self.read_pool = ThreadPoolExecutor(
+            read_workers or self.options['read_workers'],
+            thread_name_prefix='asgi-read')
+        self.pool = ThreadPoolExecutor(
+            workers or self.options['workers'], thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        pool = self.pool_for(scope)
+        loop = asyncio.get_running_loop()
+        status, headers, content, stream = await loop.run_in_executor(
+            pool, self.respond, build_environ(scope, body))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': headers})
+        if (isinstance(stream, EventStreamResponse)
+                and scope['method'] != 'HEAD'):
+            try:
+                await self.send_events(send, receive, stream.event_stream)
+            finally:
+                await loop.run_in_executor(pool, stream.close)
+            return
+        if scope['method'] == 'HEAD':
+            content = b''
+            if stream is not None:
+                await loop.run_in_executor(pool, stream.close)
+                stream = None
+        if stream is None:
+            await self.send_content(send, content)
+        else:
+            await self.send_stream(send, stream, pool)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса; None, если клиент отключился раньше."""
+        body = SpooledTemporaryFile(max_size=self.options['body_memory'])
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def pool_for(self, scope):
+        if scope['method'] in READ_METHODS:
+            try:
+                match = resolve(app_path(scope))
+            except Resolver404:
+                return self.pool
+            if match.url_name in self.options['read_views']:
+                return self.read_pool
+        return self.pool
+
+    def respond(self, environ):
+        """
+        Выполняется в пуле: прогоняет запрос через Django. Обычный ответ
+        собирается и закрывается здесь же, чтобы соединение с БД вернулось
+        потоку до того, как клиент начнет читать.
+        """
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started.append((int(status.split()[0]), [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers]))
+
+        try:
+            response = self.handler(environ, start_response)
+        finally:
+            environ['wsgi.input'].close()
+        status, headers = started[0]
+        if getattr(response, 'streaming', False):
+            return status, headers, None, response
+        try:
+            content = b''.join(response)
+        finally:
+            response.close()
+        return status, headers, content, None
+
+    async def send_content(self, send, content):
+        size = self.options['chunk_size']
+        chunks = [content[start:start + size]
+                  for start in range(0, len(content), size)] or [b'']
+        for chunk in chunks[:-1]:
+            await send({'type': 'http.response.body', 'body': chunk,
+                        'more_body': True})
+        await send({'type': 'http.response.body', 'body': chunks[-1]})
+
+    async def send_stream(self, send, stream, pool):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        room = threading.Semaphore(self.options['stream_buffer'])
+        stop = threading.Event()
+        drained = loop.run_in_executor(pool, self.drain, stream, chunks,
+                                       loop, room, stop)
+        try:
+            while True:
+                chunk = await chunks.get()
+                room.release()
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            # Ошибка чтения ответа не должна выглядеть как его конец.
+            await drained
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            stop.set()
+            room.release()
+            await drained
+
+    def drain(self, stream, chunks, loop, room, stop):
+        """
+        Выполняется в пуле: читает потоковый ответ и закрывает его в
+        одном потоке, передавая части в очередь chunks.
+        """
+        try:
+            for chunk in stream:
+                room.acquire()
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+        finally:
+            try:
+                stream.close()
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    async def send_events(self, send, receive, chunks):
+        """Отдает асинхронный поток, пока клиент не отключится."""
+
+        async def disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(disconnect())
+        chunks = chunks.__aiter__()
+        try:
+            async for chunk in chunks:
+                if disconnected.done():
+                    return
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await chunks.aclose()
+
+    def close(self):
+        self.read_pool.shutdown()
+        self.pool.shutdown()
+
+
+application = ASGIHandler()
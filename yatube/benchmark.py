@@ -0,0 +1,251 @@
+"""
+Нагрузочный прогон URL через WSGI- или ASGI-приложение проекта с отчетом
+по задержкам (p50/p95/p99), числу SQL-запросов и пропускной способности.
+
+client_delay имитирует медленного клиента: столько секунд он получает
+ответ. В WSGI все это время занят поток сервера, в ASGI - только корутина.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from importlib import import_module
+from io import BytesIO
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.db import connection, connections
+
+
+def percentile(values, q):
+    """Квантиль q (0..1) по ближайшему рангу."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_environ(url, cookies=None):
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'wsgi.input': BytesIO(),
+    }
+    if cookies:
+        environ['HTTP_COOKIE'] = '; '.join(
+            f'{name}={value}' for name, value in cookies.items())
+    setup_testing_defaults(environ)
+    return environ
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def make_scope(url, cookies=None):
+    parts = urlsplit(url)
+    headers = []
+    if cookies:
+        headers.append((b'cookie', '; '.join(
+            f'{name}={value}' for name, value in cookies.items()).encode()))
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': parts.path,
+        'query_string': parts.query.encode(),
+        'headers': headers,
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+def request(application, url, cookies=None, client_delay=0):
+    """Выполняет один запрос; возвращает (статус, секунды, SQL-запросы)."""
+    status = []
+
+    def start_response(code, headers, exc_info=None):
+        status.append(int(code.split()[0]))
+
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        body = application(make_environ(url, cookies), start_response)
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    # Поток сервера отдает ответ медленному клиенту.
+    time.sleep(client_delay)
+    return status[0], time.perf_counter() - start, counter.count
+
+
+async def request_asgi(application, url, cookies=None, client_delay=0):
+    """
+    Один запрос к ASGI-приложению; возвращает (статус, секунды, None):
+    SQL выполняется в потоках приложения и здесь не считается.
+    """
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            await asyncio.sleep(client_delay)
+
+    start = time.perf_counter()
+    await application(make_scope(url, cookies), receive, send)
+    return status[0], time.perf_counter() - start, None
+
+
+def run_asgi(application, plan, concurrency=1, client_delay=0):
+    """Как run(), но concurrency клиентов - корутины одного цикла событий."""
+    samples = defaultdict(list)
+    queue = iter(plan)
+
+    async def client():
+        for kind, url, cookies in queue:
+            samples[kind].append(await request_asgi(
+                application, url, cookies, client_delay))
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(main())
+    return samples, elapsed
+
+
+def run(application, plan, concurrency=1, client_delay=0):
+    """
+    plan - список (вид, url, cookies). Возвращает сэмплы по видам и общее
+    время прогона.
+    """
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    queue = iter(plan)
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    item = next(queue, None)
+                if item is None:
+                    return
+                kind, url, cookies = item
+                code, seconds, queries = request(application, url, cookies,
+                                                 client_delay)
+                with lock:
+                    samples[kind].append((code, seconds, queries))
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    report = {'views': {}, 'elapsed': elapsed}
+    total = 0
+    for kind, rows in sorted(samples.items()):
+        latencies = [seconds * 1000 for _, seconds, _ in rows]
+        report['views'][kind] = {
+            'requests': len(rows),
+            'errors': sum(1 for code, _, _ in rows if code >= 500),
+            'p50_ms': percentile(latencies, .5),
+            'p95_ms': percentile(latencies, .95),
+            'p99_ms': percentile(latencies, .99),
+            'queries': (sum(q for _, _, q in rows) / len(rows)
+                        if rows[0][2] is not None else None),
+        }
+        total += len(rows)
+    report['requests'] = total
+    report['throughput'] = total / elapsed if elapsed else 0.0
+    return report
+
+
+def format_report(report):
+    lines = [f'{"view":<16}{"n":>7}{"err":>5}{"p50 ms":>9}{"p95 ms":>9}'
+             f'{"p99 ms":>9}{"queries":>9}']
+    for kind, row in report['views'].items():
+        queries = ('-' if row['queries'] is None
+                   else f'{row["queries"]:.1f}')
+        lines.append(
+            f'{kind:<16}{row["requests"]:>7}{row["errors"]:>5}'
+            f'{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}'
+            f'{row["p99_ms"]:>9.1f}{queries:>9}')
+    lines.append(f'Всего {report["requests"]} запросов за '
+                 f'{report["elapsed"]:.2f} с: '
+                 f'{report["throughput"]:.1f} запр./с')
+    return '\n'.join(lines)
+
+
+def save_baseline(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Список регрессий относительно базового прогона: рост p95 больше чем
+    на tolerance, рост числа запросов или падение пропускной способности.
+    """
+    regressions = []
+    for kind, row in report['views'].items():
+        base = baseline['views'].get(kind)
+        if base is None:
+            continue
+        if row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{kind}: p95 {base["p95_ms"]:.1f} -> {row["p95_ms"]:.1f} ms')
+        if (row['queries'] is not None and base['queries'] is not None
+                and row['queries'] > base['queries']):
+            regressions.append(
+                f'{kind}: запросов {base["queries"]:.1f} -> '
+                f'{row["queries"]:.1f}')
+    if report['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(
+            f'пропускная способность {baseline["throughput"]:.1f} -> '
+            f'{report["throughput"]:.1f} запр./с')
+    return regressions
+
+
+def session_cookies(user):
+    """Cookie авторизованной сессии пользователя для прогона."""
+    from django.contrib.auth import (SESSION_KEY, BACKEND_SESSION_KEY,
+                                     HASH_SESSION_KEY)
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return {settings.SESSION_COOKIE_NAME: session.session_key}
@@ -0,0 +1,174 @@
+"""
+Двухуровневый кэш и защита от "лавины" пересчетов.
+
+TwoTierCache держит небольшой кэш процесса (L1) перед общим для всех
+воркеров кэшем (L2, например файловым). Изменяемые ключи (версии из
+posts.caching) читаются только из L2, поэтому инвалидация остается
+точной; неизменяемые ключи с версией внутри безопасно живут в L1.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """
+    LOCATION - алиас общего кэша L2. OPTIONS: L1_TIMEOUT (сек.),
+    L1_MAX_ENTRIES и BYPASS_PREFIXES - префиксы ключей, минующих L1.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        self._l1_timeout = options.pop('L1_TIMEOUT', 5)
+        max_entries = options.pop('L1_MAX_ENTRIES', 1000)
+        self.bypass_prefixes = tuple(options.pop('BYPASS_PREFIXES',
+                                                 ('ver:', 'mod:')))
+        params = dict(params, OPTIONS=options)
+        super().__init__(params)
+        self._l2_alias = location
+        self._l1 = LocMemCache(f'two-tier-{location}', {
+            'TIMEOUT': self._l1_timeout,
+            'OPTIONS': {'MAX_ENTRIES': max_entries},
+        })
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _local(self, key):
+        return not key.startswith(self.bypass_prefixes)
+
+    def _l1_set(self, key, value, timeout, version):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            timeout = self._l1_timeout
+        self._l1.set(key, value, min(timeout, self._l1_timeout),
+                     version=version)
+
+    def get(self, key, default=None, version=None):
+        if self._local(key):
+            value = self._l1.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                return value
+        value = self.l2.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default
+        if self._local(key):
+            self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        for key in keys:
+            if self._local(key):
+                value = self._l1.get(key, _MISSING, version=version)
+                if value is not _MISSING:
+                    found[key] = value
+        rest = [key for key in keys if key not in found]
+        if rest:
+            fetched = self.l2.get_many(rest, version=version)
+            for key, value in fetched.items():
+                if self._local(key):
+                    self._l1_set(key, value, DEFAULT_TIMEOUT, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        if self._local(key):
+            self._l1_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if self._local(key):
+                self._l1_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added and self._local(key):
+            self._l1_set(key, value, timeout, version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._l1.delete(key, version=version)
+        return self.l2.incr(key, delta, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        return (self._local(key) and self._l1.has_key(key, version=version)
+                or self.l2.has_key(key, version=version))
+
+    def delete(self, key, version=None):
+        self._l1.delete(key, version=version)
+        self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._l1.delete_many(keys, version=version)
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        self._l1.clear()
+        self.l2.clear()
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _flight_lock(key):
+    with _flights_lock:
+        return _flights.setdefault(key, threading.Lock())
+
+
+def single_flight(cache, key, compute, lock_timeout=10, poll=0.05):
+    """
+    Возвращает значение ключа, вычисляя его не более одного раза
+    одновременно.
+
+    compute() возвращает (value, timeout); при timeout=None значение не
+    кэшируется. Потоки процесса ждут на локальной блокировке, другие
+    процессы - на ключе-блокировке в кэше (cache.add), а по истечении
+    lock_timeout вычисляют значение сами, не трогая чужую блокировку.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+    with _flight_lock(key):
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        lock_key = f'lock:{key}'
+        # Блокировку снимает только ее владелец: после lock_timeout ее мог
+        # взять другой воркер.
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + lock_timeout
+        while not cache.add(lock_key, token, lock_timeout):
+            time.sleep(poll)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if time.monotonic() > deadline:
+                token = None
+                break
+        try:
+            value, timeout = compute()
+            if timeout is not None:
+                cache.set(key, value, timeout)
+            return value
+        finally:
+            if token is not None and cache.get(lock_key) == token:
+                cache.delete(lock_key)
+            with _flights_lock:
+                _flights.pop(key, None)
@@ -1,5 +1,7 @@
 import datetime as dt
 
+from posts import events
+
 
 def year(request):
     """
@@ -8,3 +10,12 @@ def year(request):
     return {
         'year': dt.datetime.now().year
     }
+
+
+def post_events(request):
+    """
+    Включен ли поток "N новых постов" (posts.events).
+    """
+    return {
+        'post_events': events.config()['enabled']
+    }
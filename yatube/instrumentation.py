@@ -0,0 +1,502 @@
+"""
+Инструментирование запросов: число SQL-запросов, время SQL, время рендеринга
+шаблонов и попадания в кэш по имени URL. Данные собираются в гистограммы
+внутри процесса и отдаются текстом (/admin/metrics/) или командой
+metrics_dump.
+
+С profile_templates каждый ответ получает заголовок Server-Timing со
+временем (включая вложенные) и числом рендеров каждого шаблона и include.
+
+Глобально ничего не подменяется: SQL считается через
+connection.execute_wrapper, время шаблонов - бэкендом DjangoTemplates
+этого модуля (сигнал template_rendered Django отправляет только под
+тестовым раннером), кэш оборачивается на время запроса. Только рендер
+include при profile_templates требует подмены Template.render; она
+ставится на время профилируемых запросов и затем снимается.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import (
+    DjangoTemplates as BaseDjangoTemplates, Template as BackendTemplate)
+from django.template.base import Template as BaseTemplate
+from django.urls import resolve, Resolver404
+
+
+logger = logging.getLogger('yatube.instrumentation')
+
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+DEFAULTS = {
+    'enabled': False,
+    # Бюджеты по имени URL; 'default' применяется к остальным.
+    'budgets': {},
+    # Каталог для снимков метрик, которые читает metrics_dump.
+    'snapshot_dir': None,
+    'snapshot_every': 100,
+    # Время по шаблонам и include в заголовке Server-Timing ответа.
+    'profile_templates': False,
+}
+
+_local = threading.local()
+_MISSING = object()
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'INSTRUMENTATION', {}))
+    return options
+
+
+def current():
+    """Статистика текущего запроса или None вне middleware."""
+    return getattr(_local, 'stats', None)
+
+
+def record_template(name, count, seconds):
+    """Учитывает count рендеров шаблона name за seconds секунд."""
+    stats = current()
+    if stats is not None and stats.templates is not None:
+        entry = stats.templates.setdefault(name, [0, 0.0])
+        entry[0] += count
+        entry[1] += seconds
+
+
+def record_cache(hit, count=1):
+    """Учитывает попадание/промах кэша в статистике текущего запроса."""
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += count if hit else 0
+        stats.cache_misses += 0 if hit else count
+
+
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Нормализует SQL, чтобы одинаковые запросы с разными параметрами
+    совпадали."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.fingerprints = Counter()
+        # {имя шаблона: [рендеров, секунд]}, если включено профилирование.
+        self.templates = None
+        self._render_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return [(sql, n) for sql, n in self.fingerprints.most_common()
+                if n > 1]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, data):
+        self.counts = [a + b for a, b in zip(self.counts, data['counts'])]
+        self.sum += data['sum']
+        self.count += data['count']
+
+    def percentile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q."""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return (self.buckets[i] if i < len(self.buckets)
+                        else float('inf'))
+        return float('inf')
+
+    def as_dict(self):
+        return {'counts': self.counts, 'sum': self.sum, 'count': self.count}
+
+
+class ViewMetrics:
+    FIELDS = (
+        ('duration_ms', MS_BUCKETS),
+        ('sql_ms', MS_BUCKETS),
+        ('template_ms', MS_BUCKETS),
+        ('queries', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets)
+                           for name, buckets in self.FIELDS}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.over_budget = 0
+
+    def merge(self, data):
+        for name, histogram in self.histograms.items():
+            histogram.merge(data['histograms'][name])
+        self.cache_hits += data['cache_hits']
+        self.cache_misses += data['cache_misses']
+        self.over_budget += data['over_budget']
+
+    def as_dict(self):
+        return {
+            'histograms': {name: h.as_dict()
+                           for name, h in self.histograms.items()},
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'over_budget': self.over_budget,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.requests = 0
+
+    def record(self, view, values, stats, over_budget):
+        with self.lock:
+            metrics = self.views.setdefault(view, ViewMetrics())
+            for name, value in values.items():
+                metrics.histograms[name].observe(value)
+            metrics.cache_hits += stats.cache_hits
+            metrics.cache_misses += stats.cache_misses
+            metrics.over_budget += int(over_budget)
+            self.requests += 1
+            return self.requests
+
+    def snapshot(self):
+        with self.lock:
+            return {view: m.as_dict() for view, m in self.views.items()}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.requests = 0
+
+
+registry = Registry()
+
+
+def merge_snapshots(snapshots):
+    views = {}
+    for snapshot in snapshots:
+        for view, data in snapshot.items():
+            views.setdefault(view, ViewMetrics()).merge(data)
+    return views
+
+
+def load_snapshots(directory):
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        with open(path) as f:
+            snapshots.append(json.load(f))
+    return snapshots
+
+
+def write_snapshot(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp, path)
+
+
+def render_prometheus(views):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+    for name, buckets in ViewMetrics.FIELDS:
+        metric = f'yatube_request_{name}'
+        lines.append(f'# TYPE {metric} histogram')
+        for view, metrics in sorted(views.items()):
+            histogram = metrics.histograms[name]
+            cumulative = 0
+            bounds = [str(b) for b in buckets] + ['+Inf']
+            for bound, n in zip(bounds, histogram.counts):
+                cumulative += n
+                lines.append(
+                    f'{metric}_bucket{{view="{view}",le="{bound}"}} '
+                    f'{cumulative}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {histogram.sum}')
+            lines.append(f'{metric}_count{{view="{view}"}} '
+                         f'{histogram.count}')
+    for counter in ('cache_hits', 'cache_misses', 'over_budget'):
+        metric = f'yatube_{counter}_total'
+        lines.append(f'# TYPE {metric} counter')
+        for view, metrics in sorted(views.items()):
+            lines.append(f'{metric}{{view="{view}"}} '
+                         f'{getattr(metrics, counter)}')
+    return '\n'.join(lines) + '\n'
+
+
+def render_summary(views):
+    """Таблица p50/p95/p99 по представлениям для людей."""
+    header = (f'{"view":<20}{"n":>8}{"p50 ms":>9}{"p95 ms":>9}'
+              f'{"p99 ms":>9}{"q p95":>7}{"sql p95":>9}{"tpl p95":>9}'
+              f'{"hit %":>7}{"over":>6}')
+    lines = [header]
+    for view, metrics in sorted(views.items()):
+        duration = metrics.histograms['duration_ms']
+        lookups = metrics.cache_hits + metrics.cache_misses
+        hit_ratio = 100 * metrics.cache_hits / lookups if lookups else 0
+        lines.append(
+            f'{view:<20}{duration.count:>8}'
+            f'{duration.percentile(.5):>9}{duration.percentile(.95):>9}'
+            f'{duration.percentile(.99):>9}'
+            f'{metrics.histograms["queries"].percentile(.95):>7}'
+            f'{metrics.histograms["sql_ms"].percentile(.95):>9}'
+            f'{metrics.histograms["template_ms"].percentile(.95):>9}'
+            f'{hit_ratio:>7.1f}{metrics.over_budget:>6}')
+    return '\n'.join(lines) + '\n'
+
+
+class Template(BackendTemplate):
+    """Шаблон бэкенда, учитывающий время рендера в статистике запроса."""
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return super().render(context, request)
+        stats._render_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._render_depth -= 1
+            if not stats._render_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """Бэкенд DjangoTemplates с Template этого модуля."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(
+            super().get_template(template_name).template, self)
+
+
+_profiling = 0
+_profiling_lock = threading.Lock()
+_original_render = BaseTemplate.render
+
+
+def _profiled_render(self, context):
+    stats = current()
+    if stats is None or stats.templates is None:
+        return _original_render(self, context)
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        record_template(self.name or '<string>', 1,
+                        time.perf_counter() - start)
+
+
+class profiling:
+    """
+    Подменяет рендер любого шаблона, включая {% include %}, пока идет
+    хотя бы один профилируемый запрос, и возвращает исходный после.
+    """
+
+    def __enter__(self):
+        global _profiling
+        with _profiling_lock:
+            if not _profiling:
+                BaseTemplate.render = _profiled_render
+            _profiling += 1
+
+    def __exit__(self, *exc_info):
+        global _profiling
+        with _profiling_lock:
+            _profiling -= 1
+            if not _profiling:
+                BaseTemplate.render = _original_render
+
+
+def server_timing(templates):
+    """Значение заголовка Server-Timing по шаблонам, самые долгие первыми."""
+    entries = sorted(templates.items(), key=lambda item: -item[1][1])
+    return ', '.join(
+        f'tpl{number};desc="{name} x{count}";dur={seconds * 1000:.2f}'
+        for number, (name, (count, seconds)) in enumerate(entries))
+
+
+# Служебные ключи, которые не считаются попаданиями: блокировки
+# single_flight и метка записи yatube.replicas. К ним добавляются
+# bypass_prefixes двухуровневого кэша (версии страниц и время изменения).
+BOOKKEEPING_PREFIXES = ('lock:', 'replicas:')
+
+
+class counting_cache:
+    """
+    Оборачивает get/get_many экземпляра кэша на время запроса, считая
+    попадания. Экземпляры кэша у каждого потока свои. Считается только
+    кэш, из которого читают представления: у двухуровневого кэша он сам
+    обращается к L2, и обертка общего кэша посчитала бы промах L1 дважды.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.skip = BOOKKEEPING_PREFIXES + tuple(
+            getattr(cache, 'bypass_prefixes', ('ver:', 'mod:')))
+
+    def __enter__(self):
+        cache = self.cache
+        get, get_many = cache.get, cache.get_many
+        skip = self.skip
+        # BaseCache.get_many вызывает get: такие get уже учтены в get_many.
+        nested = []
+
+        def counting_get(key, default=None, version=None):
+            value = get(key, _MISSING, version=version)
+            if not nested and not key.startswith(skip):
+                record_cache(value is not _MISSING)
+            return default if value is _MISSING else value
+
+        def counting_get_many(keys, version=None):
+            keys = list(keys)
+            nested.append(True)
+            try:
+                found = get_many(keys, version=version)
+            finally:
+                nested.pop()
+            counted = [key for key in keys if not key.startswith(skip)]
+            hits = sum(1 for key in counted if key in found)
+            record_cache(True, hits)
+            record_cache(False, len(counted) - hits)
+            return found
+
+        cache.get = counting_get
+        cache.get_many = counting_get_many
+
+    def __exit__(self, *exc_info):
+        del self.cache.get
+        del self.cache.get_many
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unresolved'
+    return match.url_name or match.view_name or 'unnamed'
+
+
+def _budget(options, view):
+    budgets = options['budgets']
+    return budgets.get(view, budgets.get('default', {}))
+
+
+class QueryBudgetMiddleware:
+    """Собирает статистику запроса и проверяет бюджеты представлений."""
+
+    def __init__(self, get_response):
+        self.options = config()
+        if not self.options['enabled']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        if self.options['profile_templates']:
+            stats.templates = {}
+        _local.stats = stats
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                stack.enter_context(
+                    counting_cache(caches[DEFAULT_CACHE_ALIAS]))
+                if stats.templates is not None:
+                    stack.enter_context(profiling())
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        duration = time.perf_counter() - start
+        self.report(request, stats, duration)
+        if stats.templates:
+            response['Server-Timing'] = server_timing(stats.templates)
+            logger.info('Templates of %s: %s', request.path,
+                        response['Server-Timing'])
+        return response
+
+    def report(self, request, stats, duration):
+        view = _view_name(request)
+        values = {
+            'duration_ms': duration * 1000,
+            'sql_ms': stats.sql_time * 1000,
+            'template_ms': stats.template_time * 1000,
+            'queries': stats.queries,
+        }
+        budget = _budget(self.options, view)
+        exceeded = {name: values[name] for name, limit in budget.items()
+                    if name in values and values[name] > limit}
+        if exceeded:
+            logger.warning(
+                'View %s over budget %s: %s; duplicate queries: %s',
+                view, budget, exceeded, stats.duplicates()[:5])
+        total = registry.record(view, values, stats, bool(exceeded))
+        directory = self.options['snapshot_dir']
+        if directory and total % self.options['snapshot_every'] == 0:
+            write_snapshot(directory)
+
+
+@staff_member_required
+def metrics(request):
+    return HttpResponse(render_prometheus(merge_snapshots(
+        [registry.snapshot()])), content_type='text/plain; version=0.0.4')
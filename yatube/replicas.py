@@ -0,0 +1,190 @@
+"""
+Чтение с реплик и запись в основную БД.
+
+ReplicaRouter отправляет чтения на реплики только внутри запросов, которые
+ReplicaMiddleware пометил как безопасные: GET/HEAD без отметки о недавней
+записи. После запроса с записью клиент получает cookie и на время
+pin_seconds читает из основной БД, чтобы видеть свои изменения. Вне
+запросов (команды, фоновые задачи) все идет в основную БД.
+
+Cookie закрепляет только писавшего клиента, а кэш страниц, счетчиков,
+лент и объектов общий: после сброса его заполнил бы любой читатель, и
+данные отстающей реплики жили бы в кэше весь срок. Поэтому любая запись
+(note_write) на pin_seconds отправляет чтения внутри filling() - те, что
+заполняют общий кэш, - в основную БД для всех клиентов.
+
+Для локального запуска реплики - копии файла SQLite, которые обновляет
+команда sync_replicas (см. copy_database).
+"""
+import itertools
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+
+DEFAULTS = {
+    # Алиасы из DATABASES, с которых можно читать.
+    'aliases': [],
+    # Сколько секунд после записи клиент читает из основной БД.
+    'pin_seconds': 5,
+    'cookie': 'pin_primary',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Ключ общего кэша: живет pin_seconds после последней записи.
+WRITTEN_KEY = 'replicas:written'
+
+_local = threading.local()
+_cycles = {}
+
+
+def config():
+    options = dict(DEFAULTS)
+    options.update(getattr(settings, 'REPLICAS', {}))
+    return options
+
+
+def _replica():
+    aliases = tuple(config()['aliases'])
+    if aliases not in _cycles:
+        _cycles[aliases] = itertools.cycle(aliases)
+    return next(_cycles[aliases])
+
+
+@contextmanager
+def reading():
+    """Разрешает чтение с реплик в блоке (так работает middleware)."""
+    previous = getattr(_local, 'replica_ok', False)
+    _local.replica_ok = True
+    try:
+        yield
+    finally:
+        _local.replica_ok = previous
+
+
+@contextmanager
+def use_primary():
+    """Принудительно читает из основной БД в блоке."""
+    previous = getattr(_local, 'replica_ok', False)
+    _local.replica_ok = False
+    try:
+        yield
+    finally:
+        _local.replica_ok = previous
+
+
+def note_write():
+    """Отмечает запись для всех процессов: см. filling()."""
+    options = config()
+    if options['aliases']:
+        cache.set(WRITTEN_KEY, 1, options['pin_seconds'])
+
+
+@contextmanager
+def filling():
+    """
+    Чтения для заполнения общего кэша: в течение pin_seconds после любой
+    записи - из основной БД, иначе по обычным правилам.
+    """
+    if (getattr(_local, 'replica_ok', False)
+            and cache.get(WRITTEN_KEY) is not None):
+        with use_primary():
+            yield
+    else:
+        yield
+
+
+def wrote():
+    """Была ли запись в текущем запросе."""
+    return getattr(_local, 'wrote', False)
+
+
+def mark_written():
+    """Отмечает запись, сделанную за запрос другим потоком."""
+    _local.wrote = True
+    _local.replica_ok = False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'replica_ok', False) and config()['aliases']:
+            return _replica()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        # Дальнейшие чтения запроса должны видеть собственную запись.
+        _local.replica_ok = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *config()['aliases']}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит вместе с данными основной БД.
+        if db in config()['aliases']:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик и закрепляет писавших за основной БД."""
+
+    def __init__(self, get_response):
+        self.options = config()
+        if not self.options['aliases']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = self.options['cookie']
+        pinned = (request.method not in SAFE_METHODS
+                  or cookie in request.COOKIES)
+        _local.wrote = False
+        with use_primary() if pinned else reading():
+            response = self.get_response(request)
+        if wrote():
+            response.set_cookie(cookie, '1',
+                                max_age=self.options['pin_seconds'],
+                                httponly=True)
+        _local.wrote = False
+        return response
+
+
+def copy_database(source, target):
+    """
+    Согласованная копия файла SQLite через backup API: читатели реплики
+    видят либо старый, либо новый снимок целиком.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        with dst:
+            src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def sync():
+    """Копирует основную SQLite БД во все реплики; возвращает их алиасы."""
+    databases = settings.DATABASES
+    primary = databases[DEFAULT_DB_ALIAS]
+    synced = []
+    for alias in config()['aliases']:
+        replica = databases[alias]
+        if not (primary['ENGINE'].endswith('sqlite3')
+                and replica['ENGINE'].endswith('sqlite3')):
+            continue
+        copy_database(primary['NAME'], replica['NAME'])
+        synced.append(alias)
+    return synced
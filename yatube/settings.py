@@ -27,6 +27,7 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     'users',
     'posts',
+    'tasks',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -39,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.instrumentation.QueryBudgetMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,36 +55,117 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
+# Режим шаблонов: 'debug' перечитывает файлы на каждый рендер,
+# 'production' держит скомпилированные шаблоны в cached.Loader.
+TEMPLATE_MODE = os.environ.get('YATUBE_TEMPLATE_MODE', 'debug')
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_MODE == 'production':
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, учитывающий время рендера в метриках запроса.
+        'BACKEND': 'yatube.instrumentation.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
+            'debug': DEBUG and TEMPLATE_MODE != 'production',
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'yatube.context_processors.year',
+                'yatube.context_processors.post_events',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+ASGI_APPLICATION = 'yatube.asgi.application'
+
+# ASGI-адаптер (yatube.asgi): read-only ленты выполняются в отдельном пуле.
+ASGI = {
+    'read_views': ['index', 'group', 'profile', 'post'],
+    'read_workers': 8,
+    'workers': 4,
+    'chunk_size': 64 * 1024,
+}
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль БД: 'default' или 'production' - WAL, mmap, ожидание
+# блокировки вместо ошибки и постоянные соединения.
+DATABASE_PROFILE = os.environ.get('YATUBE_DB_PROFILE', 'default')
+
+# PRAGMA для каждого соединения (бэкенд yatube.sqlite3).
+SQLITE_PRAGMAS = {
+    # Читатели не ждут писателя, а писатель - читателей.
+    'journal_mode': 'WAL',
+    # В WAL коммит без fsync; fsync - при checkpoint.
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Кэш страниц в КиБ (отрицательное значение).
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
 
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # Сколько секунд ждать блокировку записи (busy timeout).
+            'timeout': 5,
+            'pragmas': SQLITE_PRAGMAS,
+        },
+    })
+
+# Объединение частых записей в общие транзакции (yatube.writes). На WAL
+# benchmark_db показывает его медленнее отдельных транзакций, поэтому
+# оно включается явно: YATUBE_WRITE_COALESCING=1.
+WRITE_COALESCING = {
+    'enabled': os.environ.get('YATUBE_WRITE_COALESCING') == '1',
+    'max_batch': 100,
+    'max_delay': 0.005,
+    'timeout': 10,
+}
+
+# Реплики для чтения (yatube.replicas). Локально YATUBE_REPLICAS=N
+# добавляет N копий SQLite, которые обновляет команда sync_replicas.
+REPLICA_COUNT = int(os.environ.get('YATUBE_REPLICAS', 0))
+for number in range(1, REPLICA_COUNT + 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.replica{number}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+
+REPLICAS = {
+    'aliases': [f'replica{number}' for number in range(1, REPLICA_COUNT + 1)],
+    # Сколько секунд после записи клиент читает из основной БД.
+    'pin_seconds': 5,
+    'cookie': 'pin_primary',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -142,8 +226,166 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # Идентификатор текущего сайта
 SITE_ID = 1
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Режим кэша: 'local' - кэш процесса, 'shared' - общий файловый кэш для всех
+# воркеров, 'two-tier' - небольшой кэш процесса перед общим.
+CACHE_MODE = os.environ.get('YATUBE_CACHE_MODE', 'local')
+
+SHARED_CACHE = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    'TIMEOUT': 300,
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
+
+if CACHE_MODE == 'shared':
+    CACHES = {'default': SHARED_CACHE}
+elif CACHE_MODE == 'two-tier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_TIMEOUT': 5,
+                'L1_MAX_ENTRIES': 1000,
+                # Ключи версий и времени изменения изменяемы и читаются
+                # только из общего кэша.
+                'BYPASS_PREFIXES': ['ver:', 'mod:'],
+            },
+        },
+        'shared': SHARED_CACHE,
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
\ No newline at end of file
+
+# Кэш объектов (posts.objects): пользователи, посты и группы по ключу.
+POSTS_OBJECT_CACHE = {
+    'enabled': True,
+    'timeout': 300,
+    # Кэш процесса: сколько секунд другие воркеры могут видеть старый объект.
+    'local_ttl': 5,
+    'max_entries': 10000,
+}
+
+# ID-списки лент index, group и profile (posts.idfeed): окна страниц
+# хранятся как массивы id и гидратируются из кэша объектов.
+POSTS_FEED_IDS = {
+    'enabled': True,
+    'timeout': 600,
+}
+
+# Пагинация лент: 'offset', 'compat' (номера страниц + курсоры) или 'keyset'
+POSTS_PAGINATION = 'compat'
+POSTS_PER_PAGE = 10
+# Комментариев на странице поста и в одной подгрузке "Показать еще".
+POSTS_COMMENTS_PER_PAGE = 50
+
+# Материализованная лента подписок (fan-out при записи).
+FOLLOW_FEED_MATERIALIZED = False
+# Посты авторов с большим числом подписчиков дочитываются при чтении.
+FOLLOW_FEED_CELEBRITY_THRESHOLD = 1000
+# Сколько последних постов автора добавлять при подписке (None - все).
+FOLLOW_FEED_BACKFILL = None
+
+# Метрики запросов: число SQL, время SQL/шаблонов, кэш по имени URL.
+INSTRUMENTATION = {
+    'enabled': True,
+    'budgets': {
+        'default': {'queries': 30, 'duration_ms': 500},
+        'index': {'queries': 10, 'sql_ms': 50},
+        'post': {'queries': 10},
+    },
+    'snapshot_dir': os.path.join(BASE_DIR, 'metrics'),
+    'snapshot_every': 100,
+    # Заголовок Server-Timing со временем по шаблонам и include.
+    'profile_templates': os.environ.get('YATUBE_PROFILE_TEMPLATES') == '1',
+}
+
+# Кэш страниц с версионными ключами (posts.caching): время жизни по
+# представлениям; per_user - кэшировать и для авторизованных. Ленты
+# index, group и profile кэшируются целиком только для анонимов - одна
+# копия на всех (benchmark: 460 запр./с против 222 без нее);
+# авторизованным они собираются из ID-списков posts.idfeed.
+POSTS_CACHE = {
+    'enabled': True,
+    # Сколько ждать чужого рендера той же страницы, прежде чем рендерить самим.
+    'lock_timeout': 10,
+    'views': {
+        'index': {'timeout': 300},
+        'group': {'timeout': 300},
+        'profile': {'timeout': 300},
+        'post': {'timeout': 300, 'per_user': True},
+        'post_comments': {'timeout': 300},
+        'follow_index': {'timeout': 60, 'per_user': True},
+    },
+}
+
+# Фоновая очередь задач (tasks.queue): 'inline' выполняет задачи сразу,
+# 'queue' - через команду run_worker.
+TASKS_MODE = os.environ.get('YATUBE_TASKS_MODE', 'inline')
+
+TASKS = {
+    'mode': TASKS_MODE,
+    'executor': 'thread',
+    'workers': 4,
+    'batch_size': 20,
+    'poll_interval': 1.0,
+    # Повтор упавшей задачи через retry_delay * 2 ** (попытка - 1) секунд.
+    'retry_delay': 5,
+    # Через сколько секунд задача упавшего воркера возвращается в очередь.
+    'lock_timeout': 600,
+    'keep_done': 24 * 60 * 60,
+}
+
+# Генерация миниатюр при сохранении поста (posts.thumbnails).
+POSTS_THUMBNAILS = {
+    'executor': 'queue' if TASKS_MODE == 'queue' else 'thread',
+    'workers': 2,
+    'sizes': [
+        ('960x339', {'crop': 'center', 'upscale': True}),
+    ],
+    'formats': ['JPEG'],
+}
+
+# Счетчик постов для пагинации главной ленты (posts.counting):
+# 'exact', 'cached' (до изменения ленты) или 'estimated' (статистика БД,
+# только при POSTS_PAGINATION = 'keyset').
+POSTS_COUNT = {
+    'index': 'cached',
+    'timeout': 600,
+    'estimate_timeout': 60,
+}
+
+# Полнотекстовый поиск (posts.search): 'fts5', 'python' или 'auto'.
+POSTS_SEARCH = {
+    'backend': 'auto',
+    'per_page': 10,
+    'comment_weight': 0.5,
+    'max_hits': 1000,
+}
+
+# Read-only API (posts.api): размер страницы и пределы limit.
+POSTS_API = {
+    'per_page': 20,
+    'max_per_page': 100,
+    'max_stream': 10000,
+    'chunk_size': 500,
+    'max_bulk_follow': 1000,
+}
+
+# Уведомления о новых постах по SSE (posts.events). Бэкенд брокера:
+# LocalBackend - в памяти процесса, CacheBackend - через общий кэш.
+POSTS_EVENTS = {
+    # Только с ASGI: под WSGI поток держит воркер до max_duration.
+    'enabled': os.environ.get('YATUBE_EVENTS') == '1',
+    'backend': ('posts.events.CacheBackend' if CACHE_MODE != 'local'
+                else 'posts.events.LocalBackend'),
+    'heartbeat': 15,
+    'max_duration': 300,
+    'retry_ms': 3000,
+    'poll_interval': 0.5,
+    'ttl': 60,
+}
@@ -0,0 +1,39 @@
+"""
+Бэкенд SQLite с PRAGMA для каждого нового соединения.
+
+PRAGMA задаются в OPTIONS['pragmas'] (см. SQLITE_PRAGMAS в настройках)
+и выполняются сразу после открытия соединения; остальные OPTIONS, как и
+у стандартного бэкенда, уходят в sqlite3.connect.
+
+transaction_mode (OPTIONS['transaction_mode'] или атрибут соединения)
+задает вид BEGIN для transaction.atomic(): 'IMMEDIATE' берет блокировку
+записи в начале транзакции, а не при первой записи после чтения, когда
+SQLITE_BUSY уже нельзя переждать и откатывается вся транзакция.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.transaction_mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas') or {}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
@@ -5,6 +5,8 @@ from django.conf.urls import handler404, handler500
 from django.conf import settings
 from django.conf.urls.static import static
 
+from . import instrumentation
+
 
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
@@ -14,7 +16,10 @@ urlpatterns = [
     path('about/', include('django.contrib.flatpages.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    # Под admin/, чтобы не перекрывать профиль пользователя "metrics".
+    path('admin/metrics/', instrumentation.metrics, name='metrics'),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('posts.api')),
 ]
 
 # добавим новые пути